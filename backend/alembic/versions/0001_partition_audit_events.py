@@ -0,0 +1,73 @@
+"""partition audit_events by month on created_at
+
+Revision ID: 0001_partition_audit_events
+Revises:
+"""
+from __future__ import annotations
+from datetime import date
+from alembic import op
+from sqlalchemy import text
+from app.services.audit_store import ensure_partitions, TABLE
+
+revision = "0001_partition_audit_events"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    conn = op.get_bind()
+    kind = conn.execute(text(f"SELECT relkind FROM pg_class WHERE oid = to_regclass('{TABLE}')")).scalar()
+    if kind == "p":
+        return
+    if kind is not None:
+        op.rename_table(TABLE, f"{TABLE}_legacy")
+
+    op.execute(f"""
+        CREATE TABLE {TABLE} (
+            id BIGSERIAL NOT NULL,
+            org_id INTEGER NOT NULL,
+            actor VARCHAR,
+            action VARCHAR NOT NULL,
+            payload JSONB NOT NULL DEFAULT '{{}}'::jsonb,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.create_index("ix_audit_events_org_time", TABLE, ["org_id", "created_at", "id"])
+    op.create_index("ix_audit_events_org_action_time", TABLE, ["org_id", "action", "created_at", "id"])
+    op.create_index("ix_audit_events_org_actor_time", TABLE, ["org_id", "actor", "created_at", "id"])
+
+    today = date.today()
+    months_back = 1
+    if kind is not None:
+        oldest = conn.execute(text(f"SELECT min(created_at) FROM {TABLE}_legacy")).scalar()
+        if oldest:
+            months_back = max(1, (today.year - oldest.year) * 12 + today.month - oldest.month)
+    ensure_partitions(conn, months_back=months_back, today=today)
+
+    if kind is not None:
+        op.execute(f"""
+            INSERT INTO {TABLE} (id, org_id, actor, action, payload, created_at)
+            SELECT id, org_id, actor, action, coalesce(payload, '{{}}'::jsonb), coalesce(created_at, now())
+            FROM {TABLE}_legacy
+        """)
+        op.execute(f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), coalesce((SELECT max(id) FROM {TABLE}), 0) + 1, false)")
+        op.drop_table(f"{TABLE}_legacy")
+
+def downgrade():
+    op.rename_table(TABLE, f"{TABLE}_partitioned")
+    op.execute(f"""
+        CREATE TABLE {TABLE} (
+            id SERIAL PRIMARY KEY,
+            org_id INTEGER,
+            actor VARCHAR,
+            action VARCHAR,
+            payload JSONB,
+            created_at TIMESTAMP WITHOUT TIME ZONE
+        )
+    """)
+    op.execute(f"INSERT INTO {TABLE} (id, org_id, actor, action, payload, created_at) SELECT id, org_id, actor, action, payload, created_at FROM {TABLE}_partitioned")
+    op.execute(f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), coalesce((SELECT max(id) FROM {TABLE}), 0) + 1, false)")
+    op.create_index("ix_audit_events_org_id", TABLE, ["org_id"])
+    op.create_index("ix_audit_events_action", TABLE, ["action"])
+    op.execute(f"DROP TABLE {TABLE}_partitioned CASCADE")
@@ -0,0 +1,21 @@
+"""activities.input_errors: inputs flagged against the EF spec at ingest
+
+Revision ID: 0002_activity_input_errors
+Revises: 0001_partition_audit_events
+"""
+from __future__ import annotations
+from alembic import op
+
+revision = "0002_activity_input_errors"
+down_revision = "0001_partition_audit_events"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # create_all on a fresh database already adds both
+    op.execute("ALTER TABLE activities ADD COLUMN IF NOT EXISTS input_errors JSONB")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_activities_org_invalid ON activities (org_id) WHERE input_errors IS NOT NULL")
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_activities_org_invalid")
+    op.execute("ALTER TABLE activities DROP COLUMN IF EXISTS input_errors")
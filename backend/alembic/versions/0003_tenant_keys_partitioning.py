@@ -0,0 +1,187 @@
+"""tenant-scoped keys: emission_factors PK (org_id, key); activities,
+calculation_runs and calc_run_rows hash-partitioned on org_id with org_id
+leading the primary key
+
+Revision ID: 0003_tenant_keys_partitioning
+Revises: 0002_activity_input_errors
+"""
+from __future__ import annotations
+import os
+from alembic import op
+from sqlalchemy import text
+from app.services.tenant_partitions import PARTITIONS, TABLES, create_partitions, is_partitioned, partition_name
+
+revision = "0003_tenant_keys_partitioning"
+down_revision = "0002_activity_input_errors"
+branch_labels = None
+depends_on = None
+
+# rows copied per committed backfill statement
+BATCH = int(os.getenv("MIGRATION_BACKFILL_BATCH", "50000"))
+
+# final name -> columns (and WHERE) of the secondary indexes on each partitioned table
+INDEXES = {
+    "activities": {
+        "ix_activities_org_ef_key": "(org_id, ef_key)",
+        "ix_activities_org_period": "(org_id, period)",
+        "ix_activities_org_invalid": "(org_id) WHERE input_errors IS NOT NULL",
+    },
+    "calculation_runs": {
+        "ix_calculation_runs_id": "(id)",
+    },
+    "calc_run_rows": {},
+}
+# primary key after org_id; the first column also drives the backfill batches
+KEYS = {"activities": ("id",), "calculation_runs": ("id",), "calc_run_rows": ("run_id", "first_row")}
+# tables whose run_id pointed at calculation_runs.id alone
+RUN_REFS = {"calc_result_cache": "calc_result_cache_run_fkey", "emissions_cube": "emissions_cube_run_fkey"}
+
+def _pk_columns(conn, table: str) -> list[str]:
+    return list(conn.execute(text("""
+        SELECT a.attname FROM pg_index i
+        CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+        WHERE i.indrelid = to_regclass(:t) AND i.indisprimary ORDER BY k.ord
+    """), {"t": table}).scalars())
+
+def _org_not_null(table: str):
+    # NOT NULL via a validated CHECK, so the ACCESS EXCLUSIVE steps skip the full scan
+    op.execute(f"UPDATE {table} SET org_id = 1 WHERE org_id IS NULL")
+    op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_org_nn CHECK (org_id IS NOT NULL) NOT VALID")
+    op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {table}_org_nn")
+    op.execute(f"ALTER TABLE {table} ALTER COLUMN org_id SET NOT NULL")
+    op.execute(f"ALTER TABLE {table} DROP CONSTRAINT {table}_org_nn")
+
+def _ef_composite_key(conn):
+    if _pk_columns(conn, "emission_factors") == ["org_id", "key"]:
+        return
+    _org_not_null("emission_factors")
+    with op.get_context().autocommit_block():
+        op.execute("CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS emission_factors_org_key ON emission_factors (org_id, key)")
+    op.execute("ALTER TABLE emission_factors DROP CONSTRAINT emission_factors_pkey, "
+               "ADD CONSTRAINT emission_factors_pkey PRIMARY KEY USING INDEX emission_factors_org_key")
+    # both covered by the new primary key
+    op.execute("DROP INDEX IF EXISTS ix_emission_factors_key")
+    op.execute("DROP INDEX IF EXISTS ix_emission_factors_org_id")
+
+def _partition_table(conn, table: str):
+    # Online conversion: a hash-partitioned shadow table is kept in sync by a
+    # trigger while existing rows are copied over in committed batches; the
+    # final swap only renames under a short exclusive lock.
+    if is_partitioned(conn, table) or conn.execute(text(f"SELECT to_regclass('{table}')")).scalar() is None:
+        return
+    shadow = f"{table}_p"
+    key = KEYS[table]
+    same_row = " AND ".join(f"{c} = OLD.{c}" for c in ("org_id", *key))
+    _org_not_null(table)
+    op.execute(f"CREATE TABLE {shadow} (LIKE {table} INCLUDING DEFAULTS) PARTITION BY HASH (org_id)")
+    op.execute(f"ALTER TABLE {shadow} ADD CONSTRAINT {shadow}_pkey PRIMARY KEY (org_id, {', '.join(key)})")
+    op.execute(f"ALTER TABLE {shadow} ADD CONSTRAINT {shadow}_org_id_fkey FOREIGN KEY (org_id) REFERENCES orgs (id) ON DELETE CASCADE")
+    if table == "calc_run_rows":
+        # calculation_runs is already converted; its old id-only key went with it
+        op.execute("DELETE FROM calc_run_rows r WHERE NOT EXISTS "
+                   "(SELECT 1 FROM calculation_runs c WHERE c.org_id = r.org_id AND c.id = r.run_id)")
+        op.execute(f"ALTER TABLE {shadow} ADD CONSTRAINT {shadow}_run_fkey FOREIGN KEY (org_id, run_id) "
+                   f"REFERENCES calculation_runs (org_id, id) ON DELETE CASCADE")
+    create_partitions(conn, table, PARTITIONS, parent=shadow)
+    for name, cols in INDEXES[table].items():
+        op.execute(f"CREATE INDEX {name}_p ON {shadow} {cols}")
+
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION {shadow}_mirror() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM {shadow} WHERE {same_row};
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO {shadow} SELECT NEW.* ON CONFLICT DO NOTHING;
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql
+    """)
+    op.execute(f"CREATE TRIGGER {shadow}_mirror AFTER INSERT OR UPDATE OR DELETE ON {table} "
+               f"FOR EACH ROW EXECUTE FUNCTION {shadow}_mirror()")
+
+    with op.get_context().autocommit_block():
+        # rows written from here on reach the shadow through the trigger
+        hi = conn.execute(text(f"SELECT coalesce(max({key[0]}), 0) FROM {table}")).scalar()
+        lo = 0
+        while lo < hi:
+            conn.execute(text(f"INSERT INTO {shadow} SELECT * FROM {table} WHERE {key[0]} > :lo AND {key[0]} <= :hi ON CONFLICT DO NOTHING"),
+                         {"lo": lo, "hi": lo + BATCH})
+            lo += BATCH
+
+    seq = conn.execute(text(f"SELECT pg_get_serial_sequence('{table}', 'id')")).scalar()
+    op.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+    op.execute(f"DROP TRIGGER {shadow}_mirror ON {table}")
+    op.execute(f"DROP FUNCTION {shadow}_mirror()")
+    if seq:
+        op.execute(f"ALTER SEQUENCE {seq} OWNED BY {shadow}.id")
+    # CASCADE drops the old single-column run_id foreign keys; re-added below
+    op.execute(f"DROP TABLE {table} CASCADE")
+    op.execute(f"ALTER TABLE {shadow} RENAME TO {table}")
+    op.execute(f"ALTER TABLE {table} RENAME CONSTRAINT {shadow}_pkey TO {table}_pkey")
+    op.execute(f"ALTER TABLE {table} RENAME CONSTRAINT {shadow}_org_id_fkey TO {table}_org_id_fkey")
+    if table == "calc_run_rows":
+        op.execute(f"ALTER TABLE {table} RENAME CONSTRAINT {shadow}_run_fkey TO {table}_run_fkey")
+    for i in range(PARTITIONS):
+        op.execute(f"ALTER TABLE {partition_name(shadow, i)} RENAME TO {partition_name(table, i)}")
+    for name in INDEXES[table]:
+        op.execute(f"ALTER INDEX {name}_p RENAME TO {name}")
+
+def _run_foreign_keys(conn):
+    for ref, name in RUN_REFS.items():
+        if conn.execute(text(f"SELECT to_regclass('{ref}')")).scalar() is None:
+            continue
+        op.execute(f"ALTER TABLE {ref} DROP CONSTRAINT IF EXISTS {ref}_run_id_fkey")
+        op.execute(f"ALTER TABLE {ref} DROP CONSTRAINT IF EXISTS {name}")
+        op.execute(f"DELETE FROM {ref} r WHERE NOT EXISTS "
+                   f"(SELECT 1 FROM calculation_runs c WHERE c.org_id = r.org_id AND c.id = r.run_id)")
+        op.execute(f"ALTER TABLE {ref} ADD CONSTRAINT {name} FOREIGN KEY (org_id, run_id) "
+                   f"REFERENCES calculation_runs (org_id, id) ON DELETE CASCADE NOT VALID")
+        op.execute(f"ALTER TABLE {ref} VALIDATE CONSTRAINT {name}")
+
+def upgrade():
+    conn = op.get_bind()
+    _ef_composite_key(conn)
+    converted = not is_partitioned(conn, "calculation_runs")
+    for table in TABLES:
+        _partition_table(conn, table)
+    if converted:
+        _run_foreign_keys(conn)
+
+def downgrade():
+    # back to plain heap tables keyed by id; fails if two orgs now share an EF key
+    conn = op.get_bind()
+    for ref, name in RUN_REFS.items():
+        if conn.execute(text(f"SELECT to_regclass('{ref}')")).scalar() is not None:
+            op.execute(f"ALTER TABLE {ref} DROP CONSTRAINT IF EXISTS {name}")
+    for table in ("activities", "calculation_runs"):
+        if not is_partitioned(conn, table):
+            continue
+        heap = f"{table}_heap"
+        seq = conn.execute(text(f"SELECT pg_get_serial_sequence('{table}', 'id')")).scalar()
+        op.execute(f"CREATE TABLE {heap} (LIKE {table} INCLUDING DEFAULTS)")
+        op.execute(f"INSERT INTO {heap} SELECT * FROM {table}")
+        if seq:
+            op.execute(f"ALTER SEQUENCE {seq} OWNED BY {heap}.id")
+        op.execute(f"DROP TABLE {table} CASCADE")
+        op.execute(f"ALTER TABLE {heap} RENAME TO {table}")
+        op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id)")
+        op.execute(f"ALTER TABLE {table} ADD FOREIGN KEY (org_id) REFERENCES orgs (id) ON DELETE CASCADE")
+        op.execute(f"CREATE INDEX ix_{table}_org_id ON {table} (org_id)")
+    if is_partitioned(conn, "calc_run_rows"):
+        op.execute("CREATE TABLE calc_run_rows_heap (LIKE calc_run_rows INCLUDING DEFAULTS)")
+        op.execute("INSERT INTO calc_run_rows_heap SELECT * FROM calc_run_rows")
+        op.execute("DROP TABLE calc_run_rows")
+        op.execute("ALTER TABLE calc_run_rows_heap RENAME TO calc_run_rows")
+        op.execute("ALTER TABLE calc_run_rows ADD PRIMARY KEY (run_id, first_row)")
+        op.execute("ALTER TABLE calc_run_rows ADD FOREIGN KEY (org_id) REFERENCES orgs (id) ON DELETE CASCADE")
+        op.execute("ALTER TABLE calc_run_rows ADD FOREIGN KEY (run_id) REFERENCES calculation_runs (id) ON DELETE CASCADE")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_activities_org_invalid ON activities (org_id) WHERE input_errors IS NOT NULL")
+    for ref in RUN_REFS:
+        if conn.execute(text(f"SELECT to_regclass('{ref}')")).scalar() is not None:
+            op.execute(f"ALTER TABLE {ref} ADD FOREIGN KEY (run_id) REFERENCES calculation_runs (id) ON DELETE CASCADE")
+    op.execute("ALTER TABLE emission_factors DROP CONSTRAINT emission_factors_pkey, ADD PRIMARY KEY (key)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_emission_factors_key ON emission_factors (key)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_emission_factors_org_id ON emission_factors (org_id)")
@@ -0,0 +1,40 @@
+"""partitioned runs: calculation_runs.status and the calc_run_shards work table
+
+Revision ID: 0004_partitioned_runs
+Revises: 0003_tenant_keys_partitioning
+"""
+from __future__ import annotations
+from alembic import op
+
+revision = "0004_partitioned_runs"
+down_revision = "0003_tenant_keys_partitioning"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # create_all on a fresh database already adds both; existing runs are complete
+    op.execute("ALTER TABLE calculation_runs ADD COLUMN IF NOT EXISTS status VARCHAR NOT NULL DEFAULT 'DONE'")
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS calc_run_shards (
+            org_id INTEGER NOT NULL REFERENCES orgs (id) ON DELETE CASCADE,
+            run_id INTEGER NOT NULL,
+            shard INTEGER NOT NULL,
+            activity_ids JSONB NOT NULL,
+            first_row INTEGER NOT NULL,
+            status VARCHAR NOT NULL,
+            attempts INTEGER NOT NULL,
+            total_kgco2e FLOAT NOT NULL,
+            ef_snapshot JSONB NOT NULL,
+            efs JSONB NOT NULL,
+            chunks JSONB NOT NULL,
+            error TEXT,
+            updated_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (org_id, run_id, shard),
+            CONSTRAINT calc_run_shards_run_fkey FOREIGN KEY (org_id, run_id)
+                REFERENCES calculation_runs (org_id, id) ON DELETE CASCADE
+        )
+    """)
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS calc_run_shards")
+    op.execute("ALTER TABLE calculation_runs DROP COLUMN IF EXISTS status")
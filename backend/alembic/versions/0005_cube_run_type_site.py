@@ -0,0 +1,31 @@
+"""activities.site; emissions_cube run_type and site
+
+Revision ID: 0005_cube_run_type_site
+Revises: 0004_partitioned_runs
+"""
+from __future__ import annotations
+from alembic import op
+from sqlalchemy import text
+
+revision = "0005_cube_run_type_site"
+down_revision = "0004_partitioned_runs"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # create_all on a fresh database already adds these; existing cells get their run's
+    # type, and `python -m app.services.emissions_cube` rebuilds them from the runs' rows
+    op.execute("ALTER TABLE activities ADD COLUMN IF NOT EXISTS site VARCHAR")
+    if op.get_bind().execute(text("SELECT to_regclass('emissions_cube')")).scalar() is None:
+        return
+    op.execute("ALTER TABLE emissions_cube ADD COLUMN IF NOT EXISTS run_type VARCHAR NOT NULL DEFAULT ''")
+    op.execute("ALTER TABLE emissions_cube ADD COLUMN IF NOT EXISTS site VARCHAR NOT NULL DEFAULT ''")
+    op.execute("UPDATE emissions_cube e SET run_type = c.run_type FROM calculation_runs c "
+               "WHERE c.org_id = e.org_id AND c.id = e.run_id")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_emissions_cube_org_type_period ON emissions_cube (org_id, run_type, period, run_id)")
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_emissions_cube_org_type_period")
+    op.execute("ALTER TABLE IF EXISTS emissions_cube DROP COLUMN IF EXISTS site")
+    op.execute("ALTER TABLE IF EXISTS emissions_cube DROP COLUMN IF EXISTS run_type")
+    op.execute("ALTER TABLE activities DROP COLUMN IF EXISTS site")
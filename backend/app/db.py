@@ -1,10 +1,36 @@
-from sqlalchemy import create_engine
+import os, threading, time
+from fastapi import Request
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from .config import settings
+from .observability import DB_READ_ROUTE, REPLICA_LAG, current_request_stats, instrument_engine, log
 
 engine = create_engine(settings.database_url, pool_pre_ping=True)
+instrument_engine(engine)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
+# Optional read replica (DATABASE_REPLICA_URL). Read-only endpoints take get_read_db
+# and land on the replica unless the client wrote something in the last
+# REPLICA_STICKY_SECONDS (cookie set by read_your_writes_middleware), asks for
+# X-Read-Consistency: primary, or the replica lags more than REPLICA_MAX_LAG_SECONDS.
+replica_engine = create_engine(settings.database_replica_url, pool_pre_ping=True,
+                               execution_options={"postgresql_readonly": True}) if settings.database_replica_url else None
+if replica_engine is not None:
+    instrument_engine(replica_engine)
+ReplicaSessionLocal = sessionmaker(bind=replica_engine, autocommit=False, autoflush=False) if replica_engine is not None else None
+
+STICKY_COOKIE = "read_primary_until"
+STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "30"))
+LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "5"))
+
+# 0 when caught up with what it received (an idle primary does not count as lag)
+# or when the URL points at a standalone server, e.g. a second local Postgres
+_LAG_SQL = text("""
+SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+""")
+
 class Base(DeclarativeBase):
     pass
 
@@ -14,3 +40,63 @@ def get_db():
         yield db
     finally:
         db.close()
+
+_health = {"checked": 0.0, "ok": False}
+_health_lock = threading.Lock()
+
+def replica_ok() -> bool:
+    now = time.monotonic()
+    if now - _health["checked"] < LAG_CHECK_SECONDS:
+        return _health["ok"]
+    with _health_lock:
+        if now - _health["checked"] < LAG_CHECK_SECONDS:
+            return _health["ok"]
+        try:
+            with replica_engine.connect() as conn:
+                lag = float(conn.execute(_LAG_SQL).scalar() or 0.0)
+            REPLICA_LAG.set(lag)
+            ok = lag <= MAX_LAG_SECONDS
+        except Exception as e:
+            log.warning("replica_unavailable", error=str(e))
+            ok = False
+        _health.update(checked=now, ok=ok)
+    return ok
+
+def _read_target(request: Request) -> str:
+    if replica_engine is None:
+        return "no_replica"
+    if request.headers.get("x-read-consistency", "").lower() == "primary":
+        return "requested"
+    try:
+        sticky = float(request.cookies.get(STICKY_COOKIE) or 0) > time.time()
+    except ValueError:
+        sticky = False
+    if sticky:
+        return "recent_write"
+    return "replica" if replica_ok() else "replica_unhealthy"
+
+def read_bind(request: Request):
+    # (engine, sessionmaker) for a read-only request; streaming endpoints open
+    # their own session/connection from it
+    reason = _read_target(request)
+    if reason == "replica":
+        DB_READ_ROUTE.labels(target="replica", reason="").inc()
+        return replica_engine, ReplicaSessionLocal
+    DB_READ_ROUTE.labels(target="primary", reason=reason).inc()
+    return engine, SessionLocal
+
+def get_read_db(request: Request):
+    db = read_bind(request)[1]()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def read_your_writes_middleware(request: Request, call_next):
+    # has to sit inside the accounting middleware, which owns the request stats
+    resp = await call_next(request)
+    stats = current_request_stats()
+    if replica_engine is not None and stats is not None and stats.writes:
+        resp.set_cookie(STICKY_COOKIE, f"{time.time() + STICKY_SECONDS:.3f}", max_age=max(1, int(STICKY_SECONDS) + 1),
+                        httponly=True, samesite="lax")
+    return resp
@@ -1,6 +1,6 @@
 from __future__ import annotations
 from datetime import datetime, date
-from sqlalchemy import Integer, String, DateTime, Date
+from sqlalchemy import Integer, BigInteger, String, DateTime, Date, Index
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 from app.db import Base
@@ -19,13 +19,21 @@ class EmissionFactorVersion(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 class AuditEvent(Base):
+    # Range-partitioned by month on created_at (see app.services.audit_store); the
+    # partition key has to be part of the primary key.
     __tablename__ = "audit_events"
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    org_id: Mapped[int] = mapped_column(Integer, index=True)
+    __table_args__ = (
+        Index("ix_audit_events_org_time", "org_id", "created_at", "id"),
+        Index("ix_audit_events_org_action_time", "org_id", "action", "created_at", "id"),
+        Index("ix_audit_events_org_actor_time", "org_id", "actor", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    org_id: Mapped[int] = mapped_column(Integer)
     actor: Mapped[str | None] = mapped_column(String, nullable=True)
-    action: Mapped[str] = mapped_column(String, index=True)
+    action: Mapped[str] = mapped_column(String)
     payload: Mapped[dict] = mapped_column(JSONB, default=dict)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True, default=datetime.utcnow)
 
 class RunSignature(Base):
     __tablename__ = "run_signatures"
@@ -1,11 +1,39 @@
 from __future__ import annotations
-from sqlalchemy.orm import Session
-from app.db import SessionLocal
-from app.services.audit_engine import audit_run
+
+# Job entry points only; the ORM and the audit engine are imported when a job
+# actually runs, so importing this module (to enqueue) stays cheap.
+
+def _session():
+    # the models' foreign keys name orgs, whose mapping lives in app.tenancy; without
+    # it a worker that never imported the API fails its first flush
+    import app.tenancy.models  # noqa: F401
+    from app.db import SessionLocal
+
+    return SessionLocal()
 
 def job_run_audit(run_id: int) -> dict:
-    db: Session = SessionLocal()
+    from app.services.audit_engine import audit_run
+
+    db = _session()
     try:
         return audit_run(db, run_id)
     finally:
         db.close()
+
+def job_calc_shard(org_id: int, run_id: int, shard: int) -> dict:
+    from app.services.partitioned_runs import compute_shard
+
+    db = _session()
+    try:
+        return compute_shard(db, org_id, run_id, shard)
+    finally:
+        db.close()
+
+def job_reduce_run(org_id: int, run_id: int) -> dict:
+    from app.services.partitioned_runs import reduce_run
+
+    db = _session()
+    try:
+        return reduce_run(db, org_id, run_id)
+    finally:
+        db.close()
@@ -0,0 +1,34 @@
+from __future__ import annotations
+import importlib, time
+from types import ModuleType
+from typing import Any
+
+class LazyModule:
+    # Stands in for a heavy module until one of its attributes is first read, so
+    # API and worker processes only pay for pandas/pyarrow/reportlab/... on the
+    # import, export and job paths that use them. The first-use import time is
+    # recorded as the "import" stage.
+    __slots__ = ("_name", "_module")
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: ModuleType | None = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            from app.observability import STAGE_LATENCY
+
+            start = time.perf_counter()
+            self._module = importlib.import_module(self._name)
+            STAGE_LATENCY.labels(stage="import").observe(time.perf_counter() - start)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+def lazy_module(name: str) -> Any:
+    return LazyModule(name)
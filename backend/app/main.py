@@ -1,33 +1,41 @@
 from __future__ import annotations
 
-import io, json, os, datetime
-import pandas as pd
-import redis
-from rq import Queue
+import io, itertools, json, os, datetime, time
 
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Request
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
 
-from slowapi.middleware import SlowAPIMiddleware
-from slowapi.errors import RateLimitExceeded
-from slowapi import _rate_limit_exceeded_handler
 from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 
 from app.config import settings
-from app.db import Base, engine, get_db
+from app.lazy import lazy_module
+from app.db import Base, engine, get_db, get_read_db, read_bind, read_your_writes_middleware, SessionLocal
 from app.models import EmissionFactor, Activity, CalculationRun, CarbonCreditProject
 from app.history.models import RunSignature
 from app.tenancy.middleware import org_context_middleware
 from app.tenancy.models import Org, OrgMember
 
-from app.services.ef_service import upsert_seed_efs
-from app.services.calc_service import compute_run
-from app.services.credit_service import calc_carbon_credit
+from app.services.ef_service import sync_seed_efs, import_ef_dataframe
+from app.services.calc_service import compute_run, load_activities
+from app.services.calc_cache import run_fingerprint, lookup as cached_run, remember as remember_run
+from app.services.ef_catalog import get_catalog
+from app.services.input_validation import validate_activities
+from app.services.uncertainty import monte_carlo_for_run, monte_carlo_run
+from app.services.scenarios import sweep
+from app.services.credit_service import calc_carbon_credit, calc_portfolio, bump_portfolio_version
 from app.services.audit_engine import audit_run
 from app.services.report_export import export_run_pdf, export_run_excel
-from app.services.audit_events import emit_event
+from app.services.audit_events import emit_event, writer as audit_event_writer
+from app.services.audit_store import ensure_partitions, query_events, iter_events_ndjson
+from app.services.tenant_partitions import ensure_hash_partitions
+from app.services.run_diff import load_run_headers, iter_run_diff_ndjson
+from app.services.run_trace import compact_details, expand_details, is_chunked, iter_run_rows, store_details
+from app.services.partitioned_runs import (PARTITION_MIN_ROWS, SHARD_SIZE, enqueue_reduce, enqueue_shards, retry_failed_shards,
+                                           shard_progress, start_run as start_partitioned_run)
+from app.services.emissions_cube import refresh_run as refresh_cube, set_run_status as set_cube_status, query_cube
+from app.services.bulk_export import FORMATS as BULK_FORMATS, stream_dataset
 from app.services.ef_versioning import snapshot_ef_payload, create_new_version
 from app.services.signing import load_or_generate_keypair, run_hash as calc_run_hash, sign_hash, verify_hash
 
@@ -35,23 +43,29 @@ from app.auth.routes import router as auth_router
 from app.auth.security import require_org_roles, hash_password
 from app.auth.models import User
 
-from app.rate_limit import build_limiter
-from app.observability import configure_logging, REQ_COUNTER, REQ_LATENCY
+from app.rate_limit import build_limiter, rate_limit_middleware
+from app.observability import (configure_logging, REQ_COUNTER, REQ_LATENCY, route_label, stage_timer, log,
+                               begin_request_stats, end_request_stats, report_request_stats)
+from app.profiling import maybe_start_profiler, finish_profile
+from app.responses import TimedJSONResponse, ndjson_response
 
 from app.jobs import job_run_audit
+from app.queues import enqueue
 
-configure_logging()
+pd = lazy_module("pandas")
 
-app = FastAPI(title="Carbon Platform", version="3.2.0-enterprise")
+configure_logging()
 
-# tenancy middleware (requires X-Org-Slug for most routes)
-app.middleware("http")(org_context_middleware)
+app = FastAPI(title="Carbon Platform", version="3.2.0-enterprise", default_response_class=TimedJSONResponse)
 
-# rate limiting
+# rate limiting (per org/user, cost-weighted); registered first so it runs inside
+# the tenancy middleware and sees request.state.org
 limiter = build_limiter()
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-app.add_middleware(SlowAPIMiddleware)
+app.middleware("http")(rate_limit_middleware(limiter))
+
+# tenancy middleware (requires X-Org-Slug for most routes)
+app.middleware("http")(org_context_middleware)
 
 # cors
 app.add_middleware(
@@ -62,11 +76,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# sets the read-your-writes cookie; must stay inside request_accounting_mw
+app.middleware("http")(read_your_writes_middleware)
+
 @app.middleware("http")
-async def metrics_mw(request: Request, call_next):
-    path = request.url.path
-    with REQ_LATENCY.labels(path=path).time():
+async def request_accounting_mw(request: Request, call_next):
+    # SQL statement/time accounting for every request, stack sampling for a fraction
+    stats, token = begin_request_stats()
+    sampler = maybe_start_profiler()
+    start = time.perf_counter()
+    status = 500
+    try:
         resp = await call_next(request)
+        status = resp.status_code
+        return resp
+    finally:
+        end_request_stats(token)
+        duration = time.perf_counter() - start
+        path = route_label(request)
+        report_request_stats(request.method, path, status, stats, duration)
+        if sampler is not None:
+            log.info("request_profiled", method=request.method, path=path,
+                     file=finish_profile(sampler, request.method, path, duration))
+
+@app.middleware("http")
+async def metrics_mw(request: Request, call_next):
+    start = time.perf_counter()
+    resp = await call_next(request)
+    # label by route template after routing so ids in the URL don't create new series
+    path = route_label(request)
+    REQ_LATENCY.labels(path=path).observe(time.perf_counter() - start)
     REQ_COUNTER.labels(method=request.method, path=path, status=str(resp.status_code)).inc()
     return resp
 
@@ -78,6 +117,9 @@ def metrics():
 def startup():
     # In production: use Alembic migrations
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        ensure_partitions(conn)
+        ensure_hash_partitions(conn)
     db = next(get_db())
     try:
         org = db.query(Org).filter(Org.slug == "kmutt").one_or_none()
@@ -87,10 +129,12 @@ def startup():
             db.commit()
             db.refresh(org)
 
-        n, warnings = upsert_seed_efs(db)
-        if warnings:
-            print("[seed warnings]", *warnings, sep="\n- ")
-        print(f"[seed] upserted {n} EF rows")
+        # serving processes can skip this when seeds are applied by `python -m app.seed`
+        if os.getenv("SEED_ON_STARTUP", "1") == "1":
+            res = sync_seed_efs(db, org.id)
+            if res["warnings"]:
+                print("[seed warnings]", *res["warnings"], sep="\n- ")
+            print(f"[seed] {res['status']}: {res['count']} EF rows (fingerprint {res['fingerprint'][:12]})")
 
         admin = db.query(User).filter(User.username == "admin").one_or_none()
         if not admin:
@@ -108,18 +152,16 @@ def startup():
     finally:
         db.close()
 
+@app.on_event("shutdown")
+def shutdown():
+    # drain buffered audit events before the process exits
+    audit_event_writer.close()
+
 app.include_router(auth_router)
 
 # -------- EF --------
-@app.get("/api/efs")
-def list_efs(request: Request, q: str | None = None, limit: int = 500, db: Session = Depends(get_db)):
-    org_id = request.state.org.id
-    qry = db.query(EmissionFactor).filter(EmissionFactor.org_id == org_id)
-    if q:
-        like = f"%{q}%"
-        qry = qry.filter((EmissionFactor.name.ilike(like)) | (EmissionFactor.key.ilike(like)))
-    rows = qry.limit(limit).all()
-    return [{
+def _ef_list_row(r: EmissionFactor) -> dict:
+    return {
         "key": r.key, "name": r.name, "unit": r.unit, "value": r.value,
         "scope": r.scope, "category": r.category, "tags": r.tags,
         "valid_from": r.valid_from.isoformat() if r.valid_from else None,
@@ -128,10 +170,37 @@ def list_efs(request: Request, q: str | None = None, limit: int = 500, db: Sessi
         "lifecycle_status": r.lifecycle_status,
         "activity_id_fields": r.activity_id_fields, "gas_breakdown": r.gas_breakdown,
         "gwp_version": r.gwp_version, "meta": r.meta
-    } for r in rows]
+    }
+
+def _stream_query(build, row_fn, batch: int = 1000, session_factory=SessionLocal):
+    # NDJSON mode: rows are read with a server-side cursor in their own session
+    # and encoded as they arrive
+    db = session_factory()
+    try:
+        for r in build(db).execution_options(yield_per=batch):
+            yield row_fn(r)
+    finally:
+        db.close()
+
+@app.get("/api/efs")
+def list_efs(request: Request, q: str | None = None, limit: int | None = None, format: str = "json", db: Session = Depends(get_read_db)):
+    org_id = request.state.org.id
+
+    def build(s: Session):
+        qry = s.query(EmissionFactor).filter(EmissionFactor.org_id == org_id)
+        if q:
+            like = f"%{q}%"
+            qry = qry.filter((EmissionFactor.name.ilike(like)) | (EmissionFactor.key.ilike(like)))
+        qry = qry.order_by(EmissionFactor.key)
+        return qry.limit(limit) if limit else qry
+
+    if format == "ndjson":
+        return ndjson_response(_stream_query(build, _ef_list_row, session_factory=read_bind(request)[1]))
+    limit = min(limit or 500, 5000)
+    return TimedJSONResponse([_ef_list_row(r) for r in build(db).all()])
 
 @app.get("/api/efs/{key}")
-def get_ef(request: Request, key: str, db: Session = Depends(get_db)):
+def get_ef(request: Request, key: str, db: Session = Depends(get_read_db)):
     org_id = request.state.org.id
     r = db.query(EmissionFactor).filter(EmissionFactor.org_id==org_id, EmissionFactor.key == key).one_or_none()
     if not r:
@@ -165,11 +234,14 @@ def upsert_ef(request: Request, payload: dict, db: Session = Depends(get_db), us
     else:
         payload["org_id"] = org_id
         db.add(EmissionFactor(**payload))
-    db.commit()
+    db.flush()
 
     ef = db.query(EmissionFactor).filter(EmissionFactor.org_id==org_id, EmissionFactor.key==key).one()
-    h = create_new_version(db, org_id=org_id, ef_key=key, payload=snapshot_ef_payload(ef), changed_by=user.username, change_reason=payload.get("review_notes") or "upsert")
+    h = create_new_version(db, org_id=org_id, ef_key=key, payload=snapshot_ef_payload(ef), changed_by=user.username,
+                           change_reason=payload.get("review_notes") or "upsert", commit=False)
+    # the EF, its version and the event commit together
     emit_event(db, org_id, user.username, "EF_UPSERT", {"ef_key": key, "payload_hash": h})
+    db.commit()
     return {"ok": True, "key": key, "payload_hash": h}
 
 @app.post("/api/efs/import")
@@ -183,56 +255,41 @@ async def import_efs(request: Request, file: UploadFile = File(...), db: Session
         df = pd.read_excel(io.BytesIO(content))
     else:
         raise HTTPException(400, "Only CSV/Excel")
-    df.columns = [c.strip().lower() for c in df.columns]
-    required = {"key","name","unit","scope","category"}
-    if not required.issubset(set(df.columns)):
-        raise HTTPException(400, f"Missing columns: need {sorted(required)}")
-
-    def j(v):
-        if v is None or (isinstance(v, float) and pd.isna(v)): return {}
-        if isinstance(v, dict): return v
-        s = str(v).strip()
-        if not s or s.lower() == "nan": return {}
-        try: return json.loads(s)
-        except: return {}
-
-    def tags(v):
-        if v is None or (isinstance(v, float) and pd.isna(v)): return []
-        if isinstance(v, list): return v
-        s = str(v).strip()
-        return [x.strip() for x in s.split(",") if x.strip()]
-
-    count = 0
-    for _, row in df.iterrows():
-        payload = {k: row.get(k) for k in df.columns}
-        payload["org_id"] = org_id
-        payload["value"] = None if ("value" not in payload or pd.isna(payload.get("value"))) else float(payload["value"])
-        payload["tags"] = tags(payload.get("tags"))
-        payload["activity_id_fields"] = j(payload.get("activity_id_fields"))
-        payload["gas_breakdown"] = j(payload.get("gas_breakdown"))
-        payload["meta"] = j(payload.get("meta"))
-        key = str(payload["key"]).strip()
-
-        obj = db.query(EmissionFactor).filter(EmissionFactor.org_id==org_id, EmissionFactor.key == key).one_or_none()
-        if obj:
-            for k, v in payload.items():
-                setattr(obj, k, v)
-        else:
-            db.add(EmissionFactor(**payload))
-        count += 1
+    try:
+        count = import_ef_dataframe(db, org_id, df)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    emit_event(db, org_id, user.username, "EF_IMPORT", {"count": count, "filename": file.filename}, in_tx=True)
     db.commit()
-    emit_event(db, org_id, user.username, "EF_IMPORT", {"count": count, "filename": file.filename})
     return {"ok": True, "imported": count}
 
 # -------- Activities --------
+def _activity_row(a: Activity) -> dict:
+    return {
+        "id": a.id, "name": a.name, "ef_key": a.ef_key,
+        "inputs": a.inputs, "scope": a.scope, "period": a.period, "site": a.site, "input_errors": a.input_errors
+    }
+
 @app.get("/api/activities")
-def list_activities(request: Request, db: Session = Depends(get_db), user=Depends(require_org_roles("CALCULATOR","EXPERT"))):
+def list_activities(request: Request, limit: int | None = None, before_id: int | None = None, invalid: bool = False,
+                    format: str = "json", db: Session = Depends(get_read_db), user=Depends(require_org_roles("CALCULATOR","EXPERT"))):
+    # newest first; JSON pages are capped, page further with before_id=<last id>.
+    # invalid=true lists only activities flagged at ingest
     org_id = request.state.org.id
-    rows = db.query(Activity).filter(Activity.org_id==org_id).order_by(Activity.id.desc()).all()
-    return [{
-        "id": a.id, "name": a.name, "ef_key": a.ef_key,
-        "inputs": a.inputs, "scope": a.scope, "period": a.period
-    } for a in rows]
+
+    def build(s: Session):
+        qry = s.query(Activity).filter(Activity.org_id==org_id)
+        if invalid:
+            qry = qry.filter(Activity.input_errors.is_not(None))
+        if before_id is not None:
+            qry = qry.filter(Activity.id < before_id)
+        qry = qry.order_by(Activity.id.desc())
+        return qry.limit(limit) if limit else qry
+
+    if format == "ndjson":
+        return ndjson_response(_stream_query(build, _activity_row, session_factory=read_bind(request)[1]))
+    limit = min(limit or 1000, 10000)
+    return TimedJSONResponse([_activity_row(a) for a in build(db).all()])
 
 @app.post("/api/activities")
 def create_activity(request: Request, payload: dict, db: Session = Depends(get_db), user=Depends(require_org_roles("CALCULATOR","EXPERT"))):
@@ -246,13 +303,16 @@ def create_activity(request: Request, payload: dict, db: Session = Depends(get_d
         inputs=payload.get("inputs") or {},
         scope=payload.get("scope","Scope3"),
         period=payload.get("period"),
+        site=payload.get("site"),
         note=payload.get("note"),
     )
+    a.input_errors = validate_activities(get_catalog(db, org_id), [(a.ef_key, a.inputs)])[0] or None
     db.add(a)
+    db.flush()
+    activity_id = a.id
+    emit_event(db, org_id, user.username, "ACTIVITY_CREATED", {"activity_id": activity_id, "ef_key": a.ef_key})
     db.commit()
-    db.refresh(a)
-    emit_event(db, org_id, user.username, "ACTIVITY_CREATED", {"activity_id": a.id, "ef_key": a.ef_key})
-    return {"ok": True, "id": a.id}
+    return {"ok": True, "id": activity_id, "input_errors": a.input_errors}
 
 @app.delete("/api/activities/{activity_id}")
 def delete_activity(request: Request, activity_id: int, db: Session = Depends(get_db), user=Depends(require_org_roles("CALCULATOR","EXPERT"))):
@@ -261,8 +321,8 @@ def delete_activity(request: Request, activity_id: int, db: Session = Depends(ge
     if not a:
         return {"ok": False}
     db.delete(a)
-    db.commit()
     emit_event(db, org_id, user.username, "ACTIVITY_DELETED", {"activity_id": activity_id})
+    db.commit()
     return {"ok": True}
 
 @app.post("/api/activities/import")
@@ -289,71 +349,220 @@ async def import_activities(request: Request, file: UploadFile = File(...), db:
         try: return json.loads(s)
         except: return {}
 
-    count = 0
-    for _, row in df.iterrows():
-        a = Activity(
-            org_id=org_id,
-            name=str(row.get("name","")).strip(),
-            ef_key=str(row.get("ef_key","")).strip(),
-            inputs=j(row.get("inputs")),
-            scope=str(row.get("scope","Scope3")).strip(),
-            period=(None if "period" not in df.columns else str(row.get("period")).strip()),
-        )
-        db.add(a)
-        count += 1
+    rows = [Activity(
+        org_id=org_id,
+        name=str(row.get("name","")).strip(),
+        ef_key=str(row.get("ef_key","")).strip(),
+        inputs=j(row.get("inputs")),
+        scope=str(row.get("scope","Scope3")).strip(),
+        period=(None if "period" not in df.columns else str(row.get("period")).strip()),
+        site=(None if "site" not in df.columns or pd.isna(row.get("site")) else str(row.get("site")).strip()),
+    ) for _, row in df.iterrows()]
+    # inputs are checked per EF over the whole file; bad rows are imported but flagged
+    errors = validate_activities(get_catalog(db, org_id), [(a.ef_key, a.inputs) for a in rows])
+    invalid = []
+    for line, (a, errs) in enumerate(zip(rows, errors), start=2):
+        if errs:
+            a.input_errors = errs
+            invalid.append({"line": line, "name": a.name, "ef_key": a.ef_key, "errors": errs})
+    db.add_all(rows)
+    count = len(rows)
+    emit_event(db, org_id, user.username, "ACTIVITY_IMPORT", {"count": count, "invalid": len(invalid), "filename": file.filename})
     db.commit()
-    emit_event(db, org_id, user.username, "ACTIVITY_IMPORT", {"count": count, "filename": file.filename})
-    return {"ok": True, "imported": count}
+    return {"ok": True, "imported": count, "invalid": len(invalid), "invalid_rows": invalid[:100]}
 
 # -------- Runs (CFO/CFP) --------
 @app.post("/api/calc/run")
-def run_calc(request: Request, payload: dict, db: Session = Depends(get_db), user=Depends(require_org_roles("CALCULATOR","EXPERT"))):
+def run_calc(request: Request, payload: dict, format: str = "json", db: Session = Depends(get_db), user=Depends(require_org_roles("CALCULATOR","EXPERT"))):
     org_id = request.state.org.id
     run_type = payload.get("run_type","CFO")
     activity_ids = payload.get("activity_ids") or []
     if not activity_ids:
         raise HTTPException(400, "activity_ids required")
-    result = compute_run(db, activity_ids, run_type, org_id)
+    try:
+        activities = load_activities(db, org_id, activity_ids)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    # inputs are re-checked against the current EF specs up front, so a bad row
+    # fails the request before any work instead of midway through the run
+    catalog = get_catalog(db, org_id)
+    bad = [(a.id, errs) for a, errs in zip(activities, validate_activities(catalog, [(a.ef_key, a.inputs) for a in activities])) if errs]
+    if bad:
+        sample = "; ".join(f"activity {aid}: {', '.join(errs)}" for aid, errs in bad[:5])
+        raise HTTPException(400, f"{len(bad)} activities have invalid inputs ({sample})")
+
+    # identical inputs (activities, their content and EF payloads) reuse the earlier run
+    fp = run_fingerprint(org_id, run_type, activities, catalog)
+    if fp and payload.get("reuse", True):
+        hit = cached_run(db, org_id, fp)
+        if hit is not None:
+            run_id = hit.id
+            out = {"ok": True, "run_id": run_id, "cached": True, "run_type": hit.run_type,
+                   "total_kgco2e": hit.total_kgco2e, "total_tco2e": hit.total_tco2e,
+                   "details": expand_details(hit.details, iter_run_rows(db, hit) if is_chunked(hit.details) else None),
+                   "ef_snapshot": hit.ef_snapshot}
+            emit_event(db, org_id, user.username, "RUN_REUSED", {"run_id": run_id, "fingerprint": fp})
+            db.commit()
+            return _run_response(out, format)
+
+    # partitioned: sharded over the bulk queue, the run is RUNNING until the reduce job merges it
+    partitioned = payload.get("partitioned")
+    if partitioned is None:
+        partitioned = bool(PARTITION_MIN_ROWS) and len(activity_ids) >= PARTITION_MIN_ROWS
+    if partitioned:
+        try:
+            shard_size = int(payload.get("shard_size") or SHARD_SIZE)
+        except (TypeError, ValueError):
+            raise HTTPException(400, "shard_size must be an integer")
+        snapshot = {a.ef_key: catalog.get(a.ef_key).payload_hash for a in activities}
+        r = start_partitioned_run(db, org_id, run_type, activity_ids, snapshot, fingerprint=fp, actor=user.username, shard_size=shard_size)
+        run_id, shards = r.id, r.details["partitioned"]["shards"]
+        emit_event(db, org_id, user.username, "RUN_STARTED", {"run_id": run_id, "run_type": run_type, "shards": shards})
+        db.commit()
+        job_ids = enqueue_shards(org_id, run_id, list(range(shards)))
+        return TimedJSONResponse({"ok": True, "run_id": run_id, "status": "RUNNING", "shards": shards, "job_ids": job_ids},
+                                 status_code=202)
+
+    result = compute_run(db, activity_ids, run_type, org_id, activities)
 
     r = CalculationRun(
         org_id=org_id,
         run_type=result["run_type"],
         total_kgco2e=result["total_kgco2e"],
         total_tco2e=result["total_tco2e"],
-        details=result["details"],
         ef_snapshot=result.get("ef_snapshot") or {},
     )
     db.add(r)
+    db.flush()
+    run_id = r.id
+    store_details(db, r, compact_details(result["details"]["rows"]))
+    if fp:
+        remember_run(db, org_id, fp, run_id)
+    refresh_cube(db, run_id)
+    emit_event(db, org_id, user.username, "RUN_CREATED", {"run_id": run_id, "run_type": r.run_type, "total_tco2e": r.total_tco2e})
     db.commit()
-    db.refresh(r)
-    emit_event(db, org_id, user.username, "RUN_CREATED", {"run_id": r.id, "run_type": r.run_type, "total_tco2e": r.total_tco2e})
-    return {"ok": True, "run_id": r.id, **result}
+    return _run_response({"ok": True, "run_id": run_id, "cached": False, **result}, format)
+
+def _run_response(out: dict, format: str):
+    # NDJSON: a summary line without rows, then one line per row
+    if format != "ndjson":
+        return TimedJSONResponse(out)
+    details = out.pop("details") or {}
+    rows = details.get("rows") or []
+    summary = {"type": "summary", **out, "details": {k: v for k, v in details.items() if k != "rows"}, "rows": len(rows)}
+    return ndjson_response(itertools.chain([summary], ({"type": "row", **row} for row in rows)))
+
+def _analysis_activity_ids(db: Session, org_id: int, payload: dict) -> list[int]:
+    # analyses take explicit activity_ids or reuse the activity set of an existing run
+    activity_ids = payload.get("activity_ids") or []
+    run_id = payload.get("run_id")
+    if run_id and not activity_ids:
+        run = db.query(CalculationRun).filter(CalculationRun.org_id==org_id, CalculationRun.id==run_id).one_or_none()
+        if not run:
+            raise HTTPException(404, "Run not found")
+        activity_ids = [row["activity_id"] for row in iter_run_rows(db, run) if row.get("activity_id")]
+    if not activity_ids:
+        raise HTTPException(400, "activity_ids or run_id required")
+    return activity_ids
+
+@app.post("/api/calc/uncertainty")
+def run_uncertainty(request: Request, payload: dict, db: Session = Depends(get_db), user=Depends(require_org_roles("CALCULATOR","EXPERT"))):
+    org_id = request.state.org.id
+    run_id = payload.get("run_id")
+    try:
+        iterations = int(payload["iterations"]) if payload.get("iterations") is not None else 10000
+        confidence = float(payload["confidence"]) if payload.get("confidence") is not None else 0.95
+        seed = None if payload.get("seed") is None else int(payload["seed"])
+    except (TypeError, ValueError):
+        raise HTTPException(400, "iterations and seed must be integers and confidence a number")
+    if not (1 <= iterations <= 100000) or not (0 < confidence < 1):
+        raise HTTPException(400, "iterations must be 1..100000 and confidence in (0, 1)")
+    opts = {"iterations": iterations, "confidence": confidence, "seed": seed}
+    try:
+        if run_id and not payload.get("activity_ids"):
+            # the stored rows are the base: the result describes the run, not a recomputation
+            run = db.query(CalculationRun).filter(CalculationRun.org_id==org_id, CalculationRun.id==run_id).one_or_none()
+            if not run:
+                raise HTTPException(404, "Run not found")
+            if run.status != "DONE":
+                raise HTTPException(409, f"Run is {run.status}")
+            with stage_timer("calc"):
+                out = monte_carlo_for_run(db, run, **opts)
+        else:
+            activity_ids = _analysis_activity_ids(db, org_id, payload)
+            with stage_timer("calc"):
+                out = monte_carlo_run(db, activity_ids, org_id, **opts)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return TimedJSONResponse({"ok": True, "run_id": run_id, **out})
+
+@app.post("/api/calc/scenarios")
+def run_scenarios(request: Request, payload: dict, db: Session = Depends(get_db), user=Depends(require_org_roles("CALCULATOR","EXPERT","POLICY_ADVISOR"))):
+    org_id = request.state.org.id
+    activity_ids = _analysis_activity_ids(db, org_id, payload)
+    scenarios = payload.get("scenarios") or []
+    if not isinstance(scenarios, list) or not scenarios:
+        raise HTTPException(400, "scenarios required")
+    try:
+        with stage_timer("calc"):
+            out = sweep(db, activity_ids, org_id, scenarios, include_rows=payload.get("include_rows", True))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return TimedJSONResponse({"ok": True, "run_id": payload.get("run_id"), **out})
 
 @app.get("/api/calc/runs")
-def list_runs(request: Request, db: Session = Depends(get_db), user=Depends(require_org_roles("CALCULATOR","EXPERT","AUDITOR","VERIFIER"))):
+def list_runs(request: Request, db: Session = Depends(get_read_db), user=Depends(require_org_roles("CALCULATOR","EXPERT","AUDITOR","VERIFIER"))):
     org_id = request.state.org.id
     rows = db.query(CalculationRun).filter(CalculationRun.org_id==org_id).order_by(CalculationRun.id.desc()).limit(50).all()
     return [{
         "id": r.id, "run_type": r.run_type,
         "total_tco2e": r.total_tco2e,
         "review_status": r.review_status,
+        "status": r.status,
         "created_at": r.created_at.isoformat()
     } for r in rows]
 
+@app.get("/api/calc/runs/{run_id}/shards")
+def run_shards(request: Request, run_id: int, db: Session = Depends(get_read_db), user=Depends(require_org_roles("CALCULATOR","EXPERT","AUDITOR","VERIFIER"))):
+    org_id = request.state.org.id
+    run = db.query(CalculationRun).filter(CalculationRun.org_id==org_id, CalculationRun.id==run_id).one_or_none()
+    if not run:
+        raise HTTPException(404, "Run not found")
+    # shards are deleted once merged, so a DONE run lists none
+    return {"run_id": run_id, "status": run.status, "shards": shard_progress(db, org_id, run_id)}
+
+@app.post("/api/calc/runs/{run_id}/retry")
+def retry_run(request: Request, run_id: int, db: Session = Depends(get_db), user=Depends(require_org_roles("CALCULATOR","EXPERT"))):
+    org_id = request.state.org.id
+    try:
+        shards = retry_failed_shards(db, org_id, run_id)
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+    run = db.get(CalculationRun, (org_id, run_id))
+    if run.status == "DONE":
+        raise HTTPException(409, "Run is already complete")
+    emit_event(db, org_id, user.username, "RUN_RETRIED", {"run_id": run_id, "shards": shards})
+    db.commit()
+    job_ids = enqueue_shards(org_id, run_id, shards) if shards else [enqueue_reduce(org_id, run_id)]
+    return {"ok": True, "run_id": run_id, "status": "RUNNING", "shards": shards, "job_ids": job_ids}
+
 @app.post("/api/runs/{run_id}/review")
 def review_run(request: Request, run_id: int, payload: dict, db: Session = Depends(get_db), user=Depends(require_org_roles("VERIFIER","AUDITOR"))):
     org_id = request.state.org.id
     run = db.query(CalculationRun).filter(CalculationRun.org_id==org_id, CalculationRun.id==run_id).one_or_none()
     if not run:
         raise HTTPException(404, "Run not found")
+    if run.status != "DONE":
+        raise HTTPException(409, f"Run is {run.status}")
     run.review_status = "REVIEWED"
     run.reviewed_by = user.username
     run.reviewed_at = datetime.datetime.utcnow()
     run.details = run.details or {}
     run.details["review_notes"] = payload.get("notes")
     db.add(run)
-    db.commit()
+    set_cube_status(db, run_id, run.review_status)
     emit_event(db, org_id, user.username, "RUN_REVIEWED", {"run_id": run_id})
+    db.commit()
     return {"ok": True, "run_id": run_id, "review_status": run.review_status}
 
 @app.post("/api/runs/{run_id}/approve")
@@ -362,19 +571,78 @@ def approve_run(request: Request, run_id: int, payload: dict, db: Session = Depe
     run = db.query(CalculationRun).filter(CalculationRun.org_id==org_id, CalculationRun.id==run_id).one_or_none()
     if not run:
         raise HTTPException(404, "Run not found")
+    if run.status != "DONE":
+        raise HTTPException(409, f"Run is {run.status}")
     run.review_status = "APPROVED"
     run.approved_by = user.username
     run.approved_at = datetime.datetime.utcnow()
     run.details = run.details or {}
     run.details["approval_notes"] = payload.get("notes")
     db.add(run)
-    db.commit()
+    set_cube_status(db, run_id, run.review_status)
     emit_event(db, org_id, user.username, "RUN_APPROVED", {"run_id": run_id})
+    db.commit()
     return {"ok": True, "run_id": run_id, "review_status": run.review_status}
 
+@app.get("/api/runs/{run_id}/diff/{other_run_id}")
+def diff_runs(request: Request, run_id: int, other_run_id: int, include_unchanged: bool = False,
+              db: Session = Depends(get_read_db), user=Depends(require_org_roles("VERIFIER","AUDITOR","EXPERT","CALCULATOR"))):
+    org_id = request.state.org.id
+    headers = load_run_headers(db, org_id, run_id, other_run_id)
+    for rid in (run_id, other_run_id):
+        if rid not in headers:
+            raise HTTPException(404, f"Run not found: {rid}")
+    base, other = headers[run_id], headers[other_run_id]
+    session_factory = read_bind(request)[1]
+
+    def stream():
+        sdb = session_factory()
+        try:
+            yield from iter_run_diff_ndjson(sdb, org_id, base, other, include_unchanged=include_unchanged)
+        finally:
+            sdb.close()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson",
+                             headers={"Content-Disposition": f"attachment; filename=run_{run_id}_vs_{other_run_id}.ndjson"})
+
+@app.get("/api/cube")
+def emissions_cube(request: Request, dims: str = "period,scope", grain: str = "month", status: str = "APPROVED",
+                   run_id: list[int] | None = Query(None), scope: str | None = None, category: str | None = None,
+                   ef_key: str | None = None, period_from: str | None = None, period_to: str | None = None, all_runs: bool = False,
+                   run_type: str | None = None, site: str | None = None,
+                   db: Session = Depends(get_read_db), user=Depends(require_org_roles("CALCULATOR","EXPERT","AUDITOR","VERIFIER","POLICY_ADVISOR"))):
+    org_id = request.state.org.id
+    try:
+        return query_cube(db, org_id, [d.strip() for d in dims.split(",") if d.strip()], grain=grain,
+                          status=None if status.upper() == "ANY" else status.upper(), run_ids=run_id,
+                          scope=scope, category=category, ef_key=ef_key, period_from=period_from, period_to=period_to,
+                          latest=not all_runs, run_type=run_type, site=site)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+# -------- Bulk columnar export --------
+@app.get("/api/bulk/{dataset}")
+def bulk_export(request: Request, dataset: str, format: str = "arrow", columns: str | None = None,
+                run_id: list[int] | None = Query(None), scope: str | None = None, category: str | None = None,
+                ef_key: str | None = None, period: str | None = None, period_from: str | None = None, period_to: str | None = None,
+                user=Depends(require_org_roles("CALCULATOR","EXPERT","AUDITOR","VERIFIER"))):
+    # dataset: activities | efs | run_rows; format: arrow (IPC stream) | parquet.
+    # period bounds compare as strings, so use the same YYYY-MM form as the data
+    org_id = request.state.org.id
+    filters = {"run_ids": run_id, "scope": scope, "category": category, "ef_key": ef_key,
+               "period": period, "period_from": period_from, "period_to": period_to}
+    try:
+        body = stream_dataset(dataset, org_id, format, bind=read_bind(request)[0], columns=[c.strip() for c in columns.split(",") if c.strip()] if columns else None,
+                              filters=filters)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    ext = "arrows" if format == "arrow" else "parquet"
+    return StreamingResponse(body, media_type=BULK_FORMATS[format],
+                             headers={"Content-Disposition": f"attachment; filename={dataset}.{ext}"})
+
 # -------- Carbon Credit Project Developer --------
 @app.get("/api/credit/projects")
-def list_credit_projects(request: Request, db: Session = Depends(get_db), user=Depends(require_org_roles("PROJECT_DEVELOPER","EXPERT"))):
+def list_credit_projects(request: Request, db: Session = Depends(get_read_db), user=Depends(require_org_roles("PROJECT_DEVELOPER","EXPERT"))):
     org_id = request.state.org.id
     rows = db.query(CarbonCreditProject).filter(CarbonCreditProject.org_id==org_id).order_by(CarbonCreditProject.id.desc()).all()
     return [{
@@ -397,8 +665,9 @@ def upsert_credit_project(request: Request, payload: dict, db: Session = Depends
         payload["org_id"] = org_id
         p = CarbonCreditProject(**payload)
         db.add(p)
-    db.commit()
+    bump_portfolio_version(db, org_id)
     emit_event(db, org_id, user.username, "CREDIT_PROJECT_UPSERT", {"project_code": code})
+    db.commit()
     return {"ok": True, "project_code": code}
 
 @app.post("/api/credit/calc")
@@ -407,7 +676,10 @@ def calc_credit(request: Request, payload: dict, db: Session = Depends(get_db),
     code = payload.get("project_code")
     if not code:
         raise HTTPException(400, "project_code required")
-    trace = calc_carbon_credit(db, code)
+    try:
+        trace = calc_carbon_credit(db, code, org_id)
+    except ValueError as e:
+        raise HTTPException(404, str(e))
 
     r = CalculationRun(
         org_id=org_id,
@@ -418,10 +690,22 @@ def calc_credit(request: Request, payload: dict, db: Session = Depends(get_db),
         ef_snapshot={},
     )
     db.add(r)
+    db.flush()
+    run_id = r.id
+    emit_event(db, org_id, user.username, "CREDIT_RUN_CREATED", {"run_id": run_id, "project_code": code, "net_tco2e": trace["net_tco2e"]})
     db.commit()
-    db.refresh(r)
-    emit_event(db, org_id, user.username, "CREDIT_RUN_CREATED", {"run_id": r.id, "project_code": code, "net_tco2e": trace["net_tco2e"]})
-    return {"ok": True, "run_id": r.id, **trace}
+    return {"ok": True, "run_id": run_id, **trace}
+
+@app.post("/api/credit/portfolio")
+def credit_portfolio(request: Request, payload: dict, db: Session = Depends(get_db), user=Depends(require_org_roles("PROJECT_DEVELOPER","EXPERT","POLICY_ADVISOR"))):
+    # all (or the listed / filtered) projects of the org in one pass; no runs are written
+    org_id = request.state.org.id
+    try:
+        out = calc_portfolio(db, org_id, project_codes=payload.get("project_codes"),
+                             vintage=payload.get("vintage"), methodology=payload.get("methodology"))
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+    return {"ok": True, **out}
 
 # -------- Audit --------
 @app.post("/api/audit/run/{run_id}")
@@ -431,31 +715,65 @@ def audit(request: Request, run_id: int, db: Session = Depends(get_db), user=Dep
     emit_event(db, org_id, user.username, "AUDIT_RUN", {"run_id": run_id, "score": out.get("score")})
     return out
 
+@app.get("/api/audit/events")
+def list_audit_events(request: Request, action: str | None = None, actor: str | None = None,
+                      since: datetime.datetime | None = None, until: datetime.datetime | None = None,
+                      cursor: str | None = None, limit: int = 100,
+                      db: Session = Depends(get_read_db), user=Depends(require_org_roles("AUDITOR","VERIFIER"))):
+    org_id = request.state.org.id
+    try:
+        items, next_cursor = query_events(db, org_id, action=action, actor=actor, since=since, until=until,
+                                          cursor=cursor, limit=max(1, min(limit, 1000)))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/api/audit/events/export")
+def export_audit_events(request: Request, action: str | None = None, actor: str | None = None,
+                        since: datetime.datetime | None = None, until: datetime.datetime | None = None,
+                        user=Depends(require_org_roles("AUDITOR","VERIFIER"))):
+    org_id = request.state.org.id
+    session_factory = read_bind(request)[1]
+
+    def stream():
+        db = session_factory()
+        try:
+            yield from iter_events_ndjson(db, org_id, action=action, actor=actor, since=since, until=until)
+        finally:
+            db.close()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson",
+                             headers={"Content-Disposition": "attachment; filename=audit_events.ndjson"})
+
 @app.post("/api/audit/enqueue/{run_id}")
-def enqueue_audit(request: Request, run_id: int, user=Depends(require_org_roles("AUDITOR","VERIFIER"))):
-    redis_url = os.getenv("REDIS_URL","redis://localhost:6379/0")
-    q = Queue(connection=redis.from_url(redis_url))
-    job = q.enqueue(job_run_audit, run_id)
-    return {"ok": True, "job_id": job.id}
+def enqueue_audit(request: Request, run_id: int, priority: str = "interactive", user=Depends(require_org_roles("AUDITOR","VERIFIER"))):
+    org_id = request.state.org.id
+    try:
+        job, deduplicated = enqueue(job_run_audit, run_id, org_id=org_id, priority=priority, dedup_key=f"audit_run.{run_id}")
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"ok": True, "job_id": job.id, "deduplicated": deduplicated}
 
 # -------- Report export --------
 @app.get("/api/reports/run/{run_id}.pdf")
-def report_pdf(request: Request, run_id: int, db: Session = Depends(get_db), user=Depends(require_org_roles("AUDITOR","VERIFIER","EXPERT"))):
+def report_pdf(request: Request, run_id: int, db: Session = Depends(get_read_db), user=Depends(require_org_roles("AUDITOR","VERIFIER","EXPERT"))):
     org_id = request.state.org.id
     run = db.query(CalculationRun).filter(CalculationRun.org_id==org_id, CalculationRun.id==run_id).one_or_none()
     if not run:
         raise HTTPException(404, "Run not found")
-    data = export_run_pdf(db, run_id)
+    with stage_timer("render"):
+        data = export_run_pdf(db, run_id)
     return Response(content=data, media_type="application/pdf",
                     headers={"Content-Disposition": f"attachment; filename=run_{run_id}.pdf"})
 
 @app.get("/api/reports/run/{run_id}.xlsx")
-def report_xlsx(request: Request, run_id: int, db: Session = Depends(get_db), user=Depends(require_org_roles("AUDITOR","VERIFIER","EXPERT","CALCULATOR"))):
+def report_xlsx(request: Request, run_id: int, db: Session = Depends(get_read_db), user=Depends(require_org_roles("AUDITOR","VERIFIER","EXPERT","CALCULATOR"))):
     org_id = request.state.org.id
     run = db.query(CalculationRun).filter(CalculationRun.org_id==org_id, CalculationRun.id==run_id).one_or_none()
     if not run:
         raise HTTPException(404, "Run not found")
-    data = export_run_excel(db, run_id)
+    with stage_timer("render"):
+        data = export_run_excel(db, run_id)
     return Response(content=data, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                     headers={"Content-Disposition": f"attachment; filename=run_{run_id}.xlsx"})
 
@@ -471,27 +789,29 @@ def sign_run(request: Request, run_id: int, db: Session = Depends(get_db), user=
     payload = {"run_id": run.id, "run_type": run.run_type, "total_tco2e": run.total_tco2e, "details": run.details}
     h = calc_run_hash(payload)
     priv_pem, pub_pem = load_or_generate_keypair()
-    sig_b64 = sign_hash(h, priv_pem)
+    with stage_timer("sign"):
+        sig_b64 = sign_hash(h, priv_pem)
 
     rec = RunSignature(org_id=org_id, run_id=run.id, algo="ed25519", run_hash=h, signature_b64=sig_b64,
                        public_key_pem=pub_pem.decode("utf-8"), signed_by=user.username)
     db.add(rec)
-    db.commit()
     emit_event(db, org_id, user.username, "RUN_SIGNED", {"run_id": run.id, "hash": h})
+    db.commit()
     return {"ok": True, "run_id": run.id, "hash": h, "signature_b64": sig_b64}
 
 @app.get("/api/reports/run/{run_id}/verify")
-def verify_run_signature(request: Request, run_id: int, db: Session = Depends(get_db), user=Depends(require_org_roles("AUDITOR","VERIFIER","EXPERT","CALCULATOR"))):
+def verify_run_signature(request: Request, run_id: int, db: Session = Depends(get_read_db), user=Depends(require_org_roles("AUDITOR","VERIFIER","EXPERT","CALCULATOR"))):
     org_id = request.state.org.id
     sig = db.query(RunSignature).filter(RunSignature.org_id==org_id, RunSignature.run_id==run_id).order_by(RunSignature.id.desc()).first()
     if not sig:
         raise HTTPException(404, "No signature record")
-    ok = verify_hash(sig.run_hash, sig.signature_b64, sig.public_key_pem.encode("utf-8"))
+    with stage_timer("verify"):
+        ok = verify_hash(sig.run_hash, sig.signature_b64, sig.public_key_pem.encode("utf-8"))
     return {"ok": ok, "algo": sig.algo, "hash": sig.run_hash, "signed_by": sig.signed_by, "signed_at": sig.signed_at.isoformat()}
 
 # -------- Dashboard --------
 @app.get("/api/dashboard")
-def dashboard(request: Request, db: Session = Depends(get_db), user=Depends(require_org_roles("CALCULATOR","EXPERT","AUDITOR","VERIFIER","PROJECT_DEVELOPER"))):
+def dashboard(request: Request, db: Session = Depends(get_read_db), user=Depends(require_org_roles("CALCULATOR","EXPERT","AUDITOR","VERIFIER","PROJECT_DEVELOPER"))):
     org_id = request.state.org.id
     return {
         "counts": {
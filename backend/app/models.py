@@ -1,15 +1,16 @@
 from __future__ import annotations
 from datetime import datetime, date
-from sqlalchemy import String, Float, Integer, DateTime, Boolean, Text, Date, ForeignKey
+from sqlalchemy import String, Float, Integer, BigInteger, DateTime, Boolean, Text, Date, ForeignKey, ForeignKeyConstraint, Index, PrimaryKeyConstraint, text
 from sqlalchemy.dialects.postgresql import JSONB, ARRAY
 from sqlalchemy.orm import Mapped, mapped_column
 from .db import Base
 
 class EmissionFactor(Base):
+    # keys are unique per org; every lookup is (org_id, key)
     __tablename__ = "emission_factors"
 
-    org_id: Mapped[int] = mapped_column(Integer, ForeignKey("orgs.id", ondelete="CASCADE"), index=True, default=1)
-    key: Mapped[str] = mapped_column(String, primary_key=True, index=True)
+    org_id: Mapped[int] = mapped_column(Integer, ForeignKey("orgs.id", ondelete="CASCADE"), primary_key=True, default=1)
+    key: Mapped[str] = mapped_column(String, primary_key=True)
     name: Mapped[str] = mapped_column(String, nullable=False)
 
     unit: Mapped[str] = mapped_column(String, nullable=False)
@@ -57,9 +58,18 @@ class EmissionFactor(Base):
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
 
 class Activity(Base):
+    # hash-partitioned on org_id (see app.services.tenant_partitions); ids stay
+    # globally unique through the shared sequence
     __tablename__ = "activities"
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    org_id: Mapped[int] = mapped_column(Integer, ForeignKey("orgs.id", ondelete="CASCADE"), index=True, default=1)
+    __table_args__ = (
+        PrimaryKeyConstraint("org_id", "id"),
+        Index("ix_activities_org_ef_key", "org_id", "ef_key"),
+        Index("ix_activities_org_period", "org_id", "period"),
+        Index("ix_activities_org_invalid", "org_id", postgresql_where=text("input_errors IS NOT NULL")),
+        {"postgresql_partition_by": "HASH (org_id)"},
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    org_id: Mapped[int] = mapped_column(Integer, ForeignKey("orgs.id", ondelete="CASCADE"), primary_key=True, default=1)
 
     name: Mapped[str] = mapped_column(String, nullable=False)
     ef_key: Mapped[str] = mapped_column(String, nullable=False)
@@ -68,13 +78,23 @@ class Activity(Base):
     scope: Mapped[str] = mapped_column(String, default="Scope3")
     lifecycle_stage: Mapped[str | None] = mapped_column(String, nullable=True)
     period: Mapped[str | None] = mapped_column(String, nullable=True)
+    site: Mapped[str | None] = mapped_column(String, nullable=True)
     note: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # input problems found against the EF's activity_id_fields at ingest; NULL = valid
+    input_errors: Mapped[list | None] = mapped_column(JSONB, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 class CalculationRun(Base):
+    # hash-partitioned on org_id like activities; ix_calculation_runs_id serves the
+    # few lookups (workers, report export) that only know the run id
     __tablename__ = "calculation_runs"
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    org_id: Mapped[int] = mapped_column(Integer, ForeignKey("orgs.id", ondelete="CASCADE"), index=True, default=1)
+    __table_args__ = (
+        PrimaryKeyConstraint("org_id", "id"),
+        Index("ix_calculation_runs_id", "id"),
+        {"postgresql_partition_by": "HASH (org_id)"},
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    org_id: Mapped[int] = mapped_column(Integer, ForeignKey("orgs.id", ondelete="CASCADE"), primary_key=True, default=1)
 
     run_type: Mapped[str] = mapped_column(String, nullable=False)  # CFO/CFP/CREDIT
     total_kgco2e: Mapped[float] = mapped_column(Float, default=0.0)
@@ -84,6 +104,8 @@ class CalculationRun(Base):
     ef_snapshot: Mapped[dict] = mapped_column(JSONB, default=dict)  # {ef_key: payload_hash}
 
     review_status: Mapped[str] = mapped_column(String, default="DRAFT")  # DRAFT/REVIEWED/APPROVED
+    # RUNNING while a partitioned run's shards are computed, FAILED once a shard gives up
+    status: Mapped[str] = mapped_column(String, default="DONE", server_default="DONE")  # RUNNING/DONE/FAILED
     reviewed_by: Mapped[str | None] = mapped_column(String, nullable=True)
     reviewed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     approved_by: Mapped[str | None] = mapped_column(String, nullable=True)
@@ -92,6 +114,105 @@ class CalculationRun(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     note: Mapped[str | None] = mapped_column(Text, nullable=True)
 
+class EFCatalogVersion(Base):
+    # bumped in the same transaction as any EF write; in-process catalogs reload on change
+    __tablename__ = "ef_catalog_versions"
+    org_id: Mapped[int] = mapped_column(Integer, ForeignKey("orgs.id", ondelete="CASCADE"), primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, default=0)
+
+class CreditPortfolioVersion(Base):
+    # bumped by credit project upserts; in-process portfolio results reload on change
+    __tablename__ = "credit_portfolio_versions"
+    org_id: Mapped[int] = mapped_column(Integer, ForeignKey("orgs.id", ondelete="CASCADE"), primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, default=0)
+
+class CalcResultCache(Base):
+    # fingerprint of a run's inputs -> the run that already holds its results
+    __tablename__ = "calc_result_cache"
+    __table_args__ = (
+        ForeignKeyConstraint(["org_id", "run_id"], ["calculation_runs.org_id", "calculation_runs.id"], ondelete="CASCADE",
+                             name="calc_result_cache_run_fkey"),
+    )
+    org_id: Mapped[int] = mapped_column(Integer, ForeignKey("orgs.id", ondelete="CASCADE"), primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String, primary_key=True)
+    run_id: Mapped[int] = mapped_column(Integer, index=True)
+    hits: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_hit_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+class CalcRunRows(Base):
+    # rows of a large run, CALC_TRACE_CHUNK_SIZE per JSONB value (see run_trace);
+    # hash-partitioned on org_id like the runs they belong to
+    __tablename__ = "calc_run_rows"
+    __table_args__ = (
+        PrimaryKeyConstraint("org_id", "run_id", "first_row"),
+        ForeignKeyConstraint(["org_id", "run_id"], ["calculation_runs.org_id", "calculation_runs.id"], ondelete="CASCADE",
+                             name="calc_run_rows_run_fkey"),
+        {"postgresql_partition_by": "HASH (org_id)"},
+    )
+    org_id: Mapped[int] = mapped_column(Integer, ForeignKey("orgs.id", ondelete="CASCADE"))
+    run_id: Mapped[int] = mapped_column(Integer)
+    first_row: Mapped[int] = mapped_column(Integer)  # 0-based position of the chunk's first row in the run
+    rows: Mapped[list] = mapped_column(JSONB, nullable=False)
+
+class CalcRunShard(Base):
+    # one slice of the activity ids of a partitioned run, computed by its own RQ job.
+    # The job writes the slice's rows to calc_run_rows and its cube cells; the reduce
+    # only folds the totals/efs/chunk manifests below into the run and deletes the shards
+    __tablename__ = "calc_run_shards"
+    __table_args__ = (
+        ForeignKeyConstraint(["org_id", "run_id"], ["calculation_runs.org_id", "calculation_runs.id"], ondelete="CASCADE",
+                             name="calc_run_shards_run_fkey"),
+    )
+    org_id: Mapped[int] = mapped_column(Integer, ForeignKey("orgs.id", ondelete="CASCADE"), primary_key=True)
+    run_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    shard: Mapped[int] = mapped_column(Integer, primary_key=True)
+    activity_ids: Mapped[list] = mapped_column(JSONB, default=list)
+    first_row: Mapped[int] = mapped_column(Integer, default=0)  # position of the shard's first row in the run
+    status: Mapped[str] = mapped_column(String, default="PENDING")  # PENDING/DONE/FAILED
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    total_kgco2e: Mapped[float] = mapped_column(Float, default=0.0)
+    ef_snapshot: Mapped[dict] = mapped_column(JSONB, default=dict)
+    efs: Mapped[dict] = mapped_column(JSONB, default=dict)  # EF-level trace fields, see run_trace
+    chunks: Mapped[list] = mapped_column(JSONB, default=list)  # manifest of the calc_run_rows written
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class EmissionsCubeCell(Base):
+    # kgCO2e of one run pre-aggregated by (period, scope, site, category, ef_key); rebuilt
+    # when the run is created, review_status follows the run
+    __tablename__ = "emissions_cube"
+    __table_args__ = (
+        Index("ix_emissions_cube_org_status_period", "org_id", "review_status", "year", "month"),
+        Index("ix_emissions_cube_org_type_period", "org_id", "run_type", "period", "run_id"),
+        Index("ix_emissions_cube_org_scope", "org_id", "scope", "year", "month"),
+        ForeignKeyConstraint(["org_id", "run_id"], ["calculation_runs.org_id", "calculation_runs.id"], ondelete="CASCADE",
+                             name="emissions_cube_run_fkey"),
+    )
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    org_id: Mapped[int] = mapped_column(Integer, ForeignKey("orgs.id", ondelete="CASCADE"))
+    run_id: Mapped[int] = mapped_column(Integer, index=True)
+    review_status: Mapped[str] = mapped_column(String, default="DRAFT")
+    run_type: Mapped[str] = mapped_column(String, default="")
+    period: Mapped[str] = mapped_column(String, default="")
+    site: Mapped[str] = mapped_column(String, default="")
+    year: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    month: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    scope: Mapped[str] = mapped_column(String, default="N/A")
+    category: Mapped[str] = mapped_column(String, default="Unclassified")
+    ef_key: Mapped[str] = mapped_column(String, nullable=False)
+    kgco2e: Mapped[float] = mapped_column(Float, default=0.0)
+    row_count: Mapped[int] = mapped_column(Integer, default=0)
+
+class SeedState(Base):
+    __tablename__ = "seed_state"
+    # one row per seeded dataset and org
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    org_id: Mapped[int] = mapped_column(Integer, ForeignKey("orgs.id", ondelete="CASCADE"), primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String, nullable=False)
+    item_count: Mapped[int] = mapped_column(Integer, default=0)
+    applied_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
 class CarbonCreditProject(Base):
     __tablename__ = "credit_projects"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -1,11 +1,96 @@
 from __future__ import annotations
-import logging
+import logging, os, time
+from contextvars import ContextVar
 import structlog
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
 
+# `path` is the matched route template (e.g. /api/efs/{key}), never the raw URL
 REQ_COUNTER = Counter("http_requests_total", "Total HTTP requests", ["method","path","status"])
 REQ_LATENCY = Histogram("http_request_latency_seconds", "HTTP request latency", ["path"])
 
+# db / calc / formula / serialize / render / sign / verify
+STAGE_LATENCY = Histogram("app_stage_latency_seconds", "Latency of internal processing stages", ["stage"])
+_DB_STAGE = STAGE_LATENCY.labels(stage="db")
+
+REQ_SQL_QUERIES = Histogram("http_request_sql_queries", "SQL statements executed per request", ["path"],
+                            buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+
+# rate limiting, in cost units; scope is org / user / anon
+RATE_LIMIT_UNITS = Counter("app_rate_limit_units_total", "Rate-limit cost units consumed", ["scope", "org"])
+RATE_LIMIT_REJECTED = Counter("app_rate_limit_rejected_total", "Requests rejected by the rate limiter", ["scope", "org"])
+RATE_LIMIT_REMAINING = Gauge("app_rate_limit_org_remaining_units", "Units left in the org's current window", ["org"])
+RATE_LIMIT_ERRORS = Counter("app_rate_limit_storage_errors_total", "Rate-limit storage failures")
+
+RESPONSE_BYTES = Histogram("app_response_body_bytes", "Serialized response body size", ["kind"],
+                           buckets=(1e3, 1e4, 1e5, 1e6, 1e7, 1e8))
+
+CALC_CACHE = Counter("app_calc_cache_total", "Calculation result cache lookups", ["result"])
+
+# target is primary / replica; reason says why a read went to the primary
+DB_READ_ROUTE = Counter("app_db_read_route_total", "Read-only sessions by target database", ["target", "reason"])
+REPLICA_LAG = Gauge("app_db_replica_lag_seconds", "Replication lag last measured on the read replica")
+
+SQL_QUERY_WARN_THRESHOLD = int(os.getenv("SQL_QUERY_WARN_THRESHOLD", "50"))
+SQL_TIME_WARN_MS = float(os.getenv("SQL_TIME_WARN_MS", "500"))
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "writes")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.writes = 0
+
+# set per request by the accounting middleware; the mutable stats object is shared
+# with the threadpool/task contexts that actually execute the SQL
+_REQUEST_STATS: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+def begin_request_stats():
+    stats = RequestStats()
+    return stats, _REQUEST_STATS.set(stats)
+
+def current_request_stats() -> RequestStats | None:
+    return _REQUEST_STATS.get()
+
+def end_request_stats(token):
+    _REQUEST_STATS.reset(token)
+
+def report_request_stats(method: str, path: str, status: int, stats: RequestStats, duration: float):
+    REQ_SQL_QUERIES.labels(path=path).observe(stats.queries)
+    db_ms = stats.db_seconds * 1000.0
+    if stats.queries > SQL_QUERY_WARN_THRESHOLD or db_ms > SQL_TIME_WARN_MS:
+        log.warning("sql_heavy_request", method=method, path=path, status=status,
+                    queries=stats.queries, db_ms=round(db_ms, 2), duration_ms=round(duration * 1000.0, 2))
+
+def stage_timer(stage: str):
+    return STAGE_LATENCY.labels(stage=stage).time()
+
+def route_label(request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+_WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "MERGE", "TRUNCATE", "CREATE", "ALTER", "DROP")
+
+def is_write_statement(statement: str) -> bool:
+    return statement.lstrip()[:8].upper().startswith(_WRITE_PREFIXES)
+
+def instrument_engine(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["_query_start"].pop()
+        _DB_STAGE.observe(elapsed)
+        stats = _REQUEST_STATS.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+            if is_write_statement(statement):
+                stats.writes += 1
+
 def configure_logging():
     logging.basicConfig(level=logging.INFO, format="%(message)s")
     structlog.configure(
@@ -0,0 +1,69 @@
+from __future__ import annotations
+import os, random, sys, threading, time
+from collections import Counter
+from datetime import datetime
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/carbon-profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+# leaf frames in these modules are threads parked waiting for work
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+
+# one sampled request at a time keeps the overhead bounded
+_active = threading.Lock()
+
+# Statistical profiler: a background thread samples every thread's stack. Sampling is
+# process-wide, so other requests in flight during the sampled one show up as well.
+class StackSampler:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.counts: Counter[str] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter[str]:
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for tid, frame in sys._current_frames().items():
+                if tid == me or os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.counts[";".join(reversed(stack))] += 1
+
+def maybe_start_profiler() -> StackSampler | None:
+    if PROFILE_SAMPLE_RATE <= 0 or random.random() >= PROFILE_SAMPLE_RATE:
+        return None
+    if not _active.acquire(blocking=False):
+        return None
+    sampler = StackSampler(PROFILE_INTERVAL_MS / 1000.0)
+    sampler.start()
+    return sampler
+
+def finish_profile(sampler: StackSampler, method: str, path: str, duration: float) -> str:
+    try:
+        counts = sampler.stop()
+    finally:
+        _active.release()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = path.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+    fname = os.path.join(PROFILE_DIR, f"{datetime.utcnow():%Y%m%dT%H%M%S%f}_{method}_{slug}_{duration * 1000.0:.0f}ms.folded")
+    # collapsed-stack format, readable by flamegraph.pl / speedscope
+    with open(fname, "w", encoding="utf-8") as f:
+        for stack, n in counts.most_common():
+            f.write(f"{stack} {n}\n")
+    return fname
@@ -0,0 +1,63 @@
+from __future__ import annotations
+import os, threading
+from app.lazy import lazy_module
+
+# redis/rq are loaded by the first enqueue, not by every API process at import
+redis = lazy_module("redis")
+rq = lazy_module("rq")
+
+# Jobs go to one queue per (priority, org): "interactive.<org_id>" or "bulk.<org_id>".
+# The queue names in use are tracked in a Redis set per priority so workers can
+# discover new orgs; see app.worker.FairWorker for the dequeue order.
+PRIORITIES = ("interactive", "bulk")
+QUEUE_SET_KEY = "carbon:queues:{priority}"
+JOB_TIMEOUT = int(os.getenv("JOB_TIMEOUT_SECONDS", "1800"))
+RESULT_TTL = int(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+# rq JobStatus values (a str enum)
+ACTIVE_STATUSES = ("queued", "started", "deferred", "scheduled")
+
+_pool: redis.ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+def redis_url() -> str:
+    return os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+def get_redis() -> redis.Redis:
+    # one connection pool per process, shared by every caller
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = redis.ConnectionPool.from_url(redis_url(), max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "50")))
+    return redis.Redis(connection_pool=_pool)
+
+def queue_name(priority: str, org_id: int) -> str:
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority: {priority} (use {', '.join(PRIORITIES)})")
+    return f"{priority}.{org_id}"
+
+def org_queue_names(conn: redis.Redis, priority: str) -> list[str]:
+    return sorted(n.decode() if isinstance(n, bytes) else n for n in conn.smembers(QUEUE_SET_KEY.format(priority=priority)))
+
+def enqueue(func, *args, org_id: int, priority: str = "interactive", dedup_key: str | None = None, **kwargs) -> tuple[rq.job.Job, bool]:
+    # returns (job, deduplicated); with dedup_key, a queued or running job with the
+    # same key is returned instead of enqueuing a second copy
+    conn = get_redis()
+    name = queue_name(priority, org_id)
+    q = rq.Queue(name, connection=conn)
+    opts = {"job_timeout": JOB_TIMEOUT, "result_ttl": RESULT_TTL}
+    if dedup_key is None:
+        job = q.enqueue(func, *args, **kwargs, **opts)
+        conn.sadd(QUEUE_SET_KEY.format(priority=priority), name)
+        return job, False
+    job_id = f"{dedup_key}.{org_id}"
+    with conn.lock(f"carbon:enqueue-lock:{job_id}", timeout=10, blocking_timeout=10):
+        try:
+            existing = rq.job.Job.fetch(job_id, connection=conn)
+        except Exception:
+            existing = None
+        if existing is not None and existing.get_status(refresh=False) in ACTIVE_STATUSES:
+            return existing, True
+        job = q.enqueue(func, *args, job_id=job_id, **kwargs, **opts)
+    conn.sadd(QUEUE_SET_KEY.format(priority=priority), name)
+    return job, False
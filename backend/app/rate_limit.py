@@ -1,8 +1,190 @@
 from __future__ import annotations
-import os
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+import os, threading, time
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from limits import RateLimitItemPerMinute
+from limits.storage import storage_from_string
+from limits.strategies import MovingWindowRateLimiter
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
 
-def build_limiter() -> Limiter:
-    per_min = os.getenv("RATE_LIMIT_PER_MINUTE","120")
-    return Limiter(key_func=get_remote_address, default_limits=[f"{per_min}/minute"])
+from app.auth.models import User
+from app.auth.security import decode_token
+from app.db import SessionLocal
+from app.tenancy.models import OrgMember
+from app.observability import RATE_LIMIT_UNITS, RATE_LIMIT_REJECTED, RATE_LIMIT_REMAINING, RATE_LIMIT_ERRORS, log
+
+# Quotas are counted in cost units per minute in shared storage (Redis by default),
+# so every API worker enforces the same budget. A request is charged against its
+# user (or the client address when unauthenticated or the token is invalid) and,
+# when that user is a member of the org named in X-Org-Slug, against the org; each
+# org has its own bucket, so one tenant's bulk work only drains that tenant's quota
+# and nobody outside a tenant can spend it.
+
+DEFAULT_COSTS = {
+    "POST /api/calc/run": 10,
+    "POST /api/calc/uncertainty": 25,
+    "POST /api/calc/scenarios": 15,
+    "POST /api/calc/runs/{run_id}/retry": 5,
+    "POST /api/credit/calc": 5,
+    "POST /api/efs/import": 20,
+    "POST /api/activities/import": 20,
+    "POST /api/audit/run/{run_id}": 10,
+    "POST /api/audit/enqueue/{run_id}": 2,
+    "GET /api/audit/events/export": 10,
+    "GET /api/bulk/{dataset}": 20,
+    "GET /api/reports/run/{run_id}.pdf": 10,
+    "GET /api/reports/run/{run_id}.xlsx": 10,
+    "POST /api/reports/run/{run_id}/sign": 3,
+    "GET /api/runs/{run_id}/diff/{other_run_id}": 10,
+}
+WRITE_COST = 2
+READ_COST = 1
+EXEMPT = ("/metrics", "/docs", "/redoc", "/openapi.json")
+# org membership answers are cached per process for this long
+MEMBER_CACHE_SECONDS = float(os.getenv("RATE_LIMIT_MEMBER_CACHE_SECONDS", "60"))
+
+def _parse_pairs(spec: str) -> dict[str, int]:
+    # "a=1,b=2"; keys may contain spaces ("POST /api/calc/run=20")
+    out = {}
+    for part in spec.split(","):
+        name, _, v = part.rpartition("=")
+        if name.strip():
+            out[name.strip()] = int(v)
+    return out
+
+class RateLimiter:
+    def __init__(self, storage_uri: str, org_per_minute: int, user_per_minute: int, anon_per_minute: int,
+                 org_overrides: dict[str, int] | None = None, costs: dict[str, int] | None = None,
+                 fail_open: bool = True):
+        self.storage = storage_from_string(storage_uri)
+        self.strategy = MovingWindowRateLimiter(self.storage)
+        self.org_limit = RateLimitItemPerMinute(org_per_minute)
+        self.user_limit = RateLimitItemPerMinute(user_per_minute)
+        self.anon_limit = RateLimitItemPerMinute(anon_per_minute)
+        self.org_overrides = {slug: RateLimitItemPerMinute(n) for slug, n in (org_overrides or {}).items()}
+        self.costs = {**DEFAULT_COSTS, **(costs or {})}
+        self.fail_open = fail_open
+        self._members: dict[tuple[int, str], tuple[bool, float]] = {}
+        self._members_lock = threading.Lock()
+
+    def cost(self, method: str, route: str) -> int:
+        c = self.costs.get(f"{method} {route}")
+        if c is not None:
+            return c
+        return READ_COST if method in ("GET", "HEAD", "OPTIONS") else WRITE_COST
+
+    def is_member(self, org, username: str, claims: dict) -> bool:
+        # same rule as require_org_roles: ADMIN everywhere, otherwise an org_members row
+        if "ADMIN" in (claims.get("roles") or []):
+            return True
+        key = (org.id, username)
+        now = time.monotonic()
+        hit = self._members.get(key)
+        if hit is not None and hit[1] > now:
+            return hit[0]
+        db = SessionLocal()
+        try:
+            member = db.query(OrgMember.id).join(User, User.id == OrgMember.user_id) \
+                .filter(OrgMember.org_id == org.id, User.username == username).first() is not None
+        finally:
+            db.close()
+        with self._members_lock:
+            self._members[key] = (member, now + MEMBER_CACHE_SECONDS)
+        return member
+
+    def buckets(self, request: Request) -> list[tuple[str, object, str]]:
+        # (scope, limit item, identifier); anonymous callers, invalid tokens and
+        # non-members only ever spend their own bucket
+        org = getattr(request.state, "org", None)
+        org_slug = org.slug if org is not None else "-"
+        claims = _token_claims(request)
+        user = claims.get("sub")
+        if not user:
+            return [("anon", self.anon_limit, f"ip:{request.client.host if request.client else '-'}")]
+        out = [("user", self.user_limit, f"user:{org_slug}:{user}")]
+        if org is not None and self.is_member(org, user, claims):
+            out.append(("org", self.org_overrides.get(org.slug, self.org_limit), f"org:{org.slug}"))
+        return out
+
+    def check(self, request: Request, route: str) -> JSONResponse | None:
+        org = getattr(request.state, "org", None)
+        org_slug = org.slug if org is not None else "-"
+        cost = self.cost(request.method, route)
+        try:
+            buckets = self.buckets(request)
+            # cheap pre-check so a request the org bucket would turn away does not
+            # spend the caller's own quota first; not atomic, so it decides nothing
+            for scope, item, ident in buckets:
+                if not self.strategy.test(item, ident, cost=cost):
+                    return self._reject(scope, item, ident, cost, org_slug)
+            # hit() tests and acquires atomically in storage; its answer is the decision.
+            # The caller's bucket goes first: when a concurrent request takes the last
+            # org units in between, the caller, not the tenant, keeps the spent units
+            for scope, item, ident in buckets:
+                if not self.strategy.hit(item, ident, cost=cost):
+                    return self._reject(scope, item, ident, cost, org_slug)
+                RATE_LIMIT_UNITS.labels(scope=scope, org=org_slug).inc(cost)
+                if scope == "org":
+                    RATE_LIMIT_REMAINING.labels(org=org_slug).set(self.strategy.get_window_stats(item, ident).remaining)
+        except Exception as e:
+            RATE_LIMIT_ERRORS.inc()
+            log.warning("rate_limit_storage_error", error=str(e))
+            if not self.fail_open:
+                return JSONResponse({"detail": "Rate limiter unavailable"}, status_code=503)
+        return None
+
+    def _reject(self, scope: str, item, ident: str, cost: int, org_slug: str) -> JSONResponse:
+        RATE_LIMIT_REJECTED.labels(scope=scope, org=org_slug).inc()
+        stats = self.strategy.get_window_stats(item, ident)
+        retry = max(1, int(stats.reset_time - time.time()))
+        return JSONResponse(
+            {"detail": f"Rate limit exceeded ({scope}: {item.amount} units/minute, request costs {cost})"},
+            status_code=429,
+            headers={"Retry-After": str(retry), "X-RateLimit-Limit": str(item.amount),
+                     "X-RateLimit-Remaining": str(max(0, stats.remaining))},
+        )
+
+def _token_claims(request: Request) -> dict:
+    # {} unless the bearer token verifies
+    auth = request.headers.get("authorization") or ""
+    if not auth.lower().startswith("bearer "):
+        return {}
+    try:
+        return decode_token(auth[7:].strip())
+    except Exception:
+        return {}
+
+def _route_template(request: Request) -> str | None:
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", None)
+    return None
+
+def build_limiter() -> RateLimiter:
+    default = os.getenv("RATE_LIMIT_PER_MINUTE", "120")
+    return RateLimiter(
+        storage_uri=os.getenv("RATE_LIMIT_STORAGE_URI") or os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+        org_per_minute=int(os.getenv("RATE_LIMIT_ORG_PER_MINUTE", "1200")),
+        user_per_minute=int(os.getenv("RATE_LIMIT_USER_PER_MINUTE", default)),
+        anon_per_minute=int(os.getenv("RATE_LIMIT_ANON_PER_MINUTE", default)),
+        org_overrides=_parse_pairs(os.getenv("RATE_LIMIT_ORG_OVERRIDES", "")),
+        costs=_parse_pairs(os.getenv("RATE_LIMIT_COSTS", "")),
+        fail_open=os.getenv("RATE_LIMIT_FAIL_OPEN", "1") == "1",
+    )
+
+def rate_limit_middleware(limiter: RateLimiter):
+    async def mw(request: Request, call_next):
+        path = request.url.path
+        if path.startswith(EXEMPT):
+            return await call_next(request)
+        route = _route_template(request)
+        if route is None:
+            return await call_next(request)
+        # storage and membership lookups are blocking; keep them off the event loop
+        rejected = await run_in_threadpool(limiter.check, request, route)
+        if rejected is not None:
+            return rejected
+        return await call_next(request)
+    return mw
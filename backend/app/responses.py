@@ -0,0 +1,55 @@
+from __future__ import annotations
+import time
+from typing import Any, Iterable, Iterator
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.observability import RESPONSE_BYTES, STAGE_LATENCY, stage_timer
+
+_OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+NDJSON = "application/x-ndjson"
+_SERIALIZE = STAGE_LATENCY.labels(stage="serialize")
+
+def _default(obj):
+    # Decimal, sets, pydantic models and the like; orjson handles the rest natively
+    return jsonable_encoder(obj)
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=_OPTS)
+
+def ndjson_line(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default, option=_OPTS | orjson.OPT_APPEND_NEWLINE)
+
+class TimedJSONResponse(JSONResponse):
+    # Returning this directly from an endpoint also skips FastAPI's jsonable_encoder
+    # pass, which dominates for large nested payloads.
+    def render(self, content: Any) -> bytes:
+        with stage_timer("serialize"):
+            body = dumps(content)
+        RESPONSE_BYTES.labels(kind="json").observe(len(body))
+        return body
+
+def iter_ndjson(items: Iterable[Any], batch: int = 500) -> Iterator[bytes]:
+    # rows are encoded and flushed in chunks so the body is never built in full;
+    # only encoding time is recorded, not time spent producing the rows
+    buf: list[bytes] = []
+    spent = 0.0
+    for item in items:
+        start = time.perf_counter()
+        buf.append(ndjson_line(item))
+        spent += time.perf_counter() - start
+        if len(buf) >= batch:
+            yield _flush(buf, spent)
+            buf, spent = [], 0.0
+    if buf:
+        yield _flush(buf, spent)
+
+def _flush(buf: list[bytes], spent: float) -> bytes:
+    chunk = b"".join(buf)
+    _SERIALIZE.observe(spent)
+    RESPONSE_BYTES.labels(kind="ndjson_chunk").observe(len(chunk))
+    return chunk
+
+def ndjson_response(items: Iterable[Any], filename: str | None = None) -> StreamingResponse:
+    headers = {"Content-Disposition": f"attachment; filename={filename}"} if filename else None
+    return StreamingResponse(iter_ndjson(items), media_type=NDJSON, headers=headers)
@@ -1,4 +1,10 @@
-from .registry import load_all
+from .registry import load_all, load_packs, iter_seed_batches
 
 def all_seed_items():
     return load_all()
+
+def seed_sources():
+    # (packs, module items, warnings) from data-file packs and legacy Python modules
+    packs, pack_warnings = load_packs()
+    items, warnings = load_all()
+    return packs, items, pack_warnings + warnings
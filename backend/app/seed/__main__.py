@@ -0,0 +1,76 @@
+from __future__ import annotations
+import argparse, sys
+
+def sync(args):
+    from app.db import Base, SessionLocal, engine
+    from app.services.ef_service import sync_seed_efs
+    from app.services.tenant_partitions import ensure_hash_partitions
+    from app.tenancy.models import Org
+
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        ensure_hash_partitions(conn)
+    db = SessionLocal()
+    try:
+        org = db.query(Org).filter(Org.slug == args.org).one_or_none()
+        if not org:
+            org = Org(slug=args.org, name=args.org.upper())
+            db.add(org)
+            db.commit()
+            db.refresh(org)
+        res = sync_seed_efs(db, org.id, force=args.force)
+    finally:
+        db.close()
+    for w in res["warnings"]:
+        print(f"[seed warning] {w}", file=sys.stderr)
+    print(f"[seed] {res['status']}: {res['count']} EF rows (fingerprint {res['fingerprint'][:12]})")
+
+def pack(args):
+    import pandas as pd
+    from app.seed.base import SeedMeta
+    from app.seed.packs import write_pack
+    from app.services.ef_service import EF_IMPORT_REQUIRED, _json_cell, _tags_cell
+
+    # same CSV columns as POST /api/efs/import
+    df = pd.read_csv(args.csv)
+    df.columns = [c.strip().lower() for c in df.columns]
+    if not EF_IMPORT_REQUIRED.issubset(df.columns):
+        raise SystemExit(f"Missing columns: need {sorted(EF_IMPORT_REQUIRED)}")
+    df = df.astype(object).where(df.notna(), None)
+
+    def rows():
+        for r in df.to_dict("records"):
+            r["tags"] = _tags_cell(r.get("tags"))
+            r["activity_id_fields"] = _json_cell(r.get("activity_id_fields"))
+            r["gas_breakdown"] = _json_cell(r.get("gas_breakdown"))
+            r["value"] = None if r.get("value") is None else float(r["value"])
+            for c in ("valid_from", "valid_to"):
+                r[c] = None if r.get(c) is None else str(r[c])
+            yield r
+
+    meta = SeedMeta(source=args.source, year=args.year, version=args.version, dataset=args.dataset,
+                    reference=args.reference, license_note=args.license_note)
+    p = write_pack(args.out, args.id, meta, rows())
+    print(f"[seed] wrote pack {p.id} to {p.path} ({sum(f['rows'] for f in p.files)} rows)")
+
+def main():
+    ap = argparse.ArgumentParser(description="Seed emission factors")
+    ap.add_argument("--org", default="kmutt", help="org slug that owns the seed EFs")
+    ap.add_argument("--force", action="store_true", help="re-apply even if the fingerprint matches")
+    sub = ap.add_subparsers(dest="cmd")
+    pk = sub.add_parser("pack", help="build a seed pack from an EF CSV")
+    pk.add_argument("--csv", required=True)
+    pk.add_argument("--out", required=True, help="pack directory, e.g. app/seed/packs/<id>")
+    pk.add_argument("--id", required=True)
+    pk.add_argument("--source", required=True)
+    pk.add_argument("--year", type=int, required=True)
+    pk.add_argument("--version", required=True)
+    pk.add_argument("--dataset", required=True)
+    pk.add_argument("--reference", required=True)
+    pk.add_argument("--license-note", default="")
+    args = ap.parse_args()
+    # without a subcommand: apply seeds (skipped when the fingerprint is unchanged)
+    (pack if args.cmd == "pack" else sync)(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+from __future__ import annotations
+import hashlib, json, os
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Iterable, Iterator, List
+from app.lazy import lazy_module
+from .base import SeedMeta
+
+pa = lazy_module("pyarrow")
+pq = lazy_module("pyarrow.parquet")
+
+# A seed pack is a directory holding manifest.json (format, id, SeedMeta, file
+# list with sha256 + row counts) and one or more zstd Parquet files of factors.
+PACK_FORMAT = 1
+MANIFEST = "manifest.json"
+PACKS_DIR = os.path.join(os.path.dirname(__file__), "packs")
+
+REQUIRED = ("key", "name", "unit", "scope", "category")
+JSON_COLUMNS = ("activity_id_fields", "gas_breakdown")
+COLUMNS = (
+    "key", "name", "unit", "value", "scope", "category", "tags", "activity_id_fields", "gas_breakdown",
+    "methodology", "gwp_version", "publisher", "document_title", "valid_from", "valid_to", "region",
+)
+
+@lru_cache(maxsize=1)
+def arrow_schema():
+    # built on first use so importing the seed registry does not load pyarrow
+    types = {"value": pa.float64(), "tags": pa.list_(pa.string())}
+    return pa.schema([(c, types.get(c, pa.string())) for c in COLUMNS])
+
+@dataclass(frozen=True)
+class SeedPack:
+    id: str
+    path: str
+    meta: SeedMeta
+    files: tuple
+
+    def digest(self) -> str:
+        # the manifest's file hashes identify the content; no data file is read
+        return f"{self.id}:" + ",".join(f["sha256"] for f in self.files)
+
+def discover_packs(root: str = PACKS_DIR) -> List[str]:
+    if not os.path.isdir(root):
+        return []
+    return sorted(os.path.join(root, d) for d in os.listdir(root) if os.path.isfile(os.path.join(root, d, MANIFEST)))
+
+def read_manifest(pack_dir: str) -> SeedPack:
+    with open(os.path.join(pack_dir, MANIFEST), encoding="utf-8") as f:
+        m = json.load(f)
+    if m.get("format") != PACK_FORMAT:
+        raise ValueError(f"unsupported pack format {m.get('format')!r}")
+    files = tuple(m.get("files") or ())
+    if not files or any(not f.get("path") or not f.get("sha256") for f in files):
+        raise ValueError("manifest needs files[] with path and sha256")
+    return SeedPack(id=m["id"], path=pack_dir, meta=SeedMeta(**m["meta"]), files=files)
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def iter_pack_batches(pack: SeedPack, batch_size: int = 5000) -> Iterator[list[dict]]:
+    # validated rows in EFSeedItem.as_dict() shape, one Parquet record batch at a time
+    meta = asdict(pack.meta)
+    for entry in pack.files:
+        path = os.path.join(pack.path, entry["path"])
+        if _sha256(path) != entry["sha256"]:
+            raise ValueError(f"{pack.id}: checksum mismatch for {entry['path']}")
+        pf = pq.ParquetFile(path)
+        names = set(pf.schema_arrow.names)
+        missing = [c for c in REQUIRED if c not in names]
+        if missing:
+            raise ValueError(f"{pack.id}/{entry['path']}: missing columns {missing}")
+        offset = 0
+        for batch in pf.iter_batches(batch_size=batch_size, columns=[c for c in COLUMNS if c in names]):
+            cols = batch.to_pydict()
+            rows = []
+            for i in range(batch.num_rows):
+                row = {c: v[i] for c, v in cols.items()}
+                for c in REQUIRED:
+                    if not row[c]:
+                        raise ValueError(f"{pack.id}/{entry['path']} row {offset + i}: empty {c}")
+                for c in JSON_COLUMNS:
+                    row[c] = json.loads(row[c]) if row.get(c) else {}
+                if row.get("value") is None and not (row["gas_breakdown"] or {}).get("gases"):
+                    raise ValueError(f"{pack.id}/{entry['path']} row {offset + i}: {row['key']} has neither value nor gas_breakdown")
+                row["tags"] = row.get("tags") or []
+                row["meta"] = meta
+                rows.append(row)
+            offset += batch.num_rows
+            yield rows
+        if entry.get("rows") is not None and offset != entry["rows"]:
+            raise ValueError(f"{pack.id}/{entry['path']}: expected {entry['rows']} rows, read {offset}")
+
+def write_pack(out_dir: str, pack_id: str, meta: SeedMeta, rows: Iterable[dict], filename: str = "factors.parquet") -> SeedPack:
+    os.makedirs(out_dir, exist_ok=True)
+    cols: dict[str, list] = {name: [] for name in COLUMNS}
+    for r in rows:
+        for name in COLUMNS:
+            v = r.get(name)
+            if name in JSON_COLUMNS:
+                v = json.dumps(v, ensure_ascii=False, sort_keys=True) if v else None
+            cols[name].append(v)
+    table = pa.table(cols, schema=arrow_schema())
+    path = os.path.join(out_dir, filename)
+    pq.write_table(table, path, compression="zstd")
+    manifest = {
+        "format": PACK_FORMAT,
+        "id": pack_id,
+        "meta": asdict(meta),
+        "files": [{"path": filename, "sha256": _sha256(path), "rows": table.num_rows}],
+    }
+    with open(os.path.join(out_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return read_manifest(out_dir)
@@ -1,7 +1,8 @@
 from __future__ import annotations
 import importlib, pkgutil
-from typing import List, Tuple
+from typing import Iterator, List, Tuple
 from .base import EFSeedItem
+from .packs import PACKS_DIR, SeedPack, discover_packs, iter_pack_batches, read_manifest
 
 def discover(package: str = "app.seed.sources") -> list[str]:
     pkg = importlib.import_module(package)
@@ -25,3 +26,19 @@ def load_all(package: str = "app.seed.sources") -> Tuple[List[EFSeedItem], List[
             warnings.append(f"Failed import {modname}: {e}")
     dedup = {it.key: it for it in items}
     return list(dedup.values()), warnings
+
+def load_packs(root: str = PACKS_DIR) -> Tuple[List[SeedPack], List[str]]:
+    # manifests only; factor data is streamed later by iter_seed_batches
+    packs, warnings = [], []
+    for d in discover_packs(root):
+        try:
+            packs.append(read_manifest(d))
+        except Exception as e:
+            warnings.append(f"Invalid seed pack {d}: {e}")
+    return packs, warnings
+
+def iter_seed_batches(packs: List[SeedPack], items: List[EFSeedItem], batch_size: int = 5000) -> Iterator[list[dict]]:
+    for i in range(0, len(items), batch_size):
+        yield [it.as_dict() for it in items[i:i + batch_size]]
+    for pack in packs:
+        yield from iter_pack_batches(pack, batch_size)
@@ -2,7 +2,9 @@ from __future__ import annotations
 from datetime import date
 from typing import List
 from sqlalchemy.orm import Session
-from app.models import CalculationRun, EmissionFactor
+from app.models import CalculationRun
+from app.services.ef_catalog import get_catalog
+from app.services.run_trace import iter_run_rows
 
 def _sev_count(findings: List[dict]) -> dict:
     out = {"critical":0,"major":0,"minor":0,"info":0}
@@ -19,12 +21,13 @@ def audit_run(db: Session, run_id: int) -> dict:
     if not r:
         raise ValueError("Run not found")
 
-    rows = (r.details or {}).get("rows") or []
+    rows = iter_run_rows(db, r)
     findings: List[dict] = []
+    catalog = get_catalog(db, r.org_id)
 
     for row in rows:
         ef_key = row.get("ef_key")
-        ef = db.query(EmissionFactor).filter(EmissionFactor.key == ef_key).one_or_none()
+        ef = catalog.get(ef_key)
         if not ef:
             findings.append({
                 "code":"EF_MISSING",
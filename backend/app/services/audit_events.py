@@ -1,9 +1,185 @@
 from __future__ import annotations
+import argparse, atexit, json, os, queue, threading, time
+from datetime import datetime
+from sqlalchemy import event, insert
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
+from app.db import SessionLocal
 from app.history.models import AuditEvent
+from app.observability import is_write_statement, log
 
-def emit_event(db: Session, org_id: int, actor: str | None, action: str, payload: dict):
-    ev = AuditEvent(org_id=org_id, actor=actor, action=action, payload=payload or {})
-    db.add(ev)
-    db.commit()
-    return ev.id
+# A session whose transaction already wrote (ORM flush or Core/text statement) owns an
+# open write transaction; events emitted then are added to it instead of paying another
+# commit. Writes are marked on the connection as they hit the cursor.
+_WROTE = "_audit_wrote"
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _mark_write(conn, cursor, statement, parameters, context, executemany):
+    if is_write_statement(statement):
+        conn.info[_WROTE] = True
+
+@event.listens_for(Engine, "commit")
+@event.listens_for(Engine, "rollback")
+def _clear_write(conn):
+    conn.info.pop(_WROTE, None)
+
+def _in_write_transaction(db: Session) -> bool:
+    if db.new or db.dirty or db.deleted:
+        return True
+    return db.in_transaction() and bool(db.connection().info.get(_WROTE))
+
+_STOP = object()
+# batches whose insert still fails after the retries are appended here (NDJSON, one
+# event per line) and can be loaded back with `python -m app.services.audit_events replay`
+DEAD_LETTER = os.getenv("AUDIT_EVENT_DEAD_LETTER", "audit_events.deadletter.ndjson")
+
+class AuditEventWriter:
+    def __init__(self, batch_size: int = 500, flush_interval: float = 1.0, max_queue: int = 10000, put_timeout: float = 0.5,
+                 retries: int = 3, backoff: float = 0.5, dead_letter: str | None = DEAD_LETTER):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.dead_letter = dead_letter
+        self._q: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-event-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def submit(self, row: dict):
+        if self._closed:
+            self._write([row])
+            return
+        self._ensure_started()
+        try:
+            self._q.put(row, timeout=self.put_timeout)
+        except queue.Full:
+            # backpressure: the producer pays for its own write instead of growing the queue
+            self._write([row])
+
+    def _run(self):
+        while True:
+            try:
+                item = self._q.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, rows: list[dict]):
+        for attempt in range(self.retries + 1):
+            db = SessionLocal()
+            try:
+                db.execute(insert(AuditEvent), rows)
+                db.commit()
+                return
+            except Exception as e:
+                db.rollback()
+                error = str(e)
+                log.warning("audit_event_flush_retry", count=len(rows), attempt=attempt + 1, error=error)
+            finally:
+                db.close()
+            if attempt < self.retries:
+                time.sleep(self.backoff * 2 ** attempt)
+        self._spill(rows, error)
+
+    def _spill(self, rows: list[dict], error: str):
+        if not self.dead_letter:
+            log.error("audit_event_flush_failed", count=len(rows), error=error)
+            return
+        try:
+            with self._lock, open(self.dead_letter, "a", encoding="utf-8") as f:
+                for r in rows:
+                    f.write(json.dumps(r, ensure_ascii=False, default=str) + "\n")
+            log.error("audit_event_dead_lettered", count=len(rows), path=self.dead_letter, error=error)
+        except OSError as e:
+            log.error("audit_event_flush_failed", count=len(rows), error=error, dead_letter_error=str(e))
+
+    def close(self, timeout: float = 10.0):
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._q.put(_STOP)
+            self._thread.join(timeout)
+        pending = []
+        while True:
+            try:
+                item = self._q.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                pending.append(item)
+        for i in range(0, len(pending), self.batch_size):
+            self._write(pending[i:i + self.batch_size])
+
+writer = AuditEventWriter(
+    batch_size=int(os.getenv("AUDIT_EVENT_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("AUDIT_EVENT_FLUSH_SECONDS", "1.0")),
+    max_queue=int(os.getenv("AUDIT_EVENT_QUEUE_MAX", "10000")),
+    retries=int(os.getenv("AUDIT_EVENT_RETRIES", "3")),
+)
+
+def replay_dead_letter(path: str = DEAD_LETTER, batch_size: int = 500) -> int:
+    # inserts the spilled events (keeping their created_at) and removes the file
+    if not os.path.exists(path):
+        return 0
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    for r in rows:
+        r["created_at"] = datetime.fromisoformat(r["created_at"])
+    with SessionLocal() as db:
+        for i in range(0, len(rows), batch_size):
+            db.execute(insert(AuditEvent), rows[i:i + batch_size])
+        db.commit()
+    os.remove(path)
+    return len(rows)
+
+def emit_event(db: Session, org_id: int, actor: str | None, action: str, payload: dict, in_tx: bool | None = None):
+    # in_tx=True: the caller commits right after and the event must go with it;
+    # None detects an open write transaction, False always uses the writer
+    row = {"org_id": org_id, "actor": actor, "action": action, "payload": payload or {}, "created_at": datetime.utcnow()}
+    if in_tx or (in_tx is None and _in_write_transaction(db)):
+        # committed (or rolled back) together with the caller's own changes
+        db.add(AuditEvent(**row))
+        return
+    writer.submit(row)
+
+def main():
+    ap = argparse.ArgumentParser(description="audit event dead-letter maintenance")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rp = sub.add_parser("replay", help="insert dead-lettered events")
+    rp.add_argument("--path", default=DEAD_LETTER)
+    args = ap.parse_args()
+    print(f"[audit] replayed {replay_dead_letter(args.path)} events")
+
+if __name__ == "__main__":
+    main()
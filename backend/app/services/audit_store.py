@@ -0,0 +1,146 @@
+from __future__ import annotations
+import argparse
+from datetime import date, datetime
+from typing import Iterator
+from sqlalchemy import text, tuple_
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from app.history.models import AuditEvent
+from app.observability import log
+from app.responses import ndjson_line
+
+TABLE = "audit_events"
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+def _month_start(d: date, offset: int = 0) -> date:
+    m = d.year * 12 + (d.month - 1) + offset
+    return date(m // 12, m % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_p{month.year:04d}{month.month:02d}"
+
+def is_partitioned(conn: Connection) -> bool:
+    kind = conn.execute(text(f"SELECT relkind FROM pg_class WHERE oid = to_regclass('{TABLE}')")).scalar()
+    return kind == "p"
+
+def ensure_partitions(conn: Connection, months_back: int = 1, months_ahead: int = 3, today: date | None = None) -> list[str]:
+    if not is_partitioned(conn):
+        # legacy heap table; alembic revision 0001 converts it
+        return []
+    today = today or date.today()
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+    created = []
+    for off in range(-months_back, months_ahead + 1):
+        lo, hi = _month_start(today, off), _month_start(today, off + 1)
+        name = partition_name(lo)
+        if conn.execute(text(f"SELECT to_regclass('{name}')")).scalar() is None:
+            _create_month(conn, name, lo, hi)
+        created.append(name)
+    return created
+
+def _create_month(conn: Connection, name: str, lo: date, hi: date):
+    bounds = f"FROM ('{lo.isoformat()}') TO ('{hi.isoformat()}')"
+    in_month = f"created_at >= '{lo.isoformat()}' AND created_at < '{hi.isoformat()}'"
+    if conn.execute(text(f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_month} LIMIT 1")).first() is None:
+        conn.execute(text(f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES {bounds}"))
+        return
+    # the month was not created in time and its events landed in the default
+    # partition, which makes a plain CREATE ... PARTITION OF fail: take the default
+    # out, create the month, move its rows over and put the default back, all in
+    # the caller's transaction
+    conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+    conn.execute(text(f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES {bounds}"))
+    cols = ", ".join(c.name for c in AuditEvent.__table__.columns)
+    moved = conn.execute(text(
+        f"WITH m AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_month} RETURNING {cols}) "
+        f"INSERT INTO {name} ({cols}) SELECT {cols} FROM m"
+    )).rowcount
+    conn.execute(text(f"ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    log.warning("audit_partition_backfilled", partition=name, moved=moved)
+
+def detach_partition(conn: Connection, month: date, archive_schema: str | None = None) -> str:
+    # metadata-only; the detached table can then be dumped and dropped at leisure
+    name = partition_name(_month_start(month))
+    conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+    if archive_schema:
+        conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{archive_schema}"'))
+        conn.execute(text(f'ALTER TABLE {name} SET SCHEMA "{archive_schema}"'))
+        return f"{archive_schema}.{name}"
+    return name
+
+def _event_dict(e: AuditEvent) -> dict:
+    return {
+        "id": e.id, "org_id": e.org_id, "actor": e.actor, "action": e.action,
+        "payload": e.payload, "created_at": e.created_at.isoformat(),
+    }
+
+def encode_cursor(e: AuditEvent) -> str:
+    return f"{e.created_at.isoformat()}_{e.id}"
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    ts, _, eid = cursor.rpartition("_")
+    try:
+        return datetime.fromisoformat(ts), int(eid)
+    except ValueError:
+        raise ValueError("invalid cursor") from None
+
+def query_events(
+    db: Session,
+    org_id: int,
+    *,
+    action: str | None = None,
+    actor: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    cursor: str | None = None,
+    limit: int = 100,
+) -> tuple[list[dict], str | None]:
+    qry = db.query(AuditEvent).filter(AuditEvent.org_id == org_id)
+    if action:
+        qry = qry.filter(AuditEvent.action == action)
+    if actor:
+        qry = qry.filter(AuditEvent.actor == actor)
+    if since:
+        qry = qry.filter(AuditEvent.created_at >= since)
+    if until:
+        qry = qry.filter(AuditEvent.created_at < until)
+    if cursor:
+        c_ts, c_id = decode_cursor(cursor)
+        qry = qry.filter(tuple_(AuditEvent.created_at, AuditEvent.id) < tuple_(c_ts, c_id))
+    rows = qry.order_by(AuditEvent.created_at.desc(), AuditEvent.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return [_event_dict(e) for e in rows[:limit]], next_cursor
+
+def iter_events_ndjson(db: Session, org_id: int, batch_size: int = 1000, **filters) -> Iterator[bytes]:
+    cursor = None
+    while True:
+        items, cursor = query_events(db, org_id, cursor=cursor, limit=batch_size, **filters)
+        for it in items:
+            yield ndjson_line(it)
+        db.expunge_all()
+        if not cursor:
+            return
+
+def main():
+    from app.db import engine
+
+    ap = argparse.ArgumentParser(description="audit_events partition maintenance")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ens = sub.add_parser("ensure", help="create upcoming monthly partitions")
+    ens.add_argument("--months-back", type=int, default=1)
+    ens.add_argument("--months-ahead", type=int, default=3)
+    det = sub.add_parser("detach", help="detach a month (YYYY-MM) from the live table")
+    det.add_argument("month")
+    det.add_argument("--archive-schema", default=None)
+    args = ap.parse_args()
+
+    with engine.begin() as conn:
+        if args.cmd == "ensure":
+            for name in ensure_partitions(conn, args.months_back, args.months_ahead):
+                print(f"[audit] partition {name}")
+        else:
+            month = date.fromisoformat(args.month + "-01")
+            print(f"[audit] detached {detach_partition(conn, month, args.archive_schema)}")
+
+if __name__ == "__main__":
+    main()
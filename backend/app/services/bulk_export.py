@@ -0,0 +1,210 @@
+from __future__ import annotations
+import os
+from typing import Iterator
+from sqlalchemy import Text, cast, select, text
+from sqlalchemy.engine import Connection
+from app.lazy import lazy_module
+from app.models import Activity, EmissionFactor
+from app.observability import RESPONSE_BYTES, stage_timer
+from app.services.run_trace import RUN_ROWS_SQL
+
+pa = lazy_module("pyarrow")
+pq = lazy_module("pyarrow.parquet")
+
+# Columnar bulk reads. Every dataset is a whitelist of column -> (SQL expression,
+# Arrow type alias); the requested projection and all filters go into the SELECT, rows
+# come off a server-side cursor BULK_EXPORT_BATCH at a time and each partition
+# becomes one Arrow record batch that is written out and flushed immediately.
+BATCH = int(os.getenv("BULK_EXPORT_BATCH", "50000"))
+FORMATS = {"arrow": "application/vnd.apache.arrow.stream", "parquet": "application/vnd.apache.parquet"}
+
+A, E = Activity, EmissionFactor
+ACTIVITY_COLUMNS = {
+    "id": (A.id, "int64"), "name": (A.name, "string"), "ef_key": (A.ef_key, "string"),
+    "inputs": (cast(A.inputs, Text), "string"), "scope": (A.scope, "string"),
+    "lifecycle_stage": (A.lifecycle_stage, "string"), "period": (A.period, "string"),
+    "site": (A.site, "string"), "note": (A.note, "string"), "input_errors": (cast(A.input_errors, Text), "string"), "created_at": (A.created_at, "timestamp[us]"),
+}
+EF_COLUMNS = {
+    "key": (E.key, "string"), "name": (E.name, "string"), "unit": (E.unit, "string"),
+    "value": (E.value, "float64"), "scope": (E.scope, "string"), "category": (E.category, "string"),
+    "tags": (E.tags, "list<string>"), "region": (E.region, "string"), "country": (E.country, "string"),
+    "sector": (E.sector, "string"), "methodology": (E.methodology, "string"),
+    "gwp_version": (E.gwp_version, "string"), "publisher": (E.publisher, "string"),
+    "valid_from": (E.valid_from, "date32"), "valid_to": (E.valid_to, "date32"),
+    "lifecycle_status": (E.lifecycle_status, "string"), "uncertainty_value": (E.uncertainty_value, "float64"),
+    "gas_breakdown": (cast(E.gas_breakdown, Text), "string"), "activity_id_fields": (cast(E.activity_id_fields, Text), "string"),
+    "meta": (cast(E.meta, Text), "string"),
+}
+# run rows are unnested in Postgres (inline or chunked, see RUN_ROWS_SQL); scope/period/site
+# come from the row's snapshot (the activity for rows stored before it), EF fields from the
+# row trace (legacy runs) or the run's "efs" table
+def _snapshot(field: str) -> str:
+    return f"CASE WHEN t.r ? 'scope' THEN t.r->>'{field}' ELSE a.{field} END"
+
+RUN_ROW_COLUMNS = {
+    "run_id": ("c.id", "int64"), "run_type": ("c.run_type", "string"),
+    "review_status": ("c.review_status", "string"), "row_no": ("t.o", "int64"),
+    "activity_id": ("(t.r->>'activity_id')::bigint", "int64"), "activity_name": ("t.r->>'activity_name'", "string"),
+    "ef_key": ("t.r->>'ef_key'", "string"), "kgco2e": ("(t.r->>'kgco2e')::float8", "float64"),
+    "qty": ("(t.r->'trace'->>'qty')::float8", "float64"), "inputs": ("(t.r->'inputs')::text", "string"),
+    "method": ("COALESCE(t.r->'trace'->>'method', c.details->'efs'->(t.r->>'ef_key')->>'method')", "string"),
+    "ef_payload_hash": ("COALESCE(t.r->'trace'->>'ef_payload_hash', c.details->'efs'->(t.r->>'ef_key')->>'ef_payload_hash')", "string"),
+    "scope": (_snapshot("scope"), "string"), "period": (_snapshot("period"), "string"), "site": (_snapshot("site"), "string"),
+}
+DATASETS = {"activities": ACTIVITY_COLUMNS, "efs": EF_COLUMNS, "run_rows": RUN_ROW_COLUMNS}
+# filters each dataset applies (category goes through the EF for activities and run rows);
+# any other filter is rejected rather than ignored
+_PERIOD_FILTERS = ("period", "period_from", "period_to")
+FILTERS = {
+    "activities": ("scope", "category", "ef_key", *_PERIOD_FILTERS),
+    "efs": ("scope", "category", "ef_key"),
+    "run_rows": ("run_ids", "scope", "category", "ef_key", *_PERIOD_FILTERS),
+}
+
+def schema_for(dataset: str, columns: list[str] | None = None) -> pa.Schema:
+    spec = DATASETS.get(dataset)
+    if spec is None:
+        raise ValueError(f"Unknown dataset: {dataset} (use {', '.join(DATASETS)})")
+    names = columns or list(spec)
+    bad = [c for c in names if c not in spec]
+    if bad:
+        raise ValueError(f"Unknown columns for {dataset}: {', '.join(bad)}")
+    return pa.schema([(c, _arrow_type(spec[c][1])) for c in names])
+
+def check_filters(dataset: str, filters: dict):
+    bad = [k for k, v in filters.items() if v and k not in FILTERS[dataset]]
+    if bad:
+        names = ", ".join("run_id" if k == "run_ids" else k for k in bad)
+        raise ValueError(f"Filters not supported for {dataset}: {names}")
+
+def _arrow_type(alias: str):
+    return pa.list_(pa.string()) if alias == "list<string>" else pa.type_for_alias(alias)
+
+def _activity_query(org_id: int, names: list[str], f: dict):
+    q = select(*[ACTIVITY_COLUMNS[c][0] for c in names]).where(A.org_id == org_id)
+    if f.get("scope"):
+        q = q.where(A.scope == f["scope"])
+    if f.get("ef_key"):
+        q = q.where(A.ef_key == f["ef_key"])
+    if f.get("category"):
+        q = q.where(A.ef_key.in_(select(E.key).where(E.org_id == org_id, E.category == f["category"])))
+    if f.get("period"):
+        q = q.where(A.period == f["period"])
+    if f.get("period_from"):
+        q = q.where(A.period >= f["period_from"])
+    if f.get("period_to"):
+        q = q.where(A.period <= f["period_to"])
+    return q.order_by(A.id), {}
+
+def _ef_query(org_id: int, names: list[str], f: dict):
+    q = select(*[EF_COLUMNS[c][0] for c in names]).where(E.org_id == org_id)
+    for col, key in ((E.scope, "scope"), (E.category, "category"), (E.key, "ef_key")):
+        if f.get(key):
+            q = q.where(col == f[key])
+    return q.order_by(E.key), {}
+
+def _run_row_where(f: dict) -> tuple[list[str], dict]:
+    where, params = ["c.org_id = :org_id"], {}
+    if f.get("run_ids"):
+        where.append("c.id = ANY(:run_ids)")
+        params["run_ids"] = list(f["run_ids"])
+    for col, key in ((_snapshot("scope"), "scope"), (_snapshot("period"), "period"), ("t.r->>'ef_key'", "ef_key")):
+        if f.get(key):
+            where.append(f"{col} = :{key}")
+            params[key] = f[key]
+    if f.get("category"):
+        where.append("t.r->>'ef_key' IN (SELECT key FROM emission_factors WHERE org_id = c.org_id AND category = :category)")
+        params["category"] = f["category"]
+    if f.get("period_from"):
+        where.append(f"{_snapshot('period')} >= :period_from")
+        params["period_from"] = f["period_from"]
+    if f.get("period_to"):
+        where.append(f"{_snapshot('period')} <= :period_to")
+        params["period_to"] = f["period_to"]
+    return where, params
+
+def _run_row_query(org_id: int, names: list[str], f: dict):
+    where, params = _run_row_where(f)
+    cols = ", ".join(f"{RUN_ROW_COLUMNS[c][0]} AS {c}" for c in names)
+    sql = (f"SELECT {cols} FROM calculation_runs c "
+           f"CROSS JOIN LATERAL {RUN_ROWS_SQL} AS t(r, o) "
+           f"LEFT JOIN activities a ON a.id = (t.r->>'activity_id')::int AND a.org_id = c.org_id "
+           f"WHERE {' AND '.join(where)} ORDER BY c.id, t.o")
+    return text(sql), {"org_id": org_id, **params}
+
+_QUERIES = {"activities": _activity_query, "efs": _ef_query, "run_rows": _run_row_query}
+
+def iter_record_batches(conn: Connection, dataset: str, org_id: int, schema: pa.Schema, filters: dict,
+                        batch_size: int = BATCH) -> Iterator[pa.RecordBatch]:
+    names = schema.names
+    query, params = _QUERIES[dataset](org_id, names, filters)
+    # per statement: Connection.execution_options() would change the caller's connection
+    result = conn.execute(query, params, execution_options={"stream_results": True, "yield_per": batch_size})
+    for part in result.partitions(batch_size):
+        yield _to_batch(part, schema)
+
+def _to_batch(rows, schema: pa.Schema) -> pa.RecordBatch:
+    cols = list(zip(*rows)) if rows else [()] * len(schema)
+    return pa.RecordBatch.from_arrays([pa.array(c, type=field.type) for c, field in zip(cols, schema)], schema=schema)
+
+class _Sink:
+    # file-like target for the Arrow writers; drained after every batch
+    closed = False
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def write(self, data) -> int:
+        self.buf += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        out = bytes(self.buf)
+        self.buf.clear()
+        return out
+
+def iter_encoded(batches: Iterator[pa.RecordBatch], schema: pa.Schema, fmt: str) -> Iterator[bytes]:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt} (use {', '.join(FORMATS)})")
+    sink = _Sink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    try:
+        for batch in batches:
+            with stage_timer("serialize"):
+                writer.write_batch(batch)
+            chunk = sink.take()
+            if chunk:
+                RESPONSE_BYTES.labels(kind=fmt).observe(len(chunk))
+                yield chunk
+    finally:
+        writer.close()
+    tail = sink.take()
+    if tail:
+        yield tail
+
+def stream_dataset(dataset: str, org_id: int, fmt: str, columns: list[str] | None = None,
+                   filters: dict | None = None, bind=None) -> Iterator[bytes]:
+    # validation happens up front (schema_for raises ValueError); the connection is
+    # only opened once the response body starts streaming. bind: engine to read from
+    from app.db import engine
+
+    bind = bind if bind is not None else engine
+    schema = schema_for(dataset, columns)
+    check_filters(dataset, filters or {})
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt} (use {', '.join(FORMATS)})")
+
+    def gen():
+        with bind.connect() as conn:
+            yield from iter_encoded(iter_record_batches(conn, dataset, org_id, schema, filters or {}), schema, fmt)
+    return gen()
@@ -0,0 +1,43 @@
+from __future__ import annotations
+import hashlib, json
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app.models import Activity, CalculationRun, CalcResultCache
+from app.observability import CALC_CACHE
+from app.services.ef_catalog import OrgCatalog
+
+# Bump when compute_run's output changes for the same inputs, so old entries stop matching.
+CALC_VERSION = 2
+
+def run_fingerprint(org_id: int, run_type: str, activities: list[Activity], catalog: OrgCatalog) -> str | None:
+    # covers everything compute_run reads: activity order and content plus the
+    # payload hash of every EF used. Any edit changes the fingerprint, so stale
+    # entries are never matched and need no explicit invalidation.
+    h = hashlib.sha256(json.dumps([CALC_VERSION, org_id, run_type]).encode())
+    ef_hashes = {}
+    for a in activities:
+        ef = catalog.get(a.ef_key)
+        if ef is None:
+            return None
+        ef_hashes[a.ef_key] = ef.payload_hash
+        h.update(json.dumps([a.id, a.name, a.ef_key, a.inputs, a.scope, a.period, a.site], ensure_ascii=False, sort_keys=True, default=str).encode("utf-8"))
+        h.update(b"\n")
+    h.update(json.dumps(ef_hashes, sort_keys=True).encode())
+    return h.hexdigest()
+
+def lookup(db: Session, org_id: int, fingerprint: str) -> CalculationRun | None:
+    entry = db.get(CalcResultCache, (org_id, fingerprint))
+    run = db.get(CalculationRun, (org_id, entry.run_id)) if entry else None
+    if run is None:
+        CALC_CACHE.labels(result="miss").inc()
+        return None
+    CALC_CACHE.labels(result="hit").inc()
+    entry.hits = (entry.hits or 0) + 1
+    entry.last_hit_at = datetime.utcnow()
+    return run
+
+def remember(db: Session, org_id: int, fingerprint: str, run_id: int):
+    t = CalcResultCache.__table__
+    db.execute(pg_insert(t).values(org_id=org_id, fingerprint=fingerprint, run_id=run_id, hits=0, created_at=datetime.utcnow())
+               .on_conflict_do_update(index_elements=[t.c.org_id, t.c.fingerprint], set_={"run_id": run_id}))
@@ -1,20 +1,26 @@
 from __future__ import annotations
 from sqlalchemy.orm import Session
 from app.models import EmissionFactor, Activity
-from app.services.gwp import resolve_gwp
 from app.services.formula_engine import eval_expression
-from app.services.ef_versioning import snapshot_ef_payload, canonical_hash
+from app.services.ef_catalog import EFRecord, get_catalog
+from app.observability import stage_timer
 
-def _per_unit_co2e_from_gas_breakdown(ef: EmissionFactor) -> float:
-    gb = ef.gas_breakdown or {}
-    gases = gb.get("gases") or {}
-    gwp = resolve_gwp(ef.gwp_version)
-    per_unit = 0.0
-    for gas, val in gases.items():
-        g = gas.strip().upper()
-        if g in gwp:
-            per_unit += float(val) * float(gwp[g])
-    return per_unit
+# large id lists are fetched in chunks to stay under the driver's bind-parameter limit
+IN_CHUNK = 10_000
+
+def load_activities(db: Session, org_id: int, activity_ids: list[int]) -> list[Activity]:
+    by_id = {}
+    for i in range(0, len(activity_ids), IN_CHUNK):
+        chunk = activity_ids[i:i + IN_CHUNK]
+        for a in db.query(Activity).filter(Activity.org_id==org_id, Activity.id.in_(chunk)):
+            by_id[a.id] = a
+    out = []
+    for aid in activity_ids:
+        a = by_id.get(aid)
+        if not a:
+            raise ValueError(f"Activity not found: {aid}")
+        out.append(a)
+    return out
 
 def compute_activity_quantity(ef: EmissionFactor, inputs: dict) -> tuple[float, dict]:
     spec = ef.activity_id_fields or {}
@@ -46,35 +52,42 @@ def compute_activity_quantity(ef: EmissionFactor, inputs: dict) -> tuple[float,
 
     raise ValueError("No quantity derivation possible")
 
-def compute_activity_kgco2e(db: Session, activity: Activity, org_id: int) -> tuple[float, dict, str]:
-    ef = db.query(EmissionFactor).filter(EmissionFactor.org_id==org_id, EmissionFactor.key == activity.ef_key).one_or_none()
-    if not ef:
-        raise ValueError(f"EF not found: {activity.ef_key}")
-
+def _activity_kgco2e(ef: EFRecord, activity: Activity) -> tuple[float, dict, str]:
     inputs = activity.inputs or {}
     qty, qtrace = compute_activity_quantity(ef, inputs)
-
-    payload = snapshot_ef_payload(ef)
-    h = canonical_hash(payload)
+    h = ef.payload_hash
 
     if ef.value is not None:
         kg = qty * float(ef.value)
         return kg, {"method":"direct_value","qty":qty,"ef_value":ef.value,"qtrace":qtrace,"ef_key":ef.key,"meta":ef.meta, "ef_payload_hash": h}, h
 
-    per_unit = _per_unit_co2e_from_gas_breakdown(ef)
+    per_unit = ef.per_unit
     kg = qty * per_unit
     return kg, {"method":"gas_breakdown","qty":qty,"per_unit_co2e":per_unit,"qtrace":qtrace,"ef_key":ef.key,"meta":ef.meta, "ef_payload_hash": h}, h
 
-def compute_run(db: Session, activity_ids: list[int], run_type: str, org_id: int) -> dict:
+def compute_activity_kgco2e(db: Session, activity: Activity, org_id: int) -> tuple[float, dict, str]:
+    ef = get_catalog(db, org_id).get(activity.ef_key)
+    if not ef:
+        raise ValueError(f"EF not found: {activity.ef_key}")
+    return _activity_kgco2e(ef, activity)
+
+def compute_run(db: Session, activity_ids: list[int], run_type: str, org_id: int, activities: list[Activity] | None = None) -> dict:
+    with stage_timer("calc"):
+        return _compute_run(db, activity_ids, run_type, org_id, activities)
+
+def _compute_run(db: Session, activity_ids: list[int], run_type: str, org_id: int, activities: list[Activity] | None = None) -> dict:
     total = 0.0
     rows = []
     ef_snapshot = {}
-    for aid in activity_ids:
-        a = db.query(Activity).filter(Activity.org_id==org_id, Activity.id == aid).one_or_none()
-        if not a:
-            raise ValueError(f"Activity not found: {aid}")
-        kg, trace, ef_hash = compute_activity_kgco2e(db, a, org_id)
+    catalog = get_catalog(db, org_id)
+    for a in activities if activities is not None else load_activities(db, org_id, activity_ids):
+        ef = catalog.get(a.ef_key)
+        if not ef:
+            raise ValueError(f"EF not found: {a.ef_key}")
+        kg, trace, ef_hash = _activity_kgco2e(ef, a)
         ef_snapshot[a.ef_key] = ef_hash
         total += kg
-        rows.append({"activity_id":a.id,"activity_name":a.name,"ef_key":a.ef_key,"inputs":a.inputs,"kgco2e":kg,"trace":trace})
+        # scope/period/site are snapshotted so reports slice the run as it was computed
+        rows.append({"activity_id":a.id,"activity_name":a.name,"ef_key":a.ef_key,"inputs":a.inputs,
+                     "scope":a.scope,"period":a.period,"site":a.site,"kgco2e":kg,"trace":trace})
     return {"run_type":run_type,"total_kgco2e":total,"total_tco2e":total/1000.0,"details":{"rows":rows},"ef_snapshot":ef_snapshot}
@@ -1,12 +1,11 @@
 from __future__ import annotations
+import threading
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from app.models import CarbonCreditProject
-
-def calc_carbon_credit(db: Session, project_code: str) -> dict:
-    p = db.query(CarbonCreditProject).filter(CarbonCreditProject.project_code == project_code).one_or_none()
-    if not p:
-        raise ValueError(f"Credit project not found: {project_code}")
+from app.models import CarbonCreditProject, CreditPortfolioVersion
 
+def _credit_trace(p) -> dict:
     gross = max(0.0, float(p.baseline_tco2e) - float(p.project_tco2e) - float(p.leakage_tco2e))
     buffer = gross * float(p.buffer_pct)
     net = max(0.0, gross - buffer)
@@ -24,3 +23,68 @@ def calc_carbon_credit(db: Session, project_code: str) -> dict:
         "vintage": p.vintage,
         "extra": p.extra,
     }
+
+# per-org {project_code: trace}, valid while credit_portfolio_versions.version is unchanged
+_portfolios: dict[int, tuple[int, dict[str, dict]]] = {}
+_lock = threading.Lock()
+
+def portfolio_version(db: Session, org_id: int) -> int:
+    return db.scalar(select(CreditPortfolioVersion.version).where(CreditPortfolioVersion.org_id == org_id)) or 0
+
+def bump_portfolio_version(db: Session, org_id: int):
+    t = CreditPortfolioVersion.__table__
+    db.execute(pg_insert(t).values(org_id=org_id, version=1).on_conflict_do_update(
+        index_elements=[t.c.org_id], set_={"version": t.c.version + 1}))
+
+def project_results(db: Session, org_id: int) -> dict[str, dict]:
+    # all projects of the org in one query, computed once per version
+    version = portfolio_version(db, org_id)
+    cached = _portfolios.get(org_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _lock:
+        cached = _portfolios.get(org_id)
+        if cached is None or cached[0] != version:
+            t = CarbonCreditProject
+            rows = db.execute(select(t.project_code, t.methodology, t.baseline_tco2e, t.project_tco2e, t.leakage_tco2e,
+                                     t.buffer_pct, t.vintage, t.extra).where(t.org_id == org_id).order_by(t.project_code))
+            cached = (version, {r.project_code: _credit_trace(r) for r in rows})
+            _portfolios[org_id] = cached
+    return cached[1]
+
+def calc_carbon_credit(db: Session, project_code: str, org_id: int) -> dict:
+    trace = project_results(db, org_id).get(project_code)
+    if trace is None:
+        raise ValueError(f"Credit project not found: {project_code}")
+    return dict(trace)
+
+def _add(acc: dict, name, trace: dict):
+    a = acc.setdefault(name if name is not None else "N/A", {"projects": 0, "gross_tco2e": 0.0, "buffer_tco2e": 0.0, "net_tco2e": 0.0})
+    a["projects"] += 1
+    for k in ("gross_tco2e", "buffer_tco2e", "net_tco2e"):
+        a[k] += trace[k]
+
+def calc_portfolio(db: Session, org_id: int, project_codes: list[str] | None = None, vintage: str | None = None,
+                   methodology: str | None = None) -> dict:
+    results = project_results(db, org_id)
+    if project_codes:
+        missing = [c for c in project_codes if c not in results]
+        if missing:
+            raise ValueError(f"Credit project not found: {', '.join(missing)}")
+        selected = [results[c] for c in project_codes]
+    else:
+        selected = list(results.values())
+    selected = [t for t in selected if (vintage is None or t["vintage"] == vintage)
+                and (methodology is None or t["methodology"] == methodology)]
+
+    totals, by_vintage, by_methodology = {}, {}, {}
+    for t in selected:
+        _add(totals, "all", t)
+        _add(by_vintage, t["vintage"], t)
+        _add(by_methodology, t["methodology"], t)
+    return {
+        "projects": selected,
+        "totals": totals.get("all", {"projects": 0, "gross_tco2e": 0.0, "buffer_tco2e": 0.0, "net_tco2e": 0.0}),
+        "by_vintage": dict(sorted(by_vintage.items())),
+        "by_methodology": dict(sorted(by_methodology.items())),
+    }
@@ -0,0 +1,109 @@
+from __future__ import annotations
+import threading
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app.models import EmissionFactor, EFCatalogVersion
+from app.services.gwp import resolve_gwp
+from app.services.ef_versioning import snapshot_ef_payload, canonical_hash
+from app.services.input_validation import InputValidator
+
+def _per_unit_co2e_from_gas_breakdown(ef) -> float:
+    gb = ef.gas_breakdown or {}
+    gases = gb.get("gases") or {}
+    gwp = resolve_gwp(ef.gwp_version)
+    per_unit = 0.0
+    for gas, val in gases.items():
+        g = gas.strip().upper()
+        if g in gwp:
+            per_unit += float(val) * float(gwp[g])
+    return per_unit
+
+def per_unit_co2e(ef) -> float:
+    if ef.value is not None:
+        return float(ef.value)
+    return _per_unit_co2e_from_gas_breakdown(ef)
+
+class EFRecord:
+    # read-only view of one EmissionFactor with everything calc/audit need precomputed
+    __slots__ = (
+        "key", "org_id", "name", "unit", "value", "scope", "category", "status", "lifecycle_status",
+        "valid_from", "valid_to", "gwp_version", "gas_breakdown", "activity_id_fields", "meta",
+        "uncertainty_value", "uncertainty_type", "per_unit", "payload_hash", "validator",
+    )
+
+    def __init__(self, ef: EmissionFactor):
+        for name in self.__slots__[:-3]:
+            setattr(self, name, getattr(ef, name))
+        self.per_unit = per_unit_co2e(ef)
+        self.payload_hash = canonical_hash(snapshot_ef_payload(ef))
+        self.validator = InputValidator(ef.key, ef.activity_id_fields, ef.unit)
+
+class OrgCatalog:
+    __slots__ = ("org_id", "version", "by_key")
+
+    def __init__(self, org_id: int, version: int, by_key: dict[str, EFRecord]):
+        self.org_id = org_id
+        self.version = version
+        self.by_key = by_key
+
+    def get(self, key: str) -> EFRecord | None:
+        return self.by_key.get(key)
+
+_catalogs: dict[int, OrgCatalog] = {}
+_lock = threading.Lock()
+
+def catalog_version(db: Session, org_id: int) -> int:
+    return db.scalar(select(EFCatalogVersion.version).where(EFCatalogVersion.org_id == org_id)) or 0
+
+def get_catalog(db: Session, org_id: int) -> OrgCatalog:
+    # one primary-key lookup when warm; the version is read before the EFs so a
+    # concurrent write can only make the cached copy look older, never newer
+    version = catalog_version(db, org_id)
+    if _has_ef_writes(db):
+        # this transaction changed EFs: it sees its own uncommitted version, which may
+        # still roll back, so the catalog is built for it alone and never cached
+        return _build(db, org_id, version)
+    cat = _catalogs.get(org_id)
+    if cat is not None and cat.version == version:
+        return cat
+    with _lock:
+        cat = _catalogs.get(org_id)
+        if cat is None or cat.version != version:
+            cat = _build(db, org_id, version)
+            _catalogs[org_id] = cat
+    return cat
+
+def _build(db: Session, org_id: int, version: int) -> OrgCatalog:
+    efs = db.query(EmissionFactor).filter(EmissionFactor.org_id == org_id).all()
+    return OrgCatalog(org_id, version, {ef.key: EFRecord(ef) for ef in efs})
+
+# set while a session's transaction holds EF writes (flushed or Core), cleared on commit/rollback
+_EF_WRITES = "_ef_catalog_writes"
+
+def _has_ef_writes(db: Session) -> bool:
+    return bool(db.info.get(_EF_WRITES)) or any(isinstance(o, EmissionFactor) for o in (*db.new, *db.dirty, *db.deleted))
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _clear_ef_writes(session):
+    session.info.pop(_EF_WRITES, None)
+
+def bump_catalog_version(db: Session, org_id: int):
+    # for Core-level EF writes; ORM writes are picked up by the flush hook below
+    db.info[_EF_WRITES] = True
+    db.connection().execute(_bump_stmt(org_id))
+
+def _bump_stmt(org_id: int):
+    t = EFCatalogVersion.__table__
+    return pg_insert(t).values(org_id=org_id, version=1).on_conflict_do_update(
+        index_elements=[t.c.org_id], set_={"version": t.c.version + 1})
+
+@event.listens_for(Session, "after_flush")
+def _bump_on_ef_flush(session, flush_context):
+    orgs = {obj.org_id for obj in (*session.new, *session.dirty, *session.deleted) if isinstance(obj, EmissionFactor)}
+    if orgs:
+        session.info[_EF_WRITES] = True
+    conn = session.connection()
+    for org_id in sorted(o for o in orgs if o is not None):
+        conn.execute(_bump_stmt(org_id))
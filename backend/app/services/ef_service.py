@@ -1,19 +1,108 @@
+import json
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from app.models import EmissionFactor
-from app.seed import all_seed_items
-
-def upsert_seed_efs(db: Session):
-    items, warnings = all_seed_items()
-    upserted = 0
-    for it in items:
-        data = it.as_dict()
-        key = data["key"]
-        obj = db.query(EmissionFactor).filter(EmissionFactor.key == key).one_or_none()
-        if obj:
-            for k, v in data.items():
-                setattr(obj, k, v)
-        else:
-            db.add(EmissionFactor(**data))
-        upserted += 1
+from app.models import EmissionFactor, SeedState
+from app.seed import seed_sources, iter_seed_batches
+from app.services.ef_versioning import canonical_hash
+from app.services.ef_catalog import bump_catalog_version
+from app.lazy import lazy_module
+
+pd = lazy_module("pandas")
+
+EF_IMPORT_REQUIRED = {"key","name","unit","scope","category"}
+
+SEED_STATE_NAME = "emission_factors"
+# pg_advisory_xact_lock key (with the org id) serializing an org's seed sync across API/RQ processes
+SEED_LOCK_ID = 0x5EED0EF
+
+def seed_fingerprint(packs, items, org_id: int) -> str:
+    # packs contribute their manifest checksums, so no factor data is read here
+    return canonical_hash({
+        "org_id": org_id,
+        "packs": [p.digest() for p in packs],
+        "items": sorted((it.as_dict() for it in items), key=lambda r: r["key"]),
+    })
+
+def bulk_upsert_efs(db: Session, rows: list[dict], org_id: int, chunk: int = 1000) -> int:
+    # INSERT .. ON CONFLICT (org_id, key) DO UPDATE in batches. A key repeated
+    # within one statement would fail, so the last occurrence wins.
+    rows = list({r["key"]: r for r in rows}.values())
+    # the ORM bulk insert leaves out NULL values and starts a new statement whenever
+    # the remaining column set changes, so rows with the same set go together
+    rows.sort(key=lambda r: sorted(k for k, v in r.items() if v is not None))
+    n = 0
+    for i in range(0, len(rows), chunk):
+        batch = [{**r, "org_id": org_id} for r in rows[i:i + chunk]]
+        stmt = pg_insert(EmissionFactor)
+        cols = [c for c in batch[0] if c not in ("key", "org_id")]
+        stmt = stmt.on_conflict_do_update(index_elements=[EmissionFactor.org_id, EmissionFactor.key], set_={c: stmt.excluded[c] for c in cols})
+        db.execute(stmt, batch)
+        n += len(batch)
+    return n
+
+def sync_seed_efs(db: Session, org_id: int, force: bool = False) -> dict:
+    packs, items, warnings = seed_sources()
+    fp = seed_fingerprint(packs, items, org_id)
+
+    state = db.get(SeedState, (SEED_STATE_NAME, org_id))
+    if state and state.fingerprint == fp and not force:
+        db.rollback()
+        return {"status": "unchanged", "count": 0, "fingerprint": fp, "warnings": warnings}
+
+    db.execute(text("SELECT pg_advisory_xact_lock(:k, :o)"), {"k": SEED_LOCK_ID, "o": org_id})
+    # another process may have applied the same seeds while we waited for the lock
+    state = db.get(SeedState, (SEED_STATE_NAME, org_id), populate_existing=True)
+    if state and state.fingerprint == fp and not force:
+        db.rollback()
+        return {"status": "unchanged", "count": 0, "fingerprint": fp, "warnings": warnings}
+
+    n = 0
+    for batch in iter_seed_batches(packs, items):
+        n += bulk_upsert_efs(db, batch, org_id)
+    bump_catalog_version(db, org_id)
+    if not state:
+        state = SeedState(name=SEED_STATE_NAME, org_id=org_id)
+        db.add(state)
+    state.fingerprint = fp
+    state.item_count = n
+    state.applied_at = datetime.utcnow()
     db.commit()
-    return upserted, warnings
+    return {"status": "applied", "count": n, "fingerprint": fp, "warnings": warnings}
+
+def _json_cell(v):
+    if v is None or (isinstance(v, float) and pd.isna(v)): return {}
+    if isinstance(v, dict): return v
+    s = str(v).strip()
+    if not s or s.lower() == "nan": return {}
+    try: return json.loads(s)
+    except: return {}
+
+def _tags_cell(v):
+    if v is None or (isinstance(v, float) and pd.isna(v)): return []
+    if isinstance(v, list): return v
+    s = str(v).strip()
+    return [x.strip() for x in s.split(",") if x.strip()]
+
+def import_ef_dataframe(db: Session, org_id: int, df: "pd.DataFrame") -> int:
+    # upserts in the caller's transaction; the caller commits
+    df.columns = [c.strip().lower() for c in df.columns]
+    if not EF_IMPORT_REQUIRED.issubset(set(df.columns)):
+        raise ValueError(f"Missing columns: need {sorted(EF_IMPORT_REQUIRED)}")
+
+    rows = []
+    for row in df.to_dict("records"):
+        payload = dict(row)
+        payload["value"] = None if ("value" not in payload or pd.isna(payload.get("value"))) else float(payload["value"])
+        payload["tags"] = _tags_cell(payload.get("tags"))
+        payload["activity_id_fields"] = _json_cell(payload.get("activity_id_fields"))
+        payload["gas_breakdown"] = _json_cell(payload.get("gas_breakdown"))
+        payload["meta"] = _json_cell(payload.get("meta"))
+        payload["key"] = str(payload["key"]).strip()
+        rows.append(payload)
+    # one upsert per chunk instead of a lookup per row; Core writes bypass the flush hook
+    count = bulk_upsert_efs(db, rows, org_id)
+    if count:
+        bump_catalog_version(db, org_id)
+    return count
@@ -53,6 +53,7 @@ def create_new_version(
     changed_by: str | None,
     change_reason: str | None,
     effective_from: date | None = None,
+    commit: bool = True,
 ) -> str:
     effective_from = effective_from or date.today()
     h = canonical_hash(payload)
@@ -78,5 +79,6 @@ def create_new_version(
         change_reason=change_reason,
     )
     db.add(v)
-    db.commit()
+    if commit:
+        db.commit()
     return h
@@ -0,0 +1,135 @@
+from __future__ import annotations
+import argparse
+from sqlalchemy import String, case, cast, func, select, text, tuple_, update
+from sqlalchemy.orm import Session
+from app.models import CalculationRun, EmissionsCubeCell
+from app.services.run_trace import RUN_ROWS_SQL
+
+# Each run contributes one cell per (period, scope, site, category, ef_key). Cells carry
+# the run's run_type and review_status so reports can restrict to APPROVED runs without
+# joining back. Period, scope and site come from the run's rows (snapshotted at compute
+# time), so later activity edits do not move old runs; rows stored before the snapshot
+# fall back to the current activity. Shards of a partitioned run add the cells of
+# their own rows as they finish, marked RUNNING (and left out of every query) until
+# the reduce sets the run's status.
+# Runs usually recompute the same activities, so summing every APPROVED run would
+# count them once per run: unless run_ids are given (or latest=False), each
+# (run_type, period) is taken from the latest run (highest id) with the requested
+# status that has cells for it.
+_CELLS_SQL = r"""
+INSERT INTO emissions_cube (org_id, run_id, review_status, run_type, period, site, year, month, scope, category, ef_key, kgco2e, row_count)
+SELECT c.org_id, c.id, STATUS, c.run_type, COALESCE(s.period, ''), COALESCE(s.site, ''),
+       CASE WHEN s.period ~ '^\d{4}' THEN substr(s.period, 1, 4)::int END,
+       CASE WHEN s.period ~ '^\d{4}-(0[1-9]|1[0-2])' THEN substr(s.period, 6, 2)::int END,
+       COALESCE(s.scope, 'N/A'), COALESCE(ef.category, 'Unclassified'), r->>'ef_key',
+       sum((r->>'kgco2e')::float8), count(*)
+FROM calculation_runs c
+ROWS
+LEFT JOIN activities a ON a.id = (r->>'activity_id')::int AND a.org_id = c.org_id AND NOT r ? 'scope'
+CROSS JOIN LATERAL (
+    SELECT CASE WHEN r ? 'scope' THEN r->>'period' ELSE a.period END AS period,
+           CASE WHEN r ? 'scope' THEN r->>'scope' ELSE a.scope END AS scope,
+           CASE WHEN r ? 'scope' THEN r->>'site' ELSE a.site END AS site
+) s
+LEFT JOIN emission_factors ef ON ef.key = r->>'ef_key' AND ef.org_id = c.org_id
+WHERE c.id = :run_id
+GROUP BY 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11
+"""
+_REFRESH_SQL = text(_CELLS_SQL.replace("STATUS", "c.review_status").replace("ROWS", f"CROSS JOIN LATERAL {RUN_ROWS_SQL} AS t(r, o)"))
+# rows [lo, hi) of a chunked run
+_CHUNK_CELLS_SQL = text(_CELLS_SQL.replace("STATUS", "'RUNNING'").replace("ROWS", "JOIN calc_run_rows k ON k.org_id = c.org_id AND k.run_id = c.id "
+                                                   "AND k.first_row >= :lo AND k.first_row < :hi "
+                                                   "CROSS JOIN LATERAL jsonb_array_elements(k.rows) AS t(r)"))
+
+DIMS = ("period", "scope", "site", "category", "ef_key", "run_type", "run_id")
+GRAINS = ("month", "quarter", "year", "raw")
+
+def refresh_run(db: Session, run_id: int):
+    db.execute(EmissionsCubeCell.__table__.delete().where(EmissionsCubeCell.run_id == run_id))
+    db.execute(_REFRESH_SQL, {"run_id": run_id})
+
+def add_chunk_cells(db: Session, run_id: int, lo: int, hi: int):
+    # cells of one shard's chunks, added to what the other shards wrote
+    db.execute(_CHUNK_CELLS_SQL, {"run_id": run_id, "lo": lo, "hi": hi})
+
+def set_run_status(db: Session, run_id: int, status: str):
+    db.execute(update(EmissionsCubeCell).where(EmissionsCubeCell.run_id == run_id).values(review_status=status))
+
+def _period_expr(grain: str):
+    t = EmissionsCubeCell
+    if grain == "raw":
+        return t.period
+    if grain == "year":
+        return case((t.year.is_not(None), cast(t.year, String)), else_=t.period)
+    if grain == "quarter":
+        return case((t.month.is_not(None), func.concat(t.year, "-Q", (t.month + 2) // 3)), else_=t.period)
+    return case((t.month.is_not(None), func.concat(t.year, "-", func.lpad(cast(t.month, String), 2, "0"))), else_=t.period)
+
+def _ym(value: str, end: bool) -> int:
+    # "2024" or "2024-03" -> 202401 / 202412 / 202403
+    parts = value.split("-")
+    try:
+        year = int(parts[0])
+        month = int(parts[1]) if len(parts) > 1 else (12 if end else 1)
+    except ValueError:
+        raise ValueError(f"Invalid period bound: {value} (use YYYY or YYYY-MM)")
+    return year * 100 + month
+
+def query_cube(db: Session, org_id: int, dims: list[str], grain: str = "month", status: str | None = "APPROVED",
+               run_ids: list[int] | None = None, scope: str | None = None, category: str | None = None,
+               ef_key: str | None = None, period_from: str | None = None, period_to: str | None = None,
+               latest: bool = True, run_type: str | None = None, site: str | None = None) -> dict:
+    bad = [d for d in dims if d not in DIMS]
+    if bad:
+        raise ValueError(f"Unknown dims: {', '.join(bad)} (use {', '.join(DIMS)})")
+    if grain not in GRAINS:
+        raise ValueError(f"Unknown grain: {grain} (use {', '.join(GRAINS)})")
+    t = EmissionsCubeCell
+    cols = [(_period_expr(grain) if d == "period" else getattr(t, d)).label(d) for d in dims]
+    q = select(*cols, func.sum(t.kgco2e).label("kgco2e"), func.sum(t.row_count).label("rows")).where(t.org_id == org_id)
+    status_filter = t.review_status == status if status else t.review_status != "RUNNING"
+    q = q.where(status_filter)
+    if run_ids:
+        q = q.where(t.run_id.in_(run_ids))
+    elif latest:
+        per_period = select(t.run_type, t.period, func.max(t.run_id)).where(t.org_id == org_id, status_filter) \
+            .group_by(t.run_type, t.period)
+        q = q.where(tuple_(t.run_type, t.period, t.run_id).in_(per_period))
+    for col, val in ((t.scope, scope), (t.category, category), (t.ef_key, ef_key), (t.run_type, run_type), (t.site, site)):
+        if val:
+            q = q.where(col == val)
+    if period_from or period_to:
+        ym = t.year * 100 + func.coalesce(t.month, 1)
+        if period_from:
+            q = q.where(ym >= _ym(period_from, end=False))
+        if period_to:
+            q = q.where(t.year * 100 + func.coalesce(t.month, 12) <= _ym(period_to, end=True))
+    if cols:
+        q = q.group_by(*cols).order_by(*cols)
+    cells = [{**{d: getattr(r, d) for d in dims}, "kgco2e": r.kgco2e or 0.0, "tco2e": (r.kgco2e or 0.0) / 1000.0, "rows": r.rows or 0}
+             for r in db.execute(q)]
+    runs = "selected" if run_ids else "latest-per-period" if latest else "all"
+    return {"dims": dims, "grain": grain, "status": status, "runs": runs, "cells": cells,
+            "total_kgco2e": sum(c["kgco2e"] for c in cells)}
+
+def main():
+    from app.db import SessionLocal
+
+    ap = argparse.ArgumentParser(description="Rebuild emissions cube cells from stored runs")
+    ap.add_argument("--org-id", type=int, default=None)
+    args = ap.parse_args()
+    db = SessionLocal()
+    try:
+        q = db.query(CalculationRun.id)
+        if args.org_id is not None:
+            q = q.filter(CalculationRun.org_id == args.org_id)
+        run_ids = [rid for (rid,) in q.order_by(CalculationRun.id)]
+        for rid in run_ids:
+            refresh_run(db, rid)
+            db.commit()
+        print(f"[cube] rebuilt {len(run_ids)} runs")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 from __future__ import annotations
 import ast
+from functools import lru_cache
 from typing import Any, Dict
+from app.observability import stage_timer
 
 ALLOWED_NODES = {
     ast.Expression, ast.BinOp, ast.UnaryOp, ast.Num, ast.Constant, ast.Name,
@@ -21,11 +23,24 @@ def _check_ast(node: ast.AST) -> None:
             if not isinstance(n.func, ast.Name) or n.func.id not in ALLOWED_FUNCS:
                 raise FormulaError("Only min/max/abs/round are allowed")
 
-def eval_expression(expr: str, variables: Dict[str, Any]) -> float:
+@lru_cache(maxsize=4096)
+def compile_expression(expr: str) -> tuple:
+    # (code, variable names); parsed and checked once per distinct expression
     try:
         tree = ast.parse(expr, mode="eval")
-        _check_ast(tree)
-        code = compile(tree, "<formula>", "eval")
+    except SyntaxError as e:
+        raise FormulaError(str(e))
+    _check_ast(tree)
+    names = frozenset(n.id for n in ast.walk(tree) if isinstance(n, ast.Name) and n.id not in ALLOWED_FUNCS)
+    return compile(tree, "<formula>", "eval"), names
+
+def eval_expression(expr: str, variables: Dict[str, Any]) -> float:
+    with stage_timer("formula"):
+        return _eval_expression(expr, variables)
+
+def _eval_expression(expr: str, variables: Dict[str, Any]) -> float:
+    try:
+        code, _ = compile_expression(expr)
         safe_vars = {k: float(v) for k, v in variables.items() if v is not None and v != ""}
         return float(eval(code, {"__builtins__": {}}, {**ALLOWED_FUNCS, **safe_vars}))
     except FormulaError:
@@ -4,8 +4,10 @@ GWP = {
     "IPCC_2013_GWP100": {"CO2": 1.0, "CH4": 28.0, "N2O": 265.0},
 }
 
+def normalize_gwp_version(gwp_version: str) -> str:
+    return gwp_version.strip().upper().replace(" ", "_")
+
 def resolve_gwp(gwp_version: str | None) -> dict:
     if not gwp_version:
         return GWP["IPCC_AR5"]
-    k = gwp_version.strip().upper().replace(" ", "_")
-    return GWP.get(k, GWP["IPCC_AR5"])
+    return GWP.get(normalize_gwp_version(gwp_version), GWP["IPCC_AR5"])
@@ -0,0 +1,150 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Iterable
+from app.lazy import lazy_module
+from app.services.formula_engine import compile_expression
+
+pd = lazy_module("pandas")
+
+if TYPE_CHECKING:
+    from app.services.ef_catalog import OrgCatalog
+
+# An EF's activity_id_fields spec compiled into column checks that mirror what
+# compute_activity_quantity will do with the inputs:
+#   {"required": [...], "quantity_field": "...", "formula": {"expression": ...},
+#    "fields": {name: {"type": "number", "unit": "kWh"}}}
+# Checks run over a whole batch of activities for one EF at once (one DataFrame
+# column per input name); only failing rows are touched in Python.
+NUMERIC_TYPES = {"number", "float", "integer", "int"}
+# spellings of the same unit (compared after lower-casing and dropping spaces); different
+# units such as kWh vs MWh still fail, no conversion is implied
+UNIT_ALIASES = {
+    "tonne": "t", "tonnes": "t", "metricton": "t", "metrictons": "t",
+    "kilogram": "kg", "kilograms": "kg", "kgs": "kg",
+    "litre": "l", "litres": "l", "liter": "l", "liters": "l", "ltr": "l",
+    "m³": "m3", "cubicmetre": "m3", "cubicmetres": "m3", "cubicmeter": "m3", "cubicmeters": "m3",
+    "kilometre": "km", "kilometres": "km", "kilometer": "km", "kilometers": "km", "kms": "km",
+    "kilowatthour": "kwh", "kilowatthours": "kwh", "kw-h": "kwh", "kw·h": "kwh",
+    "megawatthour": "mwh", "megawatthours": "mwh",
+}
+
+def normalize_unit(unit) -> str:
+    u = str(unit).strip().lower().replace(" ", "")
+    return UNIT_ALIASES.get(u, u)
+
+class InputValidator:
+    __slots__ = ("ef_key", "ef_unit", "required", "numeric", "units", "formula_vars", "formula_error", "quantity_field", "has_formula")
+
+    def __init__(self, ef_key: str, spec: dict | None, ef_unit: str | None = None):
+        spec = spec or {}
+        fields = spec.get("fields") or {}
+        self.ef_key = ef_key
+        self.ef_unit = ef_unit
+        self.required = tuple(spec.get("required") or ())
+        self.numeric = tuple(n for n, f in fields.items() if isinstance(f, dict) and str(f.get("type", "")).lower() in NUMERIC_TYPES)
+        self.units = {n: f["unit"] for n, f in fields.items() if isinstance(f, dict) and f.get("unit")}
+        self.quantity_field = spec.get("quantity_field")
+        formula = spec.get("formula")
+        self.has_formula = bool(formula)
+        self.formula_vars: tuple = ()
+        self.formula_error = None
+        if formula:
+            try:
+                self.formula_vars = tuple(sorted(compile_expression(formula.get("expression"))[1]))
+            except Exception as e:
+                self.formula_error = f"Invalid formula for EF={ef_key}: {e}"
+
+    def errors(self, inputs: dict | None) -> list[str]:
+        return self.validate_batch([inputs])[0]
+
+    def validate_batch(self, inputs: list[dict | None]) -> list[list[str]]:
+        n = len(inputs)
+        out: list[list[str]] = [[] for _ in range(n)]
+        if not n:
+            return out
+        if self.formula_error:
+            for errs in out:
+                errs.append(self.formula_error)
+            return out
+        df = pd.DataFrame.from_records([i if isinstance(i, dict) else {} for i in inputs], index=range(n))
+
+        def flag(mask, msg: str):
+            for i in mask.to_numpy().nonzero()[0]:
+                out[i].append(msg)
+
+        def present(name: str):
+            return df[name].notna() if name in df.columns else pd.Series(False, index=df.index)
+
+        for r in self.required:
+            flag(~present(r), f"Missing required input '{r}' for EF={self.ef_key}")
+
+        def not_numeric(name: str, rows=None):
+            if name in df.columns:
+                mask = _not_numeric(df[name], allow_blank=self.has_formula)
+                flag(mask if rows is None else mask & rows, f"Input '{name}' is not a number for EF={self.ef_key}")
+
+        if self.has_formula:
+            for v in self.formula_vars:
+                flag(~present(v), f"Formula input '{v}' missing for EF={self.ef_key}")
+            # the formula engine coerces every supplied input to float
+            for c in df.columns:
+                not_numeric(c)
+        else:
+            for c in self.numeric:
+                not_numeric(c)
+            # quantity source, with compute_activity_quantity's precedence per row
+            qf = self.quantity_field
+            use_qf = present(qf) if qf else pd.Series(False, index=df.index)
+            if qf:
+                not_numeric(qf, use_qf)
+            rest = ~use_qf
+            if self.required:
+                not_numeric(self.required[0], rest)
+            else:
+                amount = present("amount")
+                flag(rest & ~amount, "No quantity derivation possible")
+                not_numeric("amount", rest & amount)
+
+        # an explicit unit on the activity ("<field>_unit", or "unit" for the EF) must match the spec
+        expected = [(f"{n}_unit", u) for n, u in self.units.items()]
+        if self.ef_unit and not self.has_formula:
+            expected.append(("unit", self.ef_unit))
+        for col, unit in expected:
+            if col in df.columns:
+                given = df[col]
+                mask = given.notna() & (given.astype(str).map(normalize_unit) != normalize_unit(unit))
+                flag(mask, f"Input '{col}' must be {unit} for EF={self.ef_key}")
+        return [list(dict.fromkeys(errs)) for errs in out]
+
+def _not_numeric(col: pd.Series, allow_blank: bool = False) -> pd.Series:
+    # the formula engine skips "" inputs; float("") fails everywhere else
+    given = col.notna() & (col.astype(str) != "") if allow_blank else col.notna()
+    if col.dtype.kind in "biuf":
+        return given & False
+    try:
+        return given & pd.to_numeric(col, errors="coerce").isna()
+    except (TypeError, ValueError):
+        return given & col.map(lambda v: not _is_number(v))
+
+def _is_number(v) -> bool:
+    try:
+        float(v)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def validate_activities(catalog: OrgCatalog, rows: Iterable[tuple[str, dict | None]]) -> list[list[str]]:
+    # rows: (ef_key, inputs); returns the errors for each row, [] when valid
+    rows = list(rows)
+    out: list[list[str]] = [[] for _ in rows]
+    groups: dict[str, list[int]] = {}
+    for i, (ef_key, _) in enumerate(rows):
+        groups.setdefault(ef_key, []).append(i)
+    for ef_key, idx in groups.items():
+        ef = catalog.get(ef_key)
+        if ef is None:
+            for i in idx:
+                out[i].append(f"EF not found: {ef_key}")
+            continue
+        for i, errs in zip(idx, ef.validator.validate_batch([rows[i][1] for i in idx])):
+            out[i] = errs
+    return out
@@ -0,0 +1,167 @@
+from __future__ import annotations
+import os
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.lazy import lazy_module
+from app.models import CalcRunShard, CalculationRun
+from app.observability import log
+from app.services.audit_events import emit_event
+from app.services.calc_cache import remember as remember_run
+from app.services.calc_service import compute_run
+from app.services.emissions_cube import add_chunk_cells, set_run_status as set_cube_status
+from app.services.run_trace import FORMAT, compact_details, write_chunks
+
+rq = lazy_module("rq")
+
+# Partitioned (map-reduce) runs: the activity ids are cut into shards of
+# CALC_SHARD_SIZE, each computed by its own job on the org's bulk queue, so a run
+# spreads over every worker process. A shard job writes its rows to calc_run_rows
+# (chunks keyed by their position in the run) and its emissions cube cells; the
+# job that completes the last shard enqueues the reduce, which only folds the
+# shards' totals, ef_snapshot, EF table and chunk manifests into the run. Row data
+# never passes through one process. A shard is retried CALC_SHARD_RETRIES times
+# before the run is marked FAILED; failed shards can be requeued with
+# retry_failed_shards.
+SHARD_SIZE = int(os.getenv("CALC_SHARD_SIZE", "50000"))
+SHARD_RETRIES = int(os.getenv("CALC_SHARD_RETRIES", "2"))
+# POST /api/calc/run partitions runs of at least this many activities on its own (0 = only when asked)
+PARTITION_MIN_ROWS = int(os.getenv("CALC_PARTITION_MIN_ROWS", "0"))
+
+def shard_ids(activity_ids: list[int], size: int = SHARD_SIZE) -> list[list[int]]:
+    size = max(1, size)
+    return [activity_ids[i:i + size] for i in range(0, len(activity_ids), size)]
+
+def start_run(db: Session, org_id: int, run_type: str, activity_ids: list[int], ef_snapshot: dict,
+              fingerprint: str | None = None, actor: str | None = None, shard_size: int = SHARD_SIZE) -> CalculationRun:
+    # ef_snapshot pins the EF payload hashes the run was started with; a shard
+    # that sees a different EF fails instead of mixing catalog versions
+    shards = shard_ids(activity_ids, shard_size)
+    run = CalculationRun(org_id=org_id, run_type=run_type, status="RUNNING", total_kgco2e=0.0, total_tco2e=0.0,
+                         details={"partitioned": {"shards": len(shards), "rows": len(activity_ids),
+                                                  "fingerprint": fingerprint, "actor": actor}},
+                         ef_snapshot=ef_snapshot)
+    db.add(run)
+    db.flush()
+    db.add_all([CalcRunShard(org_id=org_id, run_id=run.id, shard=i, activity_ids=ids, first_row=i * shard_size)
+                for i, ids in enumerate(shards)])
+    return run
+
+def enqueue_shards(org_id: int, run_id: int, shards: list[int]) -> list[str]:
+    # after the run and its shards are committed, so workers can see them
+    from app.jobs import job_calc_shard
+    from app.queues import enqueue
+
+    job_ids = []
+    for shard in shards:
+        job, _ = enqueue(job_calc_shard, org_id, run_id, shard, org_id=org_id, priority="bulk",
+                         dedup_key=f"calc_shard.{run_id}.{shard}", retry=rq.Retry(max=SHARD_RETRIES) if SHARD_RETRIES else None)
+        job_ids.append(job.id)
+    return job_ids
+
+def enqueue_reduce(org_id: int, run_id: int) -> str:
+    from app.jobs import job_reduce_run
+    from app.queues import enqueue
+
+    job, _ = enqueue(job_reduce_run, org_id, run_id, org_id=org_id, priority="bulk", dedup_key=f"calc_reduce.{run_id}")
+    return job.id
+
+def compute_shard(db: Session, org_id: int, run_id: int, shard: int) -> dict:
+    s = db.get(CalcRunShard, (org_id, run_id, shard))
+    run = db.get(CalculationRun, (org_id, run_id))
+    if s is None or run is None or run.status != "RUNNING" or s.status == "DONE":
+        # redelivered or cancelled; nothing left to do
+        return {"run_id": run_id, "shard": shard, "skipped": True}
+    try:
+        result = compute_run(db, s.activity_ids, run.run_type, org_id)
+        pinned = run.ef_snapshot or {}
+        changed = sorted(k for k, h in result["ef_snapshot"].items() if pinned.get(k) != h)
+        if changed:
+            raise ValueError(f"EF changed while run {run_id} was computed: {', '.join(changed[:5])}")
+        # rows, cube cells and DONE commit together, so a retried shard never writes twice
+        details = compact_details(result["details"]["rows"])
+        s.chunks = write_chunks(db, org_id, run_id, details["rows"], first_row=s.first_row)
+        add_chunk_cells(db, run_id, s.first_row, s.first_row + len(s.activity_ids))
+        s.status = "DONE"
+        s.attempts = (s.attempts or 0) + 1
+        s.error = None
+        s.total_kgco2e = result["total_kgco2e"]
+        s.ef_snapshot = result["ef_snapshot"]
+        s.efs = details["efs"]
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        s = db.get(CalcRunShard, (org_id, run_id, shard))
+        s.attempts = (s.attempts or 0) + 1
+        s.error = str(e)
+        s.status = "FAILED" if s.attempts > SHARD_RETRIES else "PENDING"
+        if s.status == "FAILED":
+            db.query(CalculationRun).filter(CalculationRun.org_id == org_id, CalculationRun.id == run_id,
+                                            CalculationRun.status == "RUNNING").update({"status": "FAILED"})
+        db.commit()
+        log.warning("calc_shard_failed", run_id=run_id, shard=shard, attempts=s.attempts, error=str(e))
+        raise
+
+    remaining = db.query(func.count()).select_from(CalcRunShard) \
+        .filter(CalcRunShard.org_id == org_id, CalcRunShard.run_id == run_id, CalcRunShard.status != "DONE").scalar()
+    if remaining == 0:
+        # every finisher that sees zero gets the same deduplicated job
+        enqueue_reduce(org_id, run_id)
+    return {"run_id": run_id, "shard": shard, "rows": len(s.activity_ids), "total_kgco2e": s.total_kgco2e}
+
+def reduce_run(db: Session, org_id: int, run_id: int) -> dict:
+    run = db.query(CalculationRun).filter(CalculationRun.org_id == org_id, CalculationRun.id == run_id).with_for_update().one_or_none()
+    if run is None or run.status != "RUNNING":
+        return {"run_id": run_id, "skipped": True}
+    shards = db.query(CalcRunShard).filter(CalcRunShard.org_id == org_id, CalcRunShard.run_id == run_id) \
+        .order_by(CalcRunShard.shard).all()
+    if any(s.status != "DONE" for s in shards):
+        return {"run_id": run_id, "skipped": True}
+
+    info = (run.details or {}).get("partitioned") or {}
+    total = sum(s.total_kgco2e or 0.0 for s in shards)
+    snapshot: dict = {}
+    efs: dict = {}
+    for s in shards:
+        snapshot.update(s.ef_snapshot or {})
+        for k, v in (s.efs or {}).items():
+            efs.setdefault(k, v)
+    run.total_kgco2e = total
+    run.total_tco2e = total / 1000.0
+    run.ef_snapshot = snapshot
+    # the rows stay where the shards wrote them; details is the manifest (see run_trace)
+    run.details = {"format": FORMAT, "efs": efs, "row_count": sum(len(s.activity_ids) for s in shards),
+                   "chunks": [c for s in shards for c in (s.chunks or [])],
+                   "partitioned": {"shards": len(shards), "rows": info.get("rows")}}
+    run.status = "DONE"
+    db.flush()
+    db.query(CalcRunShard).filter(CalcRunShard.org_id == org_id, CalcRunShard.run_id == run_id).delete(synchronize_session=False)
+    if info.get("fingerprint"):
+        remember_run(db, org_id, info["fingerprint"], run_id)
+    set_cube_status(db, run_id, run.review_status)
+    emit_event(db, org_id, info.get("actor"), "RUN_CREATED",
+               {"run_id": run_id, "run_type": run.run_type, "total_tco2e": run.total_tco2e, "shards": len(shards)})
+    db.commit()
+    return {"run_id": run_id, "shards": len(shards), "total_tco2e": run.total_tco2e}
+
+def retry_failed_shards(db: Session, org_id: int, run_id: int) -> list[int]:
+    # unfinished shards back to PENDING with a fresh retry budget; the caller
+    # enqueues them (or the reduce, when none are left) after commit
+    run = db.query(CalculationRun).filter(CalculationRun.org_id == org_id, CalculationRun.id == run_id).with_for_update().one_or_none()
+    if run is None:
+        raise ValueError("Run not found")
+    if run.status == "DONE":
+        return []
+    shards = [s for s in db.query(CalcRunShard).filter(CalcRunShard.org_id == org_id, CalcRunShard.run_id == run_id)
+              if s.status != "DONE"]
+    for s in shards:
+        s.status = "PENDING"
+        s.attempts = 0
+    run.status = "RUNNING"
+    return [s.shard for s in shards]
+
+def shard_progress(db: Session, org_id: int, run_id: int) -> list[dict]:
+    rows = db.query(CalcRunShard.shard, CalcRunShard.status, CalcRunShard.attempts, func.jsonb_array_length(CalcRunShard.activity_ids),
+                    CalcRunShard.total_kgco2e, CalcRunShard.error) \
+        .filter(CalcRunShard.org_id == org_id, CalcRunShard.run_id == run_id).order_by(CalcRunShard.shard)
+    return [{"shard": shard, "status": status, "attempts": attempts, "rows": n, "total_kgco2e": total, "error": error}
+            for shard, status, attempts, n, total, error in rows]
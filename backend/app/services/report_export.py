@@ -1,11 +1,14 @@
 from __future__ import annotations
 import io, json, hashlib
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
+from itertools import islice
 from sqlalchemy.orm import Session
+from app.lazy import lazy_module
 from app.models import CalculationRun
+from app.services.run_trace import iter_run_rows
+
+pagesizes = lazy_module("reportlab.lib.pagesizes")
+canvas = lazy_module("reportlab.pdfgen.canvas")
+openpyxl = lazy_module("openpyxl")
 
 def _run_hash(run: CalculationRun) -> str:
     payload = {
@@ -25,8 +28,8 @@ def export_run_pdf(db: Session, run_id: int) -> bytes:
     sha = _run_hash(run)
 
     buf = io.BytesIO()
-    c = canvas.Canvas(buf, pagesize=A4)
-    w, h = A4
+    c = canvas.Canvas(buf, pagesize=pagesizes.A4)
+    w, h = pagesizes.A4
     y = h - 50
 
     c.setFont("Helvetica-Bold", 14)
@@ -45,8 +48,7 @@ def export_run_pdf(db: Session, run_id: int) -> bytes:
     y -= 14
     c.setFont("Helvetica", 9)
 
-    rows = (run.details or {}).get("rows") or []
-    for row in rows[:40]:
+    for row in islice(iter_run_rows(db, run), 40):
         line = f"- activity_id={row.get('activity_id')} ef={row.get('ef_key')} kgCO2e={float(row.get('kgco2e',0)):.4f}"
         c.drawString(60, y, line[:120])
         y -= 12
@@ -65,7 +67,7 @@ def export_run_excel(db: Session, run_id: int) -> bytes:
         raise ValueError("Run not found")
     sha = _run_hash(run)
 
-    wb = Workbook()
+    wb = openpyxl.Workbook()
     ws = wb.active
     ws.title = "Summary"
     ws.append(["Run ID", run.id])
@@ -77,7 +79,7 @@ def export_run_excel(db: Session, run_id: int) -> bytes:
 
     ws2 = wb.create_sheet("Rows")
     ws2.append(["activity_id","activity_name","ef_key","kgco2e","inputs_json","trace_json"])
-    for row in ((run.details or {}).get("rows") or []):
+    for row in iter_run_rows(db, run):
         ws2.append([
             row.get("activity_id"),
             row.get("activity_name"),
@@ -87,7 +89,7 @@ def export_run_excel(db: Session, run_id: int) -> bytes:
             json.dumps(row.get("trace") or {}, ensure_ascii=False),
         ])
     for col in range(1, 7):
-        ws2.column_dimensions[get_column_letter(col)].width = 22
+        ws2.column_dimensions[openpyxl.utils.get_column_letter(col)].width = 22
 
     out = io.BytesIO()
     wb.save(out)
@@ -0,0 +1,105 @@
+from __future__ import annotations
+from typing import Iterator
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.models import CalculationRun
+from app.services.run_trace import RUN_ROWS_SQL
+from app.responses import ndjson_line as _line
+
+# Rows are unnested from details->'rows' and full-outer-joined inside Postgres;
+# the result is read through a server-side cursor so neither run's row list is
+# ever held in Python. Join key: (activity_id, ef_key, occurrence) so a run
+# that lists the same activity twice still pairs up row by row. The EF hash
+# comes from the row trace (legacy runs) or the run's "efs" table (compact runs);
+# chunked runs are unnested from calc_run_rows the same way (RUN_ROWS_SQL).
+_DIFF_SQL = text("""
+WITH base AS (
+    SELECT (r->>'activity_id')::bigint AS activity_id, r->>'ef_key' AS ef_key,
+           row_number() OVER (PARTITION BY r->>'activity_id', r->>'ef_key' ORDER BY o) AS n,
+           (r->>'kgco2e')::float8 AS kg, COALESCE(r->'trace'->>'ef_payload_hash', c.details->'efs'->(r->>'ef_key')->>'ef_payload_hash') AS ef_hash, r->'inputs' AS inputs,
+           r->>'activity_name' AS activity_name
+    FROM calculation_runs c CROSS JOIN LATERAL """ + RUN_ROWS_SQL + """ AS t(r, o)
+    WHERE c.id = :base_id AND c.org_id = :org_id
+), other AS (
+    SELECT (r->>'activity_id')::bigint AS activity_id, r->>'ef_key' AS ef_key,
+           row_number() OVER (PARTITION BY r->>'activity_id', r->>'ef_key' ORDER BY o) AS n,
+           (r->>'kgco2e')::float8 AS kg, COALESCE(r->'trace'->>'ef_payload_hash', c.details->'efs'->(r->>'ef_key')->>'ef_payload_hash') AS ef_hash, r->'inputs' AS inputs,
+           r->>'activity_name' AS activity_name
+    FROM calculation_runs c CROSS JOIN LATERAL """ + RUN_ROWS_SQL + """ AS t(r, o)
+    WHERE c.id = :other_id AND c.org_id = :org_id
+)
+SELECT COALESCE(b.activity_id, o.activity_id) AS activity_id, COALESCE(b.ef_key, o.ef_key) AS ef_key,
+       COALESCE(o.activity_name, b.activity_name) AS activity_name,
+       b.kg AS base_kg, o.kg AS other_kg, b.ef_hash AS base_ef_hash, o.ef_hash AS other_ef_hash,
+       (b.inputs IS DISTINCT FROM o.inputs) AS inputs_changed,
+       b.activity_id IS NULL AS added, o.activity_id IS NULL AS removed,
+       COALESCE(a.scope, 'N/A') AS scope, COALESCE(ef.category, 'Unclassified') AS category
+FROM base b
+FULL OUTER JOIN other o ON o.activity_id = b.activity_id AND o.ef_key = b.ef_key AND o.n = b.n
+LEFT JOIN activities a ON a.id = COALESCE(b.activity_id, o.activity_id) AND a.org_id = :org_id
+LEFT JOIN emission_factors ef ON ef.key = COALESCE(b.ef_key, o.ef_key) AND ef.org_id = :org_id
+ORDER BY 1, 2
+""")
+
+EPS = 1e-9
+
+def load_run_headers(db: Session, org_id: int, base_id: int, other_id: int) -> dict[int, dict]:
+    # everything but details, which is only read through the diff cursor
+    rows = db.query(CalculationRun.id, CalculationRun.run_type, CalculationRun.total_kgco2e, CalculationRun.ef_snapshot,
+                    CalculationRun.review_status, CalculationRun.created_at) \
+        .filter(CalculationRun.org_id == org_id, CalculationRun.id.in_([base_id, other_id])).all()
+    return {r.id: {"run_id": r.id, "run_type": r.run_type, "total_kgco2e": r.total_kgco2e, "ef_snapshot": r.ef_snapshot or {},
+                   "review_status": r.review_status, "created_at": r.created_at.isoformat() if r.created_at else None}
+            for r in rows}
+
+def ef_snapshot_changes(base: dict, other: dict) -> list[dict]:
+    out = []
+    for key in sorted(set(base) | set(other)):
+        b, o = base.get(key), other.get(key)
+        if b != o:
+            out.append({"ef_key": key, "change": "added" if b is None else "removed" if o is None else "changed",
+                        "base_hash": b, "other_hash": o})
+    return out
+
+def iter_run_diff_ndjson(db: Session, org_id: int, base: dict, other: dict, include_unchanged: bool = False,
+                         batch_size: int = 5000) -> Iterator[bytes]:
+    # header, one line per differing row, then EF hash changes and the totals
+    yield _line({"type": "header", "base": {k: v for k, v in base.items() if k != "ef_snapshot"},
+                 "other": {k: v for k, v in other.items() if k != "ef_snapshot"}})
+    counts = {"added": 0, "removed": 0, "changed": 0, "unchanged": 0}
+    by_scope: dict[str, list[float]] = {}
+    by_category: dict[str, list[float]] = {}
+    base_total = other_total = 0.0
+
+    result = db.connection().execution_options(stream_results=True, yield_per=batch_size).execute(
+        _DIFF_SQL, {"org_id": org_id, "base_id": base["run_id"], "other_id": other["run_id"]})
+    for r in result:
+        bkg, okg = r.base_kg or 0.0, r.other_kg or 0.0
+        if r.added:
+            change = "added"
+        elif r.removed:
+            change = "removed"
+        elif abs(okg - bkg) > EPS or r.base_ef_hash != r.other_ef_hash or r.inputs_changed:
+            change = "changed"
+        else:
+            change = "unchanged"
+        counts[change] += 1
+        base_total += bkg
+        other_total += okg
+        for agg, name in ((by_scope, r.scope), (by_category, r.category)):
+            acc = agg.setdefault(name, [0.0, 0.0])
+            acc[0] += bkg
+            acc[1] += okg
+        if change != "unchanged" or include_unchanged:
+            yield _line({"type": "row", "change": change, "activity_id": r.activity_id, "ef_key": r.ef_key,
+                         "activity_name": r.activity_name, "scope": r.scope, "category": r.category,
+                         "base_kgco2e": r.base_kg, "other_kgco2e": r.other_kg, "delta_kgco2e": okg - bkg,
+                         "ef_hash_changed": bool(r.base_ef_hash and r.other_ef_hash and r.base_ef_hash != r.other_ef_hash),
+                         "inputs_changed": bool(r.inputs_changed and change == "changed")})
+
+    def _deltas(agg):
+        return {k: {"base_kgco2e": b, "other_kgco2e": o, "delta_kgco2e": o - b} for k, (b, o) in sorted(agg.items())}
+
+    yield _line({"type": "ef_changes", "items": ef_snapshot_changes(base["ef_snapshot"], other["ef_snapshot"])})
+    yield _line({"type": "totals", "rows": counts, "base_kgco2e": base_total, "other_kgco2e": other_total,
+                 "delta_kgco2e": other_total - base_total, "by_scope": _deltas(by_scope), "by_category": _deltas(by_category)})
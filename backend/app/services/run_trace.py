@@ -0,0 +1,114 @@
+from __future__ import annotations
+import hashlib, json, os
+from typing import Iterable, Iterator
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models import CalcRunRows, CalculationRun
+
+# Stored shape of CalculationRun.details for new runs:
+#   {"format": "compact-v1", "efs": {ef_key: {method, ef_value|per_unit_co2e, meta, ef_payload_hash}},
+#    "rows": [{activity_id, activity_name, ef_key, inputs, scope, period, site, kgco2e, trace: {qty, qtrace}}]}
+# EF-level trace fields are kept once per run instead of once per row. Runs with at
+# least CALC_TRACE_CHUNK_ROWS rows (0 = never) keep no "rows" in details: the rows go
+# to calc_run_rows, CALC_TRACE_CHUNK_SIZE per JSONB value (compressed by Postgres
+# TOAST), and details lists the chunks as "chunks": [{first_row, rows, sha256}] so a
+# run hash still covers every row. SQL readers unnest both layouts with RUN_ROWS_SQL;
+# Python readers stream chunks one at a time with iter_run_rows. Legacy details
+# ({"rows": [...full traces...]}) are read unchanged.
+FORMAT = "compact-v1"
+CHUNK_ROWS = int(os.getenv("CALC_TRACE_CHUNK_ROWS", "50000"))
+CHUNK_SIZE = int(os.getenv("CALC_TRACE_CHUNK_SIZE", "10000"))
+EF_FIELDS = ("method", "ef_value", "per_unit_co2e", "meta", "ef_payload_hash")
+# activity attributes as of the run; rows stored before they were snapshotted lack them
+SNAPSHOT_FIELDS = ("scope", "period", "site")
+
+# Every row of run "c" with its 1-based position, inline or chunked:
+#   FROM calculation_runs c CROSS JOIN LATERAL {RUN_ROWS_SQL} AS t(r, o)
+RUN_ROWS_SQL = """(
+    SELECT e.r, e.o FROM jsonb_array_elements(COALESCE(c.details->'rows', '[]'::jsonb)) WITH ORDINALITY AS e(r, o)
+    UNION ALL
+    SELECT e.r, k.first_row + e.o FROM calc_run_rows k CROSS JOIN LATERAL jsonb_array_elements(k.rows) WITH ORDINALITY AS e(r, o)
+    WHERE k.org_id = c.org_id AND k.run_id = c.id
+)"""
+
+def compact_details(rows: list[dict]) -> dict:
+    efs: dict[str, dict] = {}
+    out = []
+    for r in rows:
+        t = r["trace"]
+        if r["ef_key"] not in efs:
+            efs[r["ef_key"]] = {k: t[k] for k in EF_FIELDS if k in t}
+        out.append({"activity_id": r["activity_id"], "activity_name": r["activity_name"], "ef_key": r["ef_key"],
+                    "inputs": r["inputs"], **{k: r[k] for k in SNAPSHOT_FIELDS if k in r},
+                    "kgco2e": r["kgco2e"], "trace": {"qty": t["qty"], "qtrace": t["qtrace"]}})
+    return {"format": FORMAT, "efs": efs, "row_count": len(out), "rows": out}
+
+def store_details(db: Session, run: CalculationRun, details: dict, chunk_rows: int | None = None):
+    # sets run.details from compact details; large runs get their rows chunked (run.id must be set)
+    threshold = CHUNK_ROWS if chunk_rows is None else chunk_rows
+    rows = details.get("rows") or []
+    if threshold and len(rows) >= threshold:
+        details = {k: v for k, v in details.items() if k != "rows"}
+        details["chunks"] = write_chunks(db, run.org_id, run.id, rows)
+    run.details = details
+
+def write_chunks(conn, org_id: int, run_id: int, rows: list[dict], first_row: int = 0, size: int | None = None) -> list[dict]:
+    # conn: Session or Connection; returns the manifest entries of the chunks written
+    size = max(1, size or CHUNK_SIZE)
+    manifest, values = [], []
+    for i in range(0, len(rows), size):
+        part = rows[i:i + size]
+        raw = json.dumps(part, ensure_ascii=False, separators=(",", ":"), sort_keys=True, default=str)
+        manifest.append({"first_row": first_row + i, "rows": len(part), "sha256": hashlib.sha256(raw.encode("utf-8")).hexdigest()})
+        values.append({"org_id": org_id, "run_id": run_id, "first_row": first_row + i, "rows": part})
+    if values:
+        conn.execute(CalcRunRows.__table__.insert(), values)
+    return manifest
+
+def is_chunked(details: dict | None) -> bool:
+    return bool(details) and "chunks" in details
+
+def _expand(details: dict, stored: Iterable[dict]) -> Iterator[dict]:
+    efs = details.get("efs") or {}
+    for r in stored:
+        ef = efs.get(r["ef_key"]) or {}
+        t = r.get("trace") or {}
+        trace = {"method": ef.get("method"), "qty": t.get("qty")}
+        if "ef_value" in ef:
+            trace["ef_value"] = ef["ef_value"]
+        if "per_unit_co2e" in ef:
+            trace["per_unit_co2e"] = ef["per_unit_co2e"]
+        trace.update({"qtrace": t.get("qtrace"), "ef_key": r["ef_key"], "meta": ef.get("meta"),
+                      "ef_payload_hash": ef.get("ef_payload_hash")})
+        yield {"activity_id": r["activity_id"], "activity_name": r.get("activity_name"), "ef_key": r["ef_key"],
+               "inputs": r.get("inputs"), **{k: r[k] for k in SNAPSHOT_FIELDS if k in r},
+               "kgco2e": r.get("kgco2e"), "trace": trace}
+
+def iter_rows(details: dict | None) -> Iterator[dict]:
+    # inline rows in the original full-trace shape; chunked runs need iter_run_rows
+    if not details:
+        return
+    if details.get("format") != FORMAT:
+        yield from details.get("rows") or []
+        return
+    yield from _expand(details, details.get("rows") or [])
+
+def iter_run_rows(db: Session, run: CalculationRun) -> Iterator[dict]:
+    # every row of the run, whatever the layout; chunks are fetched one at a time
+    details = run.details
+    if not is_chunked(details):
+        yield from iter_rows(details)
+        return
+    q = select(CalcRunRows.rows).where(CalcRunRows.org_id == run.org_id, CalcRunRows.run_id == run.id) \
+        .order_by(CalcRunRows.first_row)
+    for part in db.execute(q, execution_options={"yield_per": 1}).scalars():
+        yield from _expand(details, part)
+
+def expand_details(details: dict | None, rows: Iterable[dict] | None = None) -> dict:
+    # full legacy view for API responses; other top-level keys (review notes etc.) are kept.
+    # rows: the run's rows when they are chunked (iter_run_rows)
+    if not details or details.get("format") != FORMAT:
+        return details or {}
+    out = {k: v for k, v in details.items() if k not in ("format", "efs", "rows", "chunks", "row_count")}
+    out["rows"] = list(rows if rows is not None else iter_rows(details))
+    return out
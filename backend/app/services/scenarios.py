@@ -0,0 +1,121 @@
+from __future__ import annotations
+import math
+from sqlalchemy.orm import Session
+from app.lazy import lazy_module
+from app.services.calc_service import load_activities, compute_activity_quantity
+from app.services.ef_catalog import get_catalog
+from app.services.gwp import GWP, normalize_gwp_version, resolve_gwp
+
+np = lazy_module("numpy")
+
+GASES = sorted({g for table in GWP.values() for g in table})
+
+def _gwp_vector(table: dict) -> np.ndarray:
+    return np.array([float(table.get(g, 0.0)) for g in GASES])
+
+def _gas_row(ef) -> np.ndarray:
+    gases = (ef.gas_breakdown or {}).get("gases") or {}
+    row = np.zeros(len(GASES))
+    for gas, val in gases.items():
+        g = gas.strip().upper()
+        if g in GASES:
+            row[GASES.index(g)] += float(val)
+    return row
+
+def _check_scenario(i: int, sc: dict) -> dict:
+    if not isinstance(sc, dict):
+        raise ValueError(f"scenario {i} must be an object")
+    name = sc.get("name") or f"scenario_{i}"
+    if not isinstance(name, str):
+        raise ValueError(f"scenario {i}: name must be a string")
+    gwp = sc.get("gwp_version")
+    if gwp is not None and not isinstance(gwp, str):
+        raise ValueError(f"{name}: gwp_version must be a string")
+    if gwp and normalize_gwp_version(gwp) not in GWP:
+        raise ValueError(f"Unknown gwp_version in {name}: {gwp}")
+    ef_values, ef_swaps = sc.get("ef_values") or {}, sc.get("ef_swaps") or {}
+    if not isinstance(ef_values, dict) or not isinstance(ef_swaps, dict):
+        raise ValueError(f"{name}: ef_values and ef_swaps must be objects keyed by EF key")
+    # bool is an int subclass but never a meaningful factor
+    bad = sorted(k for k, v in ef_values.items() if isinstance(v, bool) or not isinstance(v, (int, float)) or not math.isfinite(v))
+    if bad:
+        raise ValueError(f"{name}: ef_values must be finite numbers ({', '.join(bad)})")
+    bad = sorted(k for k, v in ef_swaps.items() if not isinstance(v, str) or not v)
+    if bad:
+        raise ValueError(f"{name}: ef_swaps must map EF keys to EF keys ({', '.join(bad)})")
+    return {"name": name, "gwp_version": gwp, "ef_values": {k: float(v) for k, v in ef_values.items()}, "ef_swaps": ef_swaps}
+
+def sweep(db: Session, activity_ids: list[int], org_id: int, scenarios: list[dict], include_rows: bool = True) -> dict:
+    # activities and EFs are loaded once; column 0 of every matrix is the baseline
+    specs = [{"name": "baseline", "gwp_version": None, "ef_values": {}, "ef_swaps": {}}]
+    specs += [_check_scenario(i + 1, sc) for i, sc in enumerate(scenarios)]
+
+    activities = load_activities(db, org_id, activity_ids)
+    wanted = {a.ef_key for a in activities}
+    for sc in specs:
+        wanted.update(sc["ef_swaps"].values())
+        wanted.update(sc["ef_values"])
+    catalog = get_catalog(db, org_id)
+    efs = {k: catalog.by_key[k] for k in wanted if k in catalog.by_key}
+    missing = sorted(k for k in wanted if k not in efs)
+    if missing:
+        raise ValueError(f"EF not found: {', '.join(missing)}")
+
+    keys = sorted(efs)
+    idx = {k: i for i, k in enumerate(keys)}
+    n_ef, n_sc = len(keys), len(specs)
+
+    # quantities are scenario-independent: derived once with each activity's own EF
+    qty = np.empty(len(activities))
+    row_ef = np.empty(len(activities), dtype=np.int64)
+    for i, a in enumerate(activities):
+        ef = efs[a.ef_key]
+        qty[i], _ = compute_activity_quantity(ef, a.inputs or {})
+        row_ef[i] = idx[a.ef_key]
+
+    values = np.array([np.nan if efs[k].value is None else float(efs[k].value) for k in keys])
+    gas = np.vstack([_gas_row(efs[k]) for k in keys]) if n_ef else np.zeros((0, len(GASES)))
+    own_gwp = np.vstack([_gwp_vector(resolve_gwp(efs[k].gwp_version)) for k in keys]) if n_ef else np.zeros((0, len(GASES)))
+
+    # per-unit kgCO2e for every (EF, scenario); a GWP override only re-weights gas-breakdown
+    # factors, direct values are already CO2e
+    factors = np.empty((n_ef, n_sc))
+    remap = np.tile(np.arange(n_ef)[:, None], (1, n_sc))
+    for s, sc in enumerate(specs):
+        gas_co2e = gas @ _gwp_vector(resolve_gwp(sc["gwp_version"])) if sc["gwp_version"] else (gas * own_gwp).sum(axis=1)
+        factors[:, s] = np.where(np.isnan(values), gas_co2e, values)
+        for k, v in sc["ef_values"].items():
+            factors[idx[k], s] = float(v)
+        for src, dst in sc["ef_swaps"].items():
+            if src in idx:
+                remap[idx[src], s] = idx[dst]
+
+    row_factor_idx = remap[row_ef]
+    per_row = qty[:, None] * factors[row_factor_idx, np.arange(n_sc)[None, :]]
+    totals = per_row.sum(axis=0)
+    deltas = per_row - per_row[:, :1]
+
+    scope_names, scope_idx = np.unique(np.array([a.scope or "N/A" for a in activities], dtype=object), return_inverse=True)
+    by_scope = np.zeros((len(scope_names), n_sc))
+    np.add.at(by_scope, scope_idx, per_row)
+
+    out = {
+        "rows": len(activities),
+        "scenarios": [{
+            "name": sc["name"],
+            "gwp_version": sc["gwp_version"],
+            "total_kgco2e": float(totals[s]),
+            "total_tco2e": float(totals[s]) / 1000.0,
+            "delta_kgco2e": float(totals[s] - totals[0]),
+            "delta_pct": (float((totals[s] - totals[0]) / totals[0] * 100.0) if totals[0] else None),
+            "by_scope": {str(n): float(by_scope[i, s]) for i, n in enumerate(scope_names)},
+        } for s, sc in enumerate(specs)],
+    }
+    if include_rows:
+        out["row_deltas"] = [{
+            "activity_id": a.id,
+            "ef_key": a.ef_key,
+            "baseline_kgco2e": float(per_row[i, 0]),
+            "delta_kgco2e": deltas[i, 1:].tolist(),
+        } for i, a in enumerate(activities)]
+    return out
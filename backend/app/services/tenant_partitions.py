@@ -0,0 +1,54 @@
+from __future__ import annotations
+import argparse, os
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+# activities, calculation_runs and calc_run_rows are hash-partitioned on org_id,
+# so every tenant-scoped query touches one partition and its primary key index.
+# The modulus is fixed when the partitions are first created; changing
+# TENANT_PARTITIONS later only affects fresh databases.
+TABLES = ("activities", "calculation_runs", "calc_run_rows")
+PARTITIONS = int(os.getenv("TENANT_PARTITIONS", "16"))
+
+def partition_name(table: str, remainder: int) -> str:
+    return f"{table}_h{remainder:02d}"
+
+def is_partitioned(conn: Connection, table: str) -> bool:
+    kind = conn.execute(text(f"SELECT relkind FROM pg_class WHERE oid = to_regclass('{table}')")).scalar()
+    return kind == "p"
+
+def existing_partitions(conn: Connection, table: str) -> int:
+    return conn.execute(text(f"SELECT count(*) FROM pg_inherits WHERE inhparent = to_regclass('{table}')")).scalar() or 0
+
+def create_partitions(conn: Connection, table: str, partitions: int = PARTITIONS, parent: str | None = None) -> list[str]:
+    # parent: attach to a differently named table (the migration's shadow copy)
+    names = []
+    for i in range(partitions):
+        name = partition_name(parent or table, i)
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {parent or table} "
+                          f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {i})"))
+        names.append(name)
+    return names
+
+def ensure_hash_partitions(conn: Connection, partitions: int = PARTITIONS) -> list[str]:
+    created = []
+    for table in TABLES:
+        if not is_partitioned(conn, table):
+            # legacy heap table; alembic revision 0003 converts it
+            continue
+        if existing_partitions(conn, table) == 0:
+            created += create_partitions(conn, table, partitions)
+    return created
+
+def main():
+    from app.db import engine
+
+    ap = argparse.ArgumentParser(description="Create the org hash partitions of activities / calculation_runs / calc_run_rows")
+    ap.add_argument("--partitions", type=int, default=PARTITIONS)
+    args = ap.parse_args()
+    with engine.begin() as conn:
+        for name in ensure_hash_partitions(conn, args.partitions):
+            print(f"[partitions] {name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+from __future__ import annotations
+import os
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.lazy import lazy_module
+from app.models import Activity, CalculationRun
+from app.services.calc_service import IN_CHUNK, load_activities, compute_activity_quantity
+from app.services.ef_catalog import get_catalog
+from app.services.run_trace import iter_run_rows
+
+np = lazy_module("numpy")
+
+# EmissionFactor.uncertainty_value is read as the relative half-width of the 95%
+# interval (IPCC convention, 0.1 = ±10%); for uniform/triangular it is the half-range.
+Z95 = 1.959963984540054
+CHUNK_ITERATIONS = 1000
+
+def _sample(rng: np.random.Generator, kinds: list[str], u: np.ndarray, n: int) -> np.ndarray:
+    # one multiplier per EF and iteration: every row on the same EF moves together
+    m = np.ones((len(kinds), n))
+    kinds_arr = np.array(kinds)
+    for kind in set(kinds):
+        sel = np.flatnonzero(kinds_arr == kind)
+        uu = u[sel][:, None]
+        if kind in ("lognormal", "log-normal"):
+            sigma = np.log1p(uu) / Z95
+            m[sel] = np.exp(rng.standard_normal((len(sel), n)) * sigma - sigma * sigma / 2.0)
+        elif kind == "uniform":
+            m[sel] = rng.uniform(np.maximum(0.0, 1.0 - uu), 1.0 + uu, size=(len(sel), n))
+        elif kind == "triangular":
+            lo = np.maximum(0.0, 1.0 - uu)
+            m[sel] = rng.triangular(np.broadcast_to(lo, (len(sel), n)), 1.0, np.broadcast_to(1.0 + uu, (len(sel), n)))
+        else:
+            m[sel] = np.maximum(0.0, 1.0 + rng.standard_normal((len(sel), n)) * (uu / Z95))
+    return m
+
+def _stats(samples: np.ndarray, deterministic: np.ndarray, confidence: float) -> list[dict]:
+    lo_q, hi_q = (1.0 - confidence) / 2.0, (1.0 + confidence) / 2.0
+    mean, std = samples.mean(axis=1), samples.std(axis=1)
+    lo, hi = np.quantile(samples, [lo_q, hi_q], axis=1)
+    return [{
+        "deterministic_kgco2e": float(deterministic[i]), "mean_kgco2e": float(mean[i]), "std_kgco2e": float(std[i]),
+        "ci_low_kgco2e": float(lo[i]), "ci_high_kgco2e": float(hi[i]),
+    } for i in range(samples.shape[0])]
+
+def monte_carlo_run(
+    db: Session,
+    activity_ids: list[int],
+    org_id: int,
+    *,
+    iterations: int = 10_000,
+    confidence: float = 0.95,
+    seed: int | None = None,
+    workers: int | None = None,
+) -> dict:
+    # base kgCO2e recomputed from the activities with the current catalog
+    activities = load_activities(db, org_id, activity_ids)
+    efs = get_catalog(db, org_id).by_key
+    kg = np.empty(len(activities))
+    keys, scopes = [], []
+    for i, a in enumerate(activities):
+        ef = efs.get(a.ef_key)
+        if not ef:
+            raise ValueError(f"EF not found: {a.ef_key}")
+        qty, _ = compute_activity_quantity(ef, a.inputs or {})
+        kg[i] = qty * ef.per_unit
+        keys.append(a.ef_key)
+        scopes.append(a.scope or "N/A")
+    return propagate(kg, keys, scopes, efs, iterations=iterations, confidence=confidence, seed=seed, workers=workers)
+
+def monte_carlo_for_run(
+    db: Session,
+    run: CalculationRun,
+    *,
+    iterations: int = 10_000,
+    confidence: float = 0.95,
+    seed: int | None = None,
+    workers: int | None = None,
+) -> dict:
+    # base kgCO2e is what the run stored, so the deterministic total is the run's own even
+    # after EFs or inputs changed; uncertainty parameters come from the current catalog
+    kg, keys, activity_ids = [], [], []
+    for r in iter_run_rows(db, run):
+        kg.append(float(r.get("kgco2e") or 0.0))
+        keys.append(r["ef_key"])
+        activity_ids.append(r.get("activity_id"))
+    scope_by_id = _activity_scopes(db, run.org_id, [i for i in activity_ids if i])
+    scopes = [scope_by_id.get(i) or "N/A" for i in activity_ids]
+    return propagate(np.array(kg, dtype=float), keys, scopes, get_catalog(db, run.org_id).by_key,
+                     iterations=iterations, confidence=confidence, seed=seed, workers=workers)
+
+def _activity_scopes(db: Session, org_id: int, activity_ids: list[int]) -> dict[int, str]:
+    out = {}
+    for i in range(0, len(activity_ids), IN_CHUNK):
+        q = select(Activity.id, Activity.scope).where(Activity.org_id == org_id, Activity.id.in_(activity_ids[i:i + IN_CHUNK]))
+        out.update(db.execute(q).tuples().all())
+    return out
+
+def propagate(
+    kg: np.ndarray,
+    row_keys: list[str],
+    scopes: list[str],
+    efs: dict,
+    *,
+    iterations: int = 10_000,
+    confidence: float = 0.95,
+    seed: int | None = None,
+    workers: int | None = None,
+) -> dict:
+    # kg[i] is row i's deterministic kgCO2e on EF row_keys[i]; efs maps keys to records
+    # with uncertainty_value/uncertainty_type/category (EFs missing there do not vary)
+    ef_keys = sorted(set(row_keys))
+    ef_index = {k: i for i, k in enumerate(ef_keys)}
+    row_ef = np.array([ef_index[k] for k in row_keys], dtype=np.int64)
+    categories = [getattr(efs.get(k), "category", None) or "Unclassified" for k in row_keys]
+
+    # collapse rows to (group x EF) weight matrices; sampling then only touches EFs
+    n_ef = len(ef_keys)
+    scope_names, scope_idx = np.unique(np.array(scopes, dtype=object), return_inverse=True)
+    cat_names, cat_idx = np.unique(np.array(categories, dtype=object), return_inverse=True)
+    weights = np.vstack([
+        np.bincount(row_ef, weights=kg, minlength=n_ef)[None, :],
+        np.bincount(scope_idx * n_ef + row_ef, weights=kg, minlength=len(scope_names) * n_ef).reshape(-1, n_ef),
+        np.bincount(cat_idx * n_ef + row_ef, weights=kg, minlength=len(cat_names) * n_ef).reshape(-1, n_ef),
+    ])
+
+    u = np.array([float(getattr(efs.get(k), "uncertainty_value", None) or 0.0) for k in ef_keys])
+    kinds = [(getattr(efs.get(k), "uncertainty_type", None) or "normal").strip().lower() for k in ef_keys]
+    varying = np.flatnonzero(u > 0)
+    fixed = weights[:, np.setdiff1d(np.arange(n_ef), varying)].sum(axis=1)
+    w_var = weights[:, varying]
+    kinds_var = [kinds[i] for i in varying]
+
+    n_chunks = (iterations + CHUNK_ITERATIONS - 1) // CHUNK_ITERATIONS
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+
+    def run_chunk(c: int) -> np.ndarray:
+        n = min(CHUNK_ITERATIONS, iterations - c * CHUNK_ITERATIONS)
+        if not len(varying):
+            return np.repeat(fixed[:, None], n, axis=1)
+        m = _sample(np.random.default_rng(seeds[c]), kinds_var, u[varying], n)
+        return fixed[:, None] + w_var @ m
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as ex:
+        samples = np.hstack(list(ex.map(run_chunk, range(n_chunks))))
+
+    stats = _stats(samples, weights.sum(axis=1), confidence)
+    n_scope = len(scope_names)
+    return {
+        "iterations": iterations,
+        "confidence": confidence,
+        "seed": seed,
+        "rows": len(row_keys),
+        "total": stats[0],
+        "by_scope": {str(name): stats[1 + i] for i, name in enumerate(scope_names)},
+        "by_category": {str(name): stats[1 + n_scope + i] for i, name in enumerate(cat_names)},
+        "efs_without_uncertainty": [ef_keys[i] for i in range(n_ef) if u[i] <= 0],
+    }
@@ -1,16 +1,75 @@
 from __future__ import annotations
-import os
-from rq import Worker, Queue, Connection
-import redis
+import argparse, importlib, os, time
+from rq import Queue, Worker
+from rq.worker_pool import WorkerPool
+from app.queues import PRIORITIES, get_redis, org_queue_names
 
-listen = ["default"]
+# Static queues are always listened on after the per-org ones ("default" holds
+# jobs enqueued by older API versions).
+STATIC_QUEUES = ["default"]
+REFRESH_SECONDS = int(os.getenv("WORKER_QUEUE_REFRESH_SECONDS", "5"))
+# Imported once in the parent before work starts: each job runs in a fork, so
+# whatever the jobs import lazily would otherwise be re-imported per job.
+PRELOAD = [m for m in os.getenv("WORKER_PRELOAD", "app.db,app.services.audit_engine,app.services.partitioned_runs,pandas,numpy").split(",") if m.strip()]
+
+class FairWorker(Worker):
+    # Dequeue order: every org's interactive queue, then every org's bulk queue,
+    # then the static queues. Within a priority, orgs are served round-robin: the
+    # org that just got a job moves to the back of the line.
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._static = list(self.queues)
+        self._org_order: list[str] = []
+
+    def _refresh_queues(self):
+        by_org: dict[str, dict[str, Queue]] = {}
+        for priority in PRIORITIES:
+            for name in org_queue_names(self.connection, priority):
+                org = name.split(".", 1)[1]
+                by_org.setdefault(org, {})[priority] = Queue(name, connection=self.connection,
+                                                            job_class=self.job_class, serializer=self.serializer)
+        self._org_order = [o for o in self._org_order if o in by_org] + sorted(o for o in by_org if o not in self._org_order)
+        ordered = [by_org[o][p] for p in PRIORITIES for o in self._org_order if p in by_org[o]]
+        self.queues = ordered + self._static
+        self._ordered_queues = list(self.queues)
+
+    def reorder_queues(self, reference_queue: Queue):
+        if "." in reference_queue.name:
+            org = reference_queue.name.split(".", 1)[1]
+            if org in self._org_order:
+                self._org_order.remove(org)
+                self._org_order.append(org)
+
+    def dequeue_job_and_maintain_ttl(self, timeout, max_idle_time=None):
+        # block in short slices so queues for newly active orgs are picked up
+        if timeout is None:
+            self._refresh_queues()
+            return super().dequeue_job_and_maintain_ttl(None, max_idle_time)
+        idle_since = time.monotonic()
+        while True:
+            self._refresh_queues()
+            step = min(timeout, REFRESH_SECONDS)
+            result = super().dequeue_job_and_maintain_ttl(step, step)
+            if result is not None:
+                return result
+            if max_idle_time is not None and time.monotonic() - idle_since >= max_idle_time:
+                return None
 
 def main():
-    redis_url = os.getenv("REDIS_URL","redis://localhost:6379/0")
-    conn = redis.from_url(redis_url)
-    with Connection(conn):
-        worker = Worker(map(Queue, listen))
-        worker.work()
+    ap = argparse.ArgumentParser(description="Background job workers")
+    ap.add_argument("--processes", type=int, default=int(os.getenv("WORKER_PROCESSES", "0")) or os.cpu_count() or 1)
+    ap.add_argument("--burst", action="store_true", help="exit once the queues are empty")
+    args = ap.parse_args()
+
+    for name in PRELOAD:
+        importlib.import_module(name.strip())
+    conn = get_redis()
+    if args.processes <= 1:
+        FairWorker(STATIC_QUEUES, connection=conn).work(burst=args.burst, with_scheduler=True)
+        return
+    pool = WorkerPool(STATIC_QUEUES, connection=conn, num_workers=args.processes, worker_class=FairWorker)
+    pool.start(burst=args.burst)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,129 @@
+from __future__ import annotations
+import json, random
+from datetime import date
+from typing import Iterator
+import pandas as pd
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+from app.models import EmissionFactor, Activity
+from app.services.gwp import GWP
+from app.services.ef_catalog import bump_catalog_version
+from app.tenancy.models import Org
+
+SCALES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+CATEGORIES = {
+    "Scope1": ["Fuel", "Refrigerant", "Process"],
+    "Scope2": ["Electricity", "Steam"],
+    "Scope3": ["Transport", "Materials", "Waste", "Travel"],
+}
+UNCERTAINTY_TYPES = ["normal", "lognormal", "uniform", "triangular"]
+KINDS = ("value", "gas", "formula")
+
+def ef_catalog_size(rows: int) -> int:
+    return max(30, min(3_000, rows // 50))
+
+def generate_efs(prefix: str, n: int, seed: int = 42) -> list[dict]:
+    # an even mix of direct-value, gas-breakdown and formula factors
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        kind = KINDS[i % 3]
+        scope = rnd.choice(list(CATEGORIES))
+        ef = {
+            "key": f"{prefix}_{kind}_{i:06d}",
+            "name": f"Synthetic {kind} factor {i}",
+            "unit": "tkm" if kind == "formula" else rnd.choice(["kWh", "kg", "L", "km"]),
+            "value": None,
+            "scope": scope,
+            "category": rnd.choice(CATEGORIES[scope]),
+            "tags": ["bench", kind],
+            "region": rnd.choice(["TH", "GLO", "EU"]),
+            "gwp_version": rnd.choice(list(GWP)),
+            "uncertainty_value": None if rnd.random() < 0.2 else round(rnd.uniform(0.02, 0.3), 3),
+            "uncertainty_type": rnd.choice(UNCERTAINTY_TYPES),
+            "gas_breakdown": {},
+            "meta": {"source": "bench", "reference": "synthetic", "seed": seed},
+            "valid_from": date(2020, 1, 1),
+        }
+        if kind == "value":
+            ef["value"] = round(rnd.uniform(0.01, 5.0), 5)
+            ef["activity_id_fields"] = {"required": ["amount"], "quantity_field": "amount",
+                                        "fields": {"amount": {"type": "number", "unit": ef["unit"]}}}
+        elif kind == "gas":
+            ef["gas_breakdown"] = {"gases": {"CO2": round(rnd.uniform(0.1, 3.0), 5),
+                                             "CH4": round(rnd.uniform(0.0, 0.01), 6),
+                                             "N2O": round(rnd.uniform(0.0, 0.001), 7)}}
+            ef["activity_id_fields"] = {"required": ["amount"], "quantity_field": "amount",
+                                        "fields": {"amount": {"type": "number", "unit": ef["unit"]}}}
+        else:
+            ef["value"] = round(rnd.uniform(0.05, 0.3), 5)
+            ef["activity_id_fields"] = {
+                "required": ["distance_km", "payload_ton"],
+                "fields": {"distance_km": {"type": "number", "unit": "km"},
+                           "payload_ton": {"type": "number", "unit": "ton"},
+                           "load_factor": {"type": "number", "unit": "", "default": 1.0}},
+                "formula": {"output": "tkm", "expression": "distance_km * payload_ton * load_factor", "unit": "tkm"},
+                "quantity_field": "tkm",
+            }
+        out.append(ef)
+    return out
+
+def activity_inputs(rnd: random.Random, ef: dict) -> dict:
+    if ef["activity_id_fields"].get("formula"):
+        return {"distance_km": round(rnd.uniform(1, 800), 2), "payload_ton": round(rnd.uniform(0.1, 30), 2),
+                "load_factor": round(rnd.uniform(0.3, 1.0), 2)}
+    return {"amount": round(rnd.uniform(1, 10_000), 3)}
+
+def generate_activities(efs: list[dict], n: int, seed: int = 42) -> Iterator[dict]:
+    rnd = random.Random(seed + 1)
+    for i in range(n):
+        ef = efs[rnd.randrange(len(efs))]
+        yield {
+            "name": f"activity {i}",
+            "ef_key": ef["key"],
+            "inputs": activity_inputs(rnd, ef),
+            "scope": ef["scope"],
+            "period": f"2024-{rnd.randint(1, 12):02d}",
+        }
+
+def ef_import_frame(efs: list[dict]) -> pd.DataFrame:
+    # the CSV shape accepted by POST /api/efs/import
+    return pd.DataFrame([{
+        **{k: ef[k] for k in ("key", "name", "unit", "value", "scope", "category")},
+        "tags": ",".join(ef["tags"]),
+        "activity_id_fields": json.dumps(ef["activity_id_fields"]),
+        "gas_breakdown": json.dumps(ef["gas_breakdown"]),
+        "meta": json.dumps(ef["meta"]),
+    } for ef in efs])
+
+def load_dataset(db: Session, scale: str, seed: int = 42, chunk: int = 10_000) -> tuple[int, list[int]]:
+    # reuses an existing bench-<scale> org when its activity count already matches
+    n = SCALES[scale]
+    slug = f"bench-{scale}"
+    org = db.query(Org).filter(Org.slug == slug).one_or_none()
+    if not org:
+        org = Org(slug=slug, name=f"Benchmark {scale}")
+        db.add(org)
+        db.commit()
+        db.refresh(org)
+
+    have = db.scalar(select(func.count()).select_from(Activity).where(Activity.org_id == org.id))
+    if have != n:
+        db.query(Activity).filter(Activity.org_id == org.id).delete()
+        db.query(EmissionFactor).filter(EmissionFactor.org_id == org.id).delete()
+        efs = generate_efs(f"bench_{scale}", ef_catalog_size(n), seed)
+        db.execute(insert(EmissionFactor), [{**ef, "org_id": org.id} for ef in efs])
+        batch = []
+        for a in generate_activities(efs, n, seed):
+            batch.append({**a, "org_id": org.id})
+            if len(batch) >= chunk:
+                db.execute(insert(Activity), batch)
+                batch = []
+        if batch:
+            db.execute(insert(Activity), batch)
+        bump_catalog_version(db, org.id)
+        db.commit()
+
+    ids = list(db.scalars(select(Activity.id).where(Activity.org_id == org.id).order_by(Activity.id)))
+    return org.id, ids
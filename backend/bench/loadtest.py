@@ -0,0 +1,239 @@
+from __future__ import annotations
+import argparse, http.client, json, math, random, sys, threading, time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+# Multi-tenant HTTP load test against a running API (uvicorn app.main:app).
+# The API rate limit is per org and per user, and every tenant here is driven by
+# the same user, so start the target with high RATE_LIMIT_USER_PER_MINUTE and
+# RATE_LIMIT_ORG_PER_MINUTE or most requests will come back 429.
+
+DEFAULT_MIX = "ef_search=30,activity_create=15,activity_list=10,calc_run=15,audit=10,report_pdf=10,report_xlsx=10"
+SEARCH_TERMS = ["elec", "diesel", "truck", "load", "gas", "fuel", "km", ""]
+
+class Client:
+    def __init__(self, base_url: str, token: str | None = None):
+        u = urlsplit(base_url)
+        self.host, self.port = u.hostname, u.port or 80
+        self.token = token
+        self.local = threading.local()
+
+    def _conn(self) -> http.client.HTTPConnection:
+        c = getattr(self.local, "conn", None)
+        if c is None:
+            c = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        return c
+
+    def request(self, method: str, path: str, org: str | None = None, body: dict | None = None) -> tuple[int, bytes]:
+        headers = {}
+        if org:
+            headers["X-Org-Slug"] = org
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        for attempt in (0, 1):
+            try:
+                c = self._conn()
+                c.request(method, path, body=data, headers=headers)
+                r = c.getresponse()
+                return r.status, r.read()
+            except (http.client.HTTPException, OSError):
+                # stale keep-alive connection: reconnect once
+                self.local.conn.close()
+                self.local.conn = None
+                if attempt:
+                    raise
+        raise RuntimeError("unreachable")
+
+class Tenant:
+    def __init__(self, slug: str):
+        self.slug = slug
+        self.ef_keys: list[str] = []
+        self.activity_ids: list[int] = []
+        self.run_ids: list[int] = []
+        self.lock = threading.Lock()
+
+def provision_orgs(n: int) -> list[str]:
+    from app.db import SessionLocal
+    from app.tenancy.models import Org
+
+    slugs = [f"load-{i:03d}" for i in range(n)]
+    db = SessionLocal()
+    try:
+        have = {o.slug for o in db.query(Org).filter(Org.slug.in_(slugs))}
+        for s in slugs:
+            if s not in have:
+                db.add(Org(slug=s, name=f"Load tenant {s}"))
+        db.commit()
+    finally:
+        db.close()
+    return slugs
+
+def seed_tenant(client: Client, t: Tenant, n_efs: int, n_activities: int, rnd: random.Random):
+    for i in range(n_efs):
+        key = f"{t.slug.replace('-', '_')}_ef_{i:03d}"
+        st, body = client.request("POST", "/api/efs", t.slug, {
+            "key": key, "name": f"Load EF {i}", "unit": "kWh", "value": round(rnd.uniform(0.1, 2.0), 4),
+            "scope": "Scope2", "category": "Electricity", "tags": ["load"],
+            "activity_id_fields": {"required": ["amount"], "quantity_field": "amount"},
+            "meta": {"reference": "loadtest"},
+        })
+        if st != 200:
+            raise RuntimeError(f"seeding EF for {t.slug} failed: {st} {body[:200]!r}")
+        t.ef_keys.append(key)
+    for _ in range(n_activities):
+        create_activity(client, t, rnd)
+    st, body = client.request("POST", "/api/calc/run", t.slug, {"run_type": "CFO", "activity_ids": t.activity_ids})
+    if st != 200:
+        raise RuntimeError(f"seeding run for {t.slug} failed: {st} {body[:200]!r}")
+    t.run_ids.append(json.loads(body)["run_id"])
+
+def create_activity(client: Client, t: Tenant, rnd: random.Random) -> int:
+    st, body = client.request("POST", "/api/activities", t.slug, {
+        "name": "load activity", "ef_key": rnd.choice(t.ef_keys), "scope": "Scope2",
+        "inputs": {"amount": round(rnd.uniform(1, 5000), 2)}, "period": f"2024-{rnd.randint(1, 12):02d}",
+    })
+    if st == 200:
+        with t.lock:
+            t.activity_ids.append(json.loads(body)["id"])
+    return st
+
+def op_ef_search(c, t, rnd, args):
+    return c.request("GET", "/api/efs?" + urlencode({"q": rnd.choice(SEARCH_TERMS), "limit": 50}), t.slug)[0]
+
+def op_activity_create(c, t, rnd, args):
+    return create_activity(c, t, rnd)
+
+def op_activity_list(c, t, rnd, args):
+    return c.request("GET", "/api/activities", t.slug)[0]
+
+def op_calc_run(c, t, rnd, args):
+    with t.lock:
+        ids = rnd.sample(t.activity_ids, min(args.calc_size, len(t.activity_ids)))
+    st, body = c.request("POST", "/api/calc/run", t.slug, {"run_type": "CFO", "activity_ids": ids})
+    if st == 200:
+        with t.lock:
+            t.run_ids.append(json.loads(body)["run_id"])
+    return st
+
+def op_audit(c, t, rnd, args):
+    return c.request("POST", f"/api/audit/run/{rnd.choice(t.run_ids)}", t.slug)[0]
+
+def op_report_pdf(c, t, rnd, args):
+    return c.request("GET", f"/api/reports/run/{rnd.choice(t.run_ids)}.pdf", t.slug)[0]
+
+def op_report_xlsx(c, t, rnd, args):
+    return c.request("GET", f"/api/reports/run/{rnd.choice(t.run_ids)}.xlsx", t.slug)[0]
+
+OPS = {
+    "ef_search": ("GET /api/efs", op_ef_search),
+    "activity_create": ("POST /api/activities", op_activity_create),
+    "activity_list": ("GET /api/activities", op_activity_list),
+    "calc_run": ("POST /api/calc/run", op_calc_run),
+    "audit": ("POST /api/audit/run/{run_id}", op_audit),
+    "report_pdf": ("GET /api/reports/run/{run_id}.pdf", op_report_pdf),
+    "report_xlsx": ("GET /api/reports/run/{run_id}.xlsx", op_report_xlsx),
+}
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, w = part.partition("=")
+        name = name.strip()
+        if name not in OPS:
+            raise SystemExit(f"unknown op in --mix: {name} (known: {', '.join(OPS)})")
+        mix[name] = float(w or 1)
+    return mix
+
+def percentile(sorted_vals: list[float], p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, max(0, math.ceil(p / 100.0 * len(sorted_vals)) - 1))]
+
+def summarize(samples: dict[str, list[tuple[float, int]]], elapsed: float) -> dict:
+    out = {}
+    for route, recs in sorted(samples.items()):
+        lat = sorted(l for l, _ in recs)
+        errors = sum(1 for _, st in recs if st >= 400)
+        out[route] = {
+            "requests": len(recs), "errors": errors, "rps": round(len(recs) / elapsed, 2),
+            "p50_ms": round(percentile(lat, 50) * 1000, 1), "p95_ms": round(percentile(lat, 95) * 1000, 1),
+            "p99_ms": round(percentile(lat, 99) * 1000, 1),
+        }
+    total = sum(len(r) for r in samples.values())
+    out["_total"] = {"requests": total, "rps": round(total / elapsed, 2), "seconds": round(elapsed, 2)}
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Multi-tenant HTTP load test")
+    ap.add_argument("--base-url", default="http://localhost:8000")
+    ap.add_argument("--username", default="admin")
+    ap.add_argument("--password", default="admin1234")
+    ap.add_argument("--tenants", type=int, default=5)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=60.0, help="seconds of traffic after setup")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="op=weight,... (ops: %s)" % ", ".join(OPS))
+    ap.add_argument("--efs-per-tenant", type=int, default=10)
+    ap.add_argument("--activities-per-tenant", type=int, default=50)
+    ap.add_argument("--calc-size", type=int, default=50, help="activities per calc run")
+    ap.add_argument("--no-provision", action="store_true", help="orgs load-000.. already exist")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    rnd = random.Random(args.seed)
+
+    anon = Client(args.base_url)
+    st, body = anon.request("POST", "/api/auth/login", body={"username": args.username, "password": args.password})
+    if st != 200:
+        raise SystemExit(f"login failed: {st} {body[:200]!r}")
+    client = Client(args.base_url, json.loads(body)["token"])
+
+    slugs = [f"load-{i:03d}" for i in range(args.tenants)] if args.no_provision else provision_orgs(args.tenants)
+    tenants = [Tenant(s) for s in slugs]
+    for t in tenants:
+        seed_tenant(client, t, args.efs_per_tenant, args.activities_per_tenant, rnd)
+    print(f"[load] {len(tenants)} tenants ready; running {args.duration:.0f}s at concurrency {args.concurrency}", file=sys.stderr)
+
+    samples: dict[str, list[tuple[float, int]]] = defaultdict(list)
+    samples_lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+
+    def worker(i: int):
+        wrnd = random.Random(args.seed * 1000 + i)
+        local = defaultdict(list)
+        while time.monotonic() < deadline:
+            t = wrnd.choice(tenants)
+            route, fn = OPS[wrnd.choices(names, weights)[0]]
+            start = time.perf_counter()
+            try:
+                status = fn(client, t, wrnd, args)
+            except Exception:
+                status = 599
+            local[route].append((time.perf_counter() - start, status))
+        with samples_lock:
+            for route, recs in local.items():
+                samples[route].extend(recs)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
+        list(ex.map(worker, range(args.concurrency)))
+    report = summarize(samples, time.monotonic() - started)
+
+    print(f"{'route':<36}{'req':>8}{'err':>6}{'rps':>9}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}")
+    for route, r in report.items():
+        if route != "_total":
+            print(f"{route:<36}{r['requests']:>8}{r['errors']:>6}{r['rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}")
+    print(f"total {report['_total']['requests']} requests, {report['_total']['rps']} req/s")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+from __future__ import annotations
+import argparse, json, os, random, sys, time, tracemalloc
+from typing import Callable
+import app.auth.models, app.history.models  # noqa: F401 -- every table is registered for create_all
+from app.db import Base, SessionLocal, engine
+from app.models import CalculationRun
+from app.services.audit_engine import audit_run
+from app.services.calc_service import compute_run
+from app.services.ef_service import import_ef_dataframe
+from app.services.formula_engine import eval_expression
+from app.services.run_trace import compact_details, store_details
+from app.services.tenant_partitions import ensure_hash_partitions
+from app.services.report_export import export_run_excel, export_run_pdf
+from bench.datagen import SCALES, ef_catalog_size, ef_import_frame, generate_efs, load_dataset
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+SCENARIOS = ["eval_expression", "compute_run", "audit_run", "import_efs", "export_run_excel", "export_run_pdf"]
+
+def measure(fn: Callable[[], int], memory: bool = True) -> dict:
+    # tracemalloc hooks every allocation and would skew the timing, so the peak
+    # comes from a second, separate pass over the same scenario
+    start = time.perf_counter()
+    rows = fn()
+    seconds = time.perf_counter() - start
+    out = {"rows": rows, "seconds": round(seconds, 4), "rows_per_sec": round(rows / seconds, 1) if seconds else None}
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        out["peak_mb"] = round(peak / 2**20, 2)
+    return out
+
+def run_scale(scale: str, scenarios: list[str], seed: int, memory: bool = True) -> dict:
+    db = SessionLocal()
+    results = {}
+    try:
+        org_id, ids = load_dataset(db, scale, seed)
+        n = len(ids)
+        state: dict = {}
+
+        def s_eval():
+            rnd = random.Random(seed)
+            expr = "distance_km * payload_ton * load_factor"
+            for _ in range(n):
+                eval_expression(expr, {"distance_km": rnd.uniform(1, 800), "payload_ton": rnd.uniform(0.1, 30), "load_factor": 0.8})
+            return n
+
+        def s_compute():
+            state["result"] = compute_run(db, ids, "CFO", org_id)
+            return n
+
+        def ensure_run() -> int:
+            if "run_id" not in state:
+                res = state.get("result") or compute_run(db, ids, "CFO", org_id)
+                r = CalculationRun(org_id=org_id, run_type="CFO", total_kgco2e=res["total_kgco2e"],
+                                   total_tco2e=res["total_tco2e"], ef_snapshot=res["ef_snapshot"])
+                db.add(r)
+                db.flush()
+                store_details(db, r, compact_details(res["details"]["rows"]))
+                state["run_id"] = r.id
+            return state["run_id"]
+
+        def s_audit():
+            audit_run(db, state["run_id"])
+            return n
+
+        def s_import():
+            efs = generate_efs(f"bench_import_{scale}", ef_catalog_size(n), seed + 7)
+            count = import_ef_dataframe(db, org_id, ef_import_frame(efs))
+            db.flush()
+            return count
+
+        def s_xlsx():
+            export_run_excel(db, state["run_id"])
+            return n
+
+        def s_pdf():
+            export_run_pdf(db, state["run_id"])
+            return n
+
+        fns = {"eval_expression": s_eval, "compute_run": s_compute, "audit_run": s_audit, "import_efs": s_import,
+               "export_run_excel": s_xlsx, "export_run_pdf": s_pdf}
+        for name in scenarios:
+            if name in ("audit_run", "export_run_excel", "export_run_pdf"):
+                ensure_run()
+            results[name] = measure(fns[name], memory)
+            print(f"[bench] {scale:>5} {name:<18} {json.dumps(results[name])}", file=sys.stderr)
+    finally:
+        # the run and imported EFs are scratch data; only the dataset itself is kept
+        db.rollback()
+        db.close()
+    return results
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for scale, scen in results.items():
+        for name, cur in scen.items():
+            base = (baseline.get(scale) or {}).get(name)
+            if not base:
+                continue
+            if base.get("rows_per_sec") and cur["rows_per_sec"] < base["rows_per_sec"] * (1 - tolerance):
+                regressions.append(f"{scale}/{name}: throughput {cur['rows_per_sec']} < baseline {base['rows_per_sec']}")
+            if base.get("peak_mb") and cur.get("peak_mb") and cur["peak_mb"] > base["peak_mb"] * (1 + tolerance):
+                regressions.append(f"{scale}/{name}: peak memory {cur['peak_mb']}MB > baseline {base['peak_mb']}MB")
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description="Carbon platform benchmarks (runs against DATABASE_URL)")
+    ap.add_argument("--scale", action="append", choices=list(SCALES), help="repeatable; default 1k")
+    ap.add_argument("--scenario", action="append", choices=SCENARIOS, help="repeatable; default all")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    ap.add_argument("--save-baseline", action="store_true", help="merge these results into the baseline file")
+    ap.add_argument("--out", default=None, help="write results JSON here")
+    ap.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass (timing only)")
+    args = ap.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        ensure_hash_partitions(conn)
+    results = {scale: run_scale(scale, args.scenario or SCENARIOS, args.seed, not args.no_memory) for scale in (args.scale or ["1k"])}
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if args.save_baseline:
+        for scale, scen in results.items():
+            baseline.setdefault(scale, {}).update(scen)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"[bench] baseline written to {args.baseline}", file=sys.stderr)
+        return
+    if not baseline:
+        print("[bench] no baseline to compare against (run with --save-baseline)", file=sys.stderr)
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    for r in regressions:
+        print(f"[bench] REGRESSION {r}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+import argparse, json, os, statistics, subprocess, sys
+
+# Cold-start cost of the process entry points: wall time and peak RSS of a fresh
+# interpreter importing each module, plus which heavy libraries came along.
+# Heavy libraries are loaded through app.lazy on first use; importing one of
+# LAZY at startup is reported as a regression regardless of the baseline.
+BASELINE = os.path.join(os.path.dirname(__file__), "startup_baseline.json")
+TARGETS = ["app.main", "app.worker", "app.jobs"]
+HEAVY = ("pandas", "numpy", "pyarrow", "reportlab", "openpyxl", "scipy", "redis", "rq")
+# not expected at import time of each target (the API needs redis for rate limiting)
+LAZY = {
+    "app.main": ("pandas", "numpy", "pyarrow", "reportlab", "openpyxl", "rq"),
+    "app.worker": ("pandas", "numpy", "pyarrow", "reportlab", "openpyxl"),
+    "app.jobs": HEAVY,
+}
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+ms = (time.perf_counter() - start) * 1000
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({{"ms": ms, "rss_mb": rss, "heavy": sorted(m for m in {heavy!r} if m in sys.modules)}}))
+"""
+
+def probe(module: str) -> dict:
+    out = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+                         capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(__file__)))
+    if out.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def measure(module: str, repeat: int) -> dict:
+    probe(module)  # warm the bytecode cache
+    runs = [probe(module) for _ in range(repeat)]
+    return {"import_ms": round(statistics.median(r["ms"] for r in runs), 1),
+            "rss_mb": round(statistics.median(r["rss_mb"] for r in runs), 1),
+            "heavy": runs[-1]["heavy"]}
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for module, cur in results.items():
+        eager = sorted(set(cur["heavy"]) & set(LAZY.get(module, ())))
+        if eager:
+            regressions.append(f"{module}: imports {', '.join(eager)} at startup")
+        base = baseline.get(module)
+        if not base:
+            continue
+        if base.get("import_ms") and cur["import_ms"] > base["import_ms"] * (1 + tolerance):
+            regressions.append(f"{module}: import {cur['import_ms']}ms > baseline {base['import_ms']}ms")
+        if base.get("rss_mb") and cur["rss_mb"] > base["rss_mb"] * (1 + tolerance):
+            regressions.append(f"{module}: RSS {cur['rss_mb']}MB > baseline {base['rss_mb']}MB")
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description="Cold-start import time and memory of the API / worker entry points")
+    ap.add_argument("--module", action="append", choices=TARGETS, help="repeatable; default all")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    ap.add_argument("--save-baseline", action="store_true", help="merge these results into the baseline file")
+    args = ap.parse_args()
+
+    results = {m: measure(m, args.repeat) for m in (args.module or TARGETS)}
+    print(json.dumps(results, indent=2))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"[bench] baseline written to {args.baseline}", file=sys.stderr)
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    for r in regressions:
+        print(f"[bench] REGRESSION {r}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Tests that need Postgres run against TEST_DATABASE_URL and are skipped without it;
+# each one works inside a transaction that is rolled back afterwards.
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+# Redis tests use TEST_REDIS_URL, which must name a scratch database: it is flushed.
+TEST_REDIS_URL = os.getenv("TEST_REDIS_URL")
+
+
+@pytest.fixture(scope="session")
+def pg_engine():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL not set")
+    from sqlalchemy import create_engine
+    import app.auth.models, app.history.models  # noqa: F401
+    from app.db import Base
+    from app.services.audit_store import ensure_partitions
+    from app.services.tenant_partitions import ensure_hash_partitions
+
+    engine = create_engine(TEST_DATABASE_URL)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        ensure_partitions(conn)
+        ensure_hash_partitions(conn)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def redis_conn(monkeypatch):
+    if not TEST_REDIS_URL:
+        pytest.skip("TEST_REDIS_URL not set")
+    import redis
+
+    monkeypatch.setenv("REDIS_URL", TEST_REDIS_URL)
+    monkeypatch.setattr("app.queues._pool", None)
+    conn = redis.Redis.from_url(TEST_REDIS_URL)
+    conn.flushdb()
+    yield conn
+    conn.flushdb()
+
+
+@pytest.fixture
+def pg_session(pg_engine):
+    from sqlalchemy.orm import Session
+
+    conn = pg_engine.connect()
+    tx = conn.begin()
+    db = Session(bind=conn, join_transaction_mode="create_savepoint")
+    try:
+        yield db
+    finally:
+        db.close()
+        tx.rollback()
+        conn.close()
+
+
+@pytest.fixture
+def org(pg_session):
+    from app.tenancy.models import Org
+
+    o = Org(slug="test-org", name="Test org")
+    pg_session.add(o)
+    pg_session.flush()
+    return o
+
+
+def add_ef(db, org_id, key, value=1.0, **kw):
+    from app.models import EmissionFactor
+
+    ef = EmissionFactor(org_id=org_id, key=key, name=key, unit=kw.pop("unit", "kWh"), value=value,
+                        activity_id_fields=kw.pop("activity_id_fields", {"quantity_field": "qty"}), **kw)
+    db.add(ef)
+    db.flush()
+    return ef
+
+
+def add_activities(db, org_id, ef_key, quantities, **kw):
+    from app.models import Activity
+
+    rows = [Activity(org_id=org_id, name=f"{ef_key} #{i}", ef_key=ef_key, inputs={"qty": q}, **kw)
+            for i, q in enumerate(quantities)]
+    db.add_all(rows)
+    db.flush()
+    return rows
+
+
+def add_run(db, org_id, activity_ids, run_type="CFO", chunk_rows=None):
+    # the same steps as POST /api/calc/run
+    from app.models import CalculationRun
+    from app.services.calc_service import compute_run
+    from app.services.emissions_cube import refresh_run
+    from app.services.run_trace import compact_details, store_details
+
+    result = compute_run(db, activity_ids, run_type, org_id)
+    run = CalculationRun(org_id=org_id, run_type=run_type, total_kgco2e=result["total_kgco2e"],
+                         total_tco2e=result["total_tco2e"], ef_snapshot=result["ef_snapshot"])
+    db.add(run)
+    db.flush()
+    store_details(db, run, compact_details(result["details"]["rows"]), chunk_rows=chunk_rows)
+    refresh_run(db, run.id)
+    db.flush()
+    return run
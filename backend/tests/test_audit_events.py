@@ -0,0 +1,42 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.services import audit_events
+from app.services.audit_events import _in_write_transaction, emit_event
+
+
+def _session():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+    return Session(engine)
+
+
+def test_reads_do_not_open_a_write_transaction():
+    with _session() as db:
+        db.execute(text("SELECT count(*) FROM t"))
+        assert not _in_write_transaction(db)
+
+
+def test_core_write_is_detected_until_commit():
+    with _session() as db:
+        db.execute(text("INSERT INTO t (x) VALUES (1)"))
+        assert _in_write_transaction(db)
+        db.commit()
+        assert not _in_write_transaction(db)
+        db.execute(text("UPDATE t SET x = 2"))
+        assert _in_write_transaction(db)
+        db.rollback()
+        assert not _in_write_transaction(db)
+
+
+def test_in_tx_overrides_detection(monkeypatch):
+    submitted = []
+    monkeypatch.setattr(audit_events.writer, "submit", submitted.append)
+    with _session() as db:
+        emit_event(db, 1, "alice", "X", {}, in_tx=True)
+        assert len(db.new) == 1 and not submitted
+        db.expunge_all()
+        db.execute(text("INSERT INTO t (x) VALUES (1)"))
+        emit_event(db, 1, "alice", "Y", {}, in_tx=False)
+        assert not db.new and submitted[0]["action"] == "Y"
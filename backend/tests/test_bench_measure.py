@@ -0,0 +1,28 @@
+from bench.run import compare, measure
+
+
+def test_measure_times_and_traces_in_separate_passes():
+    calls = []
+
+    def fn():
+        calls.append(1)
+        _ = [0] * 100_000
+        return 10
+
+    out = measure(fn)
+    assert len(calls) == 2
+    assert out["rows"] == 10 and out["rows_per_sec"] > 0
+    assert out["peak_mb"] > 0
+
+
+def test_measure_without_memory_runs_once():
+    calls = []
+    out = measure(lambda: calls.append(1) or 5, memory=False)
+    assert len(calls) == 1 and "peak_mb" not in out
+
+
+def test_compare_flags_regressions_only_beyond_tolerance():
+    baseline = {"1k": {"a": {"rows_per_sec": 100.0, "peak_mb": 10.0}}}
+    assert compare({"1k": {"a": {"rows_per_sec": 85.0, "peak_mb": 11.0}}}, baseline, 0.2) == []
+    assert len(compare({"1k": {"a": {"rows_per_sec": 70.0, "peak_mb": 13.0}}}, baseline, 0.2)) == 2
+    assert compare({"1k": {"a": {"rows_per_sec": 100.0}}}, baseline, 0.2) == []
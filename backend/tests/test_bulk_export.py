@@ -0,0 +1,74 @@
+import io
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from app.services.bulk_export import _to_batch, check_filters, iter_encoded, iter_record_batches, schema_for, stream_dataset
+from conftest import add_activities, add_ef, add_run
+
+SCHEMA = schema_for("efs", ["key", "value", "tags"])
+ROWS = [("grid", 0.4, ["power"]), ("diesel", 2.7, None), ("gas", None, [])]
+
+
+def _batches(rows, size=2):
+    return (_to_batch(rows[i:i + size], SCHEMA) for i in range(0, len(rows), size))
+
+
+def test_schema_follows_the_projection():
+    assert SCHEMA.names == ["key", "value", "tags"]
+    assert SCHEMA.field("tags").type == pa.list_(pa.string())
+    with pytest.raises(ValueError, match="Unknown dataset"):
+        schema_for("users")
+    with pytest.raises(ValueError, match="Unknown columns for efs: nope"):
+        schema_for("efs", ["key", "nope"])
+
+
+def test_arrow_stream_round_trip():
+    body = b"".join(iter_encoded(_batches(ROWS), SCHEMA, "arrow"))
+    table = pa.ipc.open_stream(body).read_all()
+    assert table.schema == SCHEMA and [tuple(r.values()) for r in table.to_pylist()] == ROWS
+
+
+def test_parquet_round_trip():
+    body = b"".join(iter_encoded(_batches(ROWS), SCHEMA, "parquet"))
+    table = pq.read_table(io.BytesIO(body))
+    assert table.column_names == SCHEMA.names and [tuple(r.values()) for r in table.to_pylist()] == ROWS
+
+
+def test_empty_result_is_still_a_valid_file():
+    body = b"".join(iter_encoded(iter([_to_batch([], SCHEMA)]), SCHEMA, "arrow"))
+    assert pa.ipc.open_stream(body).read_all().num_rows == 0
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError, match="Unknown format"):
+        list(iter_encoded(_batches(ROWS), SCHEMA, "csv"))
+
+
+def test_filters_a_dataset_lacks_are_rejected():
+    check_filters("run_rows", {"run_ids": [1], "category": "Energy", "period_from": "2024-01"})
+    check_filters("efs", {"category": "Energy", "run_ids": None, "period": ""})
+    with pytest.raises(ValueError, match="Filters not supported for activities: run_id"):
+        check_filters("activities", {"run_ids": [1], "category": "Energy"})
+    with pytest.raises(ValueError, match="Filters not supported for efs: run_id, period_to"):
+        stream_dataset("efs", 1, "arrow", filters={"run_ids": [1], "period_to": "2024-12"})
+
+
+def _read(conn, dataset, org_id, columns, **filters):
+    schema = schema_for(dataset, columns)
+    return [r for b in iter_record_batches(conn, dataset, org_id, schema, filters) for r in b.to_pylist()]
+
+
+def test_category_filters_through_the_ef(pg_session, org):
+    add_ef(pg_session, org.id, "grid", 1.0, category="Electricity")
+    add_ef(pg_session, org.id, "diesel", 3.0, category="Fuel")
+    grid = add_activities(pg_session, org.id, "grid", [1, 2])
+    diesel = add_activities(pg_session, org.id, "diesel", [4])
+    run = add_run(pg_session, org.id, [a.id for a in grid + diesel])
+    conn = pg_session.connection()
+
+    assert _read(conn, "activities", org.id, ["id"], category="Fuel") == [{"id": diesel[0].id}]
+    assert _read(conn, "efs", org.id, ["key"], category="Electricity") == [{"key": "grid"}]
+    assert _read(conn, "run_rows", org.id, ["activity_id", "kgco2e"], run_ids=[run.id], category="Electricity") == [
+        {"activity_id": grid[0].id, "kgco2e": 1.0}, {"activity_id": grid[1].id, "kgco2e": 2.0}]
@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+from app.services.calc_cache import run_fingerprint
+
+
+class Catalog:
+    def __init__(self, hashes):
+        self.hashes = hashes
+
+    def get(self, key):
+        h = self.hashes.get(key)
+        return SimpleNamespace(payload_hash=h) if h else None
+
+
+def _act(i, ef_key="grid", qty=10, **kw):
+    attrs = {"scope": "Scope2", "period": "2024-01", "site": None, **kw}
+    return SimpleNamespace(id=i, name=f"a{i}", ef_key=ef_key, inputs={"qty": qty, "unit": "kWh"}, **attrs)
+
+
+CAT = Catalog({"grid": "h1", "diesel": "h2"})
+ACTS = [_act(1), _act(2, "diesel", 3)]
+
+
+def test_stable_for_identical_inputs():
+    again = [_act(1), _act(2, "diesel", 3)]
+    again[0].inputs = {"unit": "kWh", "qty": 10}
+    assert run_fingerprint(1, "CFO", ACTS, CAT) == run_fingerprint(1, "CFO", again, CAT)
+
+
+def test_every_input_changes_it():
+    base = run_fingerprint(1, "CFO", ACTS, CAT)
+    variants = [
+        run_fingerprint(2, "CFO", ACTS, CAT),
+        run_fingerprint(1, "CFP", ACTS, CAT),
+        run_fingerprint(1, "CFO", ACTS[::-1], CAT),
+        run_fingerprint(1, "CFO", [_act(1, qty=11), ACTS[1]], CAT),
+        run_fingerprint(1, "CFO", [_act(1, scope="Scope3"), ACTS[1]], CAT),
+        run_fingerprint(1, "CFO", [_act(1, period="2024-02"), ACTS[1]], CAT),
+        run_fingerprint(1, "CFO", [_act(1, site="plant-a"), ACTS[1]], CAT),
+        run_fingerprint(1, "CFO", ACTS, Catalog({"grid": "h1", "diesel": "h3"})),
+    ]
+    assert base not in variants and len(set(variants)) == len(variants)
+
+
+def test_unknown_ef_disables_caching():
+    assert run_fingerprint(1, "CFO", [_act(1, "missing")], CAT) is None
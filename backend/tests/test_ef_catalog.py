@@ -0,0 +1,30 @@
+from conftest import add_ef
+from app.models import EmissionFactor
+from app.services import ef_catalog
+from app.services.ef_catalog import get_catalog
+
+
+def test_uncommitted_ef_writes_are_not_cached(pg_session, org):
+    add_ef(pg_session, org.id, "grid", 0.5)
+    pg_session.commit()
+    committed = get_catalog(pg_session, org.id)
+    assert ef_catalog._catalogs[org.id] is committed
+
+    add_ef(pg_session, org.id, "solar", 0.05)
+    own = get_catalog(pg_session, org.id)
+    assert own.get("solar") is not None
+    assert ef_catalog._catalogs[org.id] is committed
+
+    pg_session.rollback()
+    after = get_catalog(pg_session, org.id)
+    assert after.get("solar") is None and after.version == committed.version
+
+
+def test_pending_ef_objects_bypass_the_cache(pg_session, org):
+    add_ef(pg_session, org.id, "grid", 0.5)
+    pg_session.commit()
+    cached = get_catalog(pg_session, org.id)
+    ef = pg_session.get(EmissionFactor, (org.id, "grid"))
+    ef.value = 0.7
+    assert get_catalog(pg_session, org.id) is not cached
+    assert get_catalog(pg_session, org.id).get("grid").value == 0.7
@@ -0,0 +1,36 @@
+import pandas as pd
+from sqlalchemy import event
+
+from app.models import EmissionFactor
+from app.services.ef_catalog import catalog_version
+from app.services.ef_service import import_ef_dataframe
+
+
+def _frame(n, value=1.0):
+    return pd.DataFrame({
+        "Key": [f" ef.{i} " for i in range(n)], "name": [f"EF {i}" for i in range(n)], "unit": "kWh",
+        "scope": "Scope2", "category": "Electricity", "value": value, "tags": "grid, th",
+    })
+
+
+def test_import_upserts_in_batches(pg_session, org):
+    statements = []
+    listener = lambda *a: statements.append(a[2])
+    event.listen(pg_session.connection(), "before_cursor_execute", listener)
+    try:
+        assert import_ef_dataframe(pg_session, org.id, _frame(2500)) == 2500
+    finally:
+        event.remove(pg_session.connection(), "before_cursor_execute", listener)
+    inserts = [s for s in statements if s.lstrip().upper().startswith("INSERT INTO EMISSION_FACTORS")]
+    assert len(inserts) == 3
+    ef = pg_session.get(EmissionFactor, (org.id, "ef.7"))
+    assert ef.value == 1.0 and ef.tags == ["grid", "th"]
+
+
+def test_reimport_updates_and_bumps_catalog(pg_session, org):
+    import_ef_dataframe(pg_session, org.id, _frame(3))
+    before = catalog_version(pg_session, org.id)
+    assert import_ef_dataframe(pg_session, org.id, _frame(3, value=2.5)) == 3
+    assert catalog_version(pg_session, org.id) == before + 1
+    pg_session.expire_all()
+    assert pg_session.get(EmissionFactor, (org.id, "ef.0")).value == 2.5
@@ -0,0 +1,67 @@
+from app.models import CalculationRun
+from app.services.emissions_cube import query_cube, refresh_run, set_run_status
+from conftest import add_activities, add_ef, add_run
+
+
+def _cells(db, org_id, dims, **kw):
+    return [tuple(c[d] for d in dims) + (c["kgco2e"],) for c in query_cube(db, org_id, dims, status=None, **kw)["cells"]]
+
+
+def test_latest_run_is_picked_per_run_type_and_period(pg_session, org):
+    add_ef(pg_session, org.id, "grid", 2.0)
+    jan = add_activities(pg_session, org.id, "grid", [10], period="2024-01")
+    feb = add_activities(pg_session, org.id, "grid", [5], period="2024-02")
+    ids = [a.id for a in jan + feb]
+    add_run(pg_session, org.id, ids, run_type="CFO")
+    jan[0].inputs = {"qty": 20}
+    pg_session.flush()
+    add_run(pg_session, org.id, ids, run_type="CFO")
+    add_run(pg_session, org.id, [jan[0].id], run_type="CFP")
+
+    assert _cells(pg_session, org.id, ["run_type", "period"]) == [
+        ("CFO", "2024-01", 40.0), ("CFO", "2024-02", 10.0), ("CFP", "2024-01", 40.0)]
+    assert _cells(pg_session, org.id, ["period"], run_type="CFO") == [("2024-01", 40.0), ("2024-02", 10.0)]
+
+
+def test_running_cells_are_never_the_latest(pg_session, org):
+    add_ef(pg_session, org.id, "grid", 1.0)
+    acts = add_activities(pg_session, org.id, "grid", [3], period="2024-01")
+    done = add_run(pg_session, org.id, [acts[0].id])
+    running = add_run(pg_session, org.id, [acts[0].id])
+    set_run_status(pg_session, running.id, "RUNNING")
+
+    assert _cells(pg_session, org.id, ["run_id"]) == [(done.id, 3.0)]
+
+
+def test_cells_keep_the_activity_as_it_was_computed(pg_session, org):
+    add_ef(pg_session, org.id, "grid", 1.0)
+    acts = add_activities(pg_session, org.id, "grid", [4], period="2024-01", scope="Scope2", site="plant-a")
+    run = add_run(pg_session, org.id, [acts[0].id], chunk_rows=1)
+    acts[0].period, acts[0].scope, acts[0].site = "2025-06", "Scope3", "plant-b"
+    pg_session.flush()
+    refresh_run(pg_session, run.id)
+
+    assert _cells(pg_session, org.id, ["period", "scope", "site"]) == [("2024-01", "Scope2", "plant-a", 4.0)]
+
+
+def test_site_dimension_and_filter(pg_session, org):
+    add_ef(pg_session, org.id, "grid", 1.0)
+    a = add_activities(pg_session, org.id, "grid", [1, 2], period="2024-01", site="plant-a")
+    b = add_activities(pg_session, org.id, "grid", [4], period="2024-01", site="plant-b")
+    c = add_activities(pg_session, org.id, "grid", [8], period="2024-01")
+    add_run(pg_session, org.id, [x.id for x in a + b + c])
+
+    assert _cells(pg_session, org.id, ["site"]) == [("", 8.0), ("plant-a", 3.0), ("plant-b", 4.0)]
+    assert _cells(pg_session, org.id, ["scope"], site="plant-b") == [("Scope3", 4.0)]
+
+
+def test_rows_stored_before_the_snapshot_fall_back_to_the_activity(pg_session, org):
+    add_ef(pg_session, org.id, "grid", 1.0)
+    acts = add_activities(pg_session, org.id, "grid", [6], period="2024-03", site="plant-a")
+    run = CalculationRun(org_id=org.id, run_type="CFO", total_kgco2e=6.0, total_tco2e=0.006, ef_snapshot={},
+                         details={"rows": [{"activity_id": acts[0].id, "ef_key": "grid", "kgco2e": 6.0}]})
+    pg_session.add(run)
+    pg_session.flush()
+    refresh_run(pg_session, run.id)
+
+    assert _cells(pg_session, org.id, ["period", "site"]) == [("2024-03", "plant-a", 6.0)]
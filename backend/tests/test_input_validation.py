@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+from app.services.input_validation import InputValidator, normalize_unit, validate_activities
+
+
+def _v(spec, unit=None):
+    return InputValidator("ef", spec, unit)
+
+
+def test_required_and_numeric_inputs():
+    v = _v({"required": ["qty"], "fields": {"qty": {"type": "number"}, "note": {"type": "string"}}})
+    assert v.validate_batch([{"qty": 3}, {"qty": "3.5"}, {}, {"qty": "lots"}, None]) == [
+        [], [],
+        ["Missing required input 'qty' for EF=ef"],
+        ["Input 'qty' is not a number for EF=ef"],
+        ["Missing required input 'qty' for EF=ef"],
+    ]
+
+
+def test_quantity_source_follows_compute_precedence():
+    v = _v({"quantity_field": "kwh"})
+    assert v.validate_batch([{"kwh": 1}, {"kwh": "x"}, {"amount": 2}, {"amount": "x"}, {}]) == [
+        [], ["Input 'kwh' is not a number for EF=ef"], [],
+        ["Input 'amount' is not a number for EF=ef"], ["No quantity derivation possible"],
+    ]
+
+
+def test_formula_inputs():
+    v = _v({"formula": {"expression": "distance * weight"}})
+    assert v.validate_batch([{"distance": 2, "weight": "3"}, {"distance": 2}, {"distance": "far", "weight": 1}]) == [
+        [], ["Formula input 'weight' missing for EF=ef"], ["Input 'distance' is not a number for EF=ef"],
+    ]
+    broken = _v({"formula": {"expression": "distance *"}})
+    assert broken.errors({"distance": 1})[0].startswith("Invalid formula for EF=ef")
+
+
+def test_compatible_unit_spellings_are_accepted():
+    v = _v({"quantity_field": "qty", "fields": {"mass": {"unit": "t"}}}, unit="kWh")
+    ok = [{"qty": 1, "unit": u} for u in ("kWh", "kwh", " KWH ", "kilowatt hours")] + [{"qty": 1, "mass_unit": u} for u in ("t", "tonne", "Tonnes", "metric ton")]
+    assert v.validate_batch(ok) == [[]] * len(ok)
+    assert v.validate_batch([{"qty": 1, "unit": "MWh"}, {"qty": 1, "mass_unit": "kg"}]) == [
+        ["Input 'unit' must be kWh for EF=ef"], ["Input 'mass_unit' must be t for EF=ef"],
+    ]
+
+
+def test_normalize_unit():
+    assert normalize_unit(" Litres ") == normalize_unit("L") == "l"
+    assert normalize_unit("m³") == normalize_unit("cubic metre") == "m3"
+    assert normalize_unit("MWh") != normalize_unit("kWh")
+
+
+def test_validate_activities_groups_by_ef():
+    catalog = {"grid": SimpleNamespace(validator=InputValidator("grid", {"required": ["qty"]}))}
+    assert validate_activities(catalog, [("grid", {"qty": 1}), ("gas", {}), ("grid", {})]) == [
+        [], ["EF not found: gas"], ["Missing required input 'qty' for EF=grid"],
+    ]
@@ -0,0 +1,100 @@
+import pytest
+
+from app.models import CalcRunShard, CalculationRun, EmissionsCubeCell
+from app.services import partitioned_runs
+from app.services.ef_catalog import get_catalog
+from app.services.partitioned_runs import compute_shard, reduce_run, retry_failed_shards, shard_ids, start_run
+from app.services.run_trace import iter_run_rows
+from conftest import add_activities, add_ef
+
+
+def test_shard_ids_keep_order_and_cover_every_id():
+    assert shard_ids([1, 2, 3, 4, 5], 2) == [[1, 2], [3, 4], [5]]
+    assert shard_ids([1, 2], 0) == [[1], [2]]
+    assert shard_ids([], 3) == []
+
+
+@pytest.fixture
+def reduces(monkeypatch):
+    calls = []
+    monkeypatch.setattr(partitioned_runs, "enqueue_reduce", lambda org_id, run_id: calls.append(run_id))
+    return calls
+
+
+def _start(db, org_id, quantities, size, snapshot=None):
+    add_ef(db, org_id, "grid", 2.0)
+    acts = add_activities(db, org_id, "grid", quantities, period="2024-01")
+    ids = [a.id for a in acts]
+    if snapshot is None:
+        snapshot = {"grid": get_catalog(db, org_id).get("grid").payload_hash}
+    return start_run(db, org_id, "CFO", ids, snapshot, fingerprint="fp-1", actor="tester", shard_size=size), ids
+
+
+def _shards(db, run):
+    return db.query(CalcRunShard).filter(CalcRunShard.run_id == run.id).order_by(CalcRunShard.shard).all()
+
+
+def test_start_run_assigns_shard_positions(pg_session, org):
+    run, ids = _start(pg_session, org.id, [1, 2, 3, 4, 5], 2)
+    assert run.status == "RUNNING" and run.details["partitioned"]["shards"] == 3
+    assert [(s.shard, s.first_row, s.activity_ids, s.status) for s in _shards(pg_session, run)] == [
+        (0, 0, ids[:2], "PENDING"), (1, 2, ids[2:4], "PENDING"), (2, 4, ids[4:], "PENDING")]
+
+
+def test_only_the_last_shard_enqueues_the_reduce(pg_session, org, reduces):
+    run, _ = _start(pg_session, org.id, [1, 2, 3, 4, 5], 2)
+    for shard in (2, 0):
+        compute_shard(pg_session, org.id, run.id, shard)
+        assert reduces == []
+    compute_shard(pg_session, org.id, run.id, 1)
+    assert reduces == [run.id]
+    # a redelivered shard job does nothing
+    assert compute_shard(pg_session, org.id, run.id, 1)["skipped"] and reduces == [run.id]
+
+
+def test_reduce_merges_the_shards(pg_session, org, reduces):
+    run, ids = _start(pg_session, org.id, [1, 2, 3, 4, 5], 2)
+    for shard in (1, 2, 0):
+        compute_shard(pg_session, org.id, run.id, shard)
+    cells = pg_session.query(EmissionsCubeCell).filter(EmissionsCubeCell.run_id == run.id)
+    assert {c.review_status for c in cells} == {"RUNNING"}
+
+    assert reduce_run(pg_session, org.id, run.id)["shards"] == 3
+    pg_session.refresh(run)
+    assert run.status == "DONE" and run.total_kgco2e == 30.0 and run.total_tco2e == 0.03
+    assert run.details["row_count"] == 5 and [c["first_row"] for c in run.details["chunks"]] == [0, 2, 4]
+    assert [r["activity_id"] for r in iter_run_rows(pg_session, run)] == ids
+    assert _shards(pg_session, run) == []
+    # one set of cells per shard, summed by queries
+    assert {c.review_status for c in cells} == {"DRAFT"}
+    assert (sum(c.kgco2e for c in cells), sum(c.row_count for c in cells)) == (30.0, 5)
+    assert reduce_run(pg_session, org.id, run.id)["skipped"]
+
+
+def test_reduce_waits_for_every_shard(pg_session, org, reduces):
+    run, _ = _start(pg_session, org.id, [1, 2, 3], 2)
+    compute_shard(pg_session, org.id, run.id, 0)
+    assert reduce_run(pg_session, org.id, run.id)["skipped"]
+    assert pg_session.get(CalculationRun, (org.id, run.id)).status == "RUNNING"
+
+
+def test_shard_fails_the_run_after_its_retries(pg_session, org, reduces, monkeypatch):
+    monkeypatch.setattr(partitioned_runs, "SHARD_RETRIES", 1)
+    run, _ = _start(pg_session, org.id, [1, 2, 3], 2, snapshot={"grid": "stale"})
+    # the shard job's rollback must not take the run with it, as in a worker
+    pg_session.commit()
+    with pytest.raises(ValueError, match="EF changed"):
+        compute_shard(pg_session, org.id, run.id, 0)
+    assert [(s.status, s.attempts) for s in _shards(pg_session, run)][0] == ("PENDING", 1)
+    assert pg_session.get(CalculationRun, (org.id, run.id)).status == "RUNNING"
+    with pytest.raises(ValueError):
+        compute_shard(pg_session, org.id, run.id, 0)
+    assert [(s.status, s.attempts) for s in _shards(pg_session, run)][0] == ("FAILED", 2)
+    assert pg_session.get(CalculationRun, (org.id, run.id)).status == "FAILED"
+    # other shards of a failed run are skipped
+    assert compute_shard(pg_session, org.id, run.id, 1)["skipped"]
+
+    assert retry_failed_shards(pg_session, org.id, run.id) == [0, 1]
+    assert [(s.status, s.attempts) for s in _shards(pg_session, run)] == [("PENDING", 0), ("PENDING", 0)]
+    assert pg_session.get(CalculationRun, (org.id, run.id)).status == "RUNNING"
+    assert reduces == []
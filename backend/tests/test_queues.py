@@ -0,0 +1,46 @@
+import pytest
+from rq import Queue
+
+from app.queues import enqueue, org_queue_names, queue_name
+from app.worker import FairWorker
+
+
+def test_queue_name():
+    assert queue_name("bulk", 7) == "bulk.7"
+    with pytest.raises(ValueError):
+        queue_name("urgent", 7)
+
+
+def _names(w):
+    return [q.name for q in w.queues]
+
+
+def test_fair_order(redis_conn):
+    for org_id in (2, 1):
+        enqueue(print, "x", org_id=org_id, priority="interactive")
+    for org_id in (3, 1, 2):
+        enqueue(print, "x", org_id=org_id, priority="bulk")
+    assert org_queue_names(redis_conn, "bulk") == ["bulk.1", "bulk.2", "bulk.3"]
+
+    w = FairWorker([Queue("default", connection=redis_conn)], connection=redis_conn)
+    w._refresh_queues()
+    # every interactive queue, then every bulk queue, then the static ones
+    assert _names(w) == ["interactive.1", "interactive.2", "bulk.1", "bulk.2", "bulk.3", "default"]
+    # the org that was just served goes to the back in both priorities
+    w.reorder_queues(Queue("interactive.1", connection=redis_conn))
+    w._refresh_queues()
+    assert _names(w) == ["interactive.2", "interactive.1", "bulk.2", "bulk.3", "bulk.1", "default"]
+    w.reorder_queues(Queue("default", connection=redis_conn))
+    w._refresh_queues()
+    assert _names(w)[:2] == ["interactive.2", "interactive.1"]
+
+
+def test_dedup_key_returns_the_queued_job(redis_conn):
+    job, dedup = enqueue(print, "a", org_id=1, priority="bulk", dedup_key="audit.42")
+    again, dedup_again = enqueue(print, "a", org_id=1, priority="bulk", dedup_key="audit.42")
+    assert (dedup, dedup_again) == (False, True) and again.id == job.id == "audit.42.1"
+    other, _ = enqueue(print, "a", org_id=2, priority="bulk", dedup_key="audit.42")
+    assert other.id != job.id
+    job.cancel()
+    _, dedup_after = enqueue(print, "a", org_id=1, priority="bulk", dedup_key="audit.42")
+    assert dedup_after is False
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+from limits import RateLimitItemPerMinute
+
+from app.rate_limit import RateLimiter
+
+
+def _limiter(buckets):
+    limiter = RateLimiter("memory://", org_per_minute=10, user_per_minute=5, anon_per_minute=5)
+    limiter.buckets = lambda request: buckets
+    return limiter
+
+
+def _request(method="POST"):
+    return SimpleNamespace(method=method, state=SimpleNamespace(org=SimpleNamespace(slug="acme")))
+
+
+USER = ("user", RateLimitItemPerMinute(5), "user:acme:alice")
+ORG = ("org", RateLimitItemPerMinute(10), "org:acme")
+
+
+def test_charges_every_bucket_until_one_is_empty():
+    limiter = _limiter([USER, ORG])
+    assert limiter.check(_request(), "/api/x") is None
+    assert limiter.check(_request(), "/api/x") is None
+    resp = limiter.check(_request(), "/api/x")
+    assert resp.status_code == 429 and resp.headers["X-RateLimit-Limit"] == "5"
+    assert limiter.strategy.get_window_stats(ORG[1], ORG[2]).remaining == 6
+
+
+def test_org_rejection_does_not_spend_the_user_bucket():
+    limiter = _limiter([USER, ORG])
+    limiter.strategy.hit(ORG[1], ORG[2], cost=9)
+    assert limiter.check(_request(), "/api/x").status_code == 429
+    assert limiter.strategy.get_window_stats(USER[1], USER[2]).remaining == 5
+
+
+def test_hit_result_decides_when_the_test_races():
+    limiter = _limiter([USER, ORG])
+    hits = []
+
+    def hit(item, ident, cost=1):
+        hits.append(ident)
+        return ident != ORG[2]  # another worker took the last org units after test()
+
+    limiter.strategy.hit = hit
+    resp = limiter.check(_request(), "/api/x")
+    assert resp.status_code == 429 and "org" in resp.body.decode()
+    assert hits == [USER[2], ORG[2]]
@@ -0,0 +1,69 @@
+import hashlib, json
+
+from sqlalchemy import select
+
+from app.models import CalcRunRows
+from app.services import run_trace
+from app.services.run_trace import compact_details, expand_details, iter_rows, iter_run_rows, store_details
+from conftest import add_activities, add_ef, add_run
+
+
+def _row(i, ef_key="grid", value=2.0):
+    trace = {"method": "direct_value", "qty": float(i), "ef_value": value, "qtrace": {"method": "quantity_field", "quantity": float(i)},
+             "ef_key": ef_key, "meta": {"src": ef_key}, "ef_payload_hash": f"h-{ef_key}"}
+    return {"activity_id": i, "activity_name": f"a{i}", "ef_key": ef_key, "inputs": {"qty": i},
+            "scope": "Scope2", "period": "2024-01", "site": None, "kgco2e": i * value, "trace": trace}
+
+
+ROWS = [_row(1), _row(2, "diesel", 3.0), _row(3)]
+
+
+def test_compact_keeps_ef_fields_once_per_key():
+    details = compact_details(ROWS)
+    assert details["format"] == run_trace.FORMAT and details["row_count"] == 3
+    assert details["efs"] == {"grid": {"method": "direct_value", "ef_value": 2.0, "meta": {"src": "grid"}, "ef_payload_hash": "h-grid"},
+                              "diesel": {"method": "direct_value", "ef_value": 3.0, "meta": {"src": "diesel"}, "ef_payload_hash": "h-diesel"}}
+    assert all(set(r["trace"]) == {"qty", "qtrace"} for r in details["rows"])
+
+
+def test_expand_restores_the_full_rows():
+    assert list(iter_rows(compact_details(ROWS))) == ROWS
+
+
+def test_expand_details_keeps_other_keys_and_passes_legacy_through():
+    details = {**compact_details(ROWS), "review_note": "ok"}
+    assert expand_details(details) == {"review_note": "ok", "rows": ROWS}
+    legacy = {"rows": ROWS}
+    assert expand_details(legacy) is legacy and list(iter_rows(legacy)) == ROWS
+
+
+def test_rows_without_snapshot_fields_stay_without_them():
+    old = [{k: v for k, v in r.items() if k not in run_trace.SNAPSHOT_FIELDS} for r in ROWS]
+    assert list(iter_rows(compact_details(old))) == old
+
+
+def test_large_runs_are_chunked_and_read_back_in_order(pg_session, org, monkeypatch):
+    monkeypatch.setattr(run_trace, "CHUNK_SIZE", 2)
+    add_ef(pg_session, org.id, "grid", 2.0)
+    acts = add_activities(pg_session, org.id, "grid", [1, 2, 3, 4, 5])
+    run = add_run(pg_session, org.id, [a.id for a in acts], chunk_rows=5)
+
+    assert "rows" not in run.details and [c["first_row"] for c in run.details["chunks"]] == [0, 2, 4]
+    stored = pg_session.execute(select(CalcRunRows.rows).where(CalcRunRows.run_id == run.id).order_by(CalcRunRows.first_row)).scalars()
+    for chunk, rows in zip(run.details["chunks"], stored):
+        raw = json.dumps(rows, ensure_ascii=False, separators=(",", ":"), sort_keys=True, default=str)
+        assert chunk["rows"] == len(rows) and chunk["sha256"] == hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    rows = list(iter_run_rows(pg_session, run))
+    assert [r["activity_id"] for r in rows] == [a.id for a in acts]
+    assert [r["kgco2e"] for r in rows] == [2.0, 4.0, 6.0, 8.0, 10.0]
+    assert rows[0]["trace"]["ef_value"] == 2.0 and rows[0]["scope"] == "Scope3"
+    assert expand_details(run.details, rows)["rows"] == rows
+
+
+def test_small_runs_stay_inline(pg_session, org):
+    add_ef(pg_session, org.id, "grid", 1.0)
+    acts = add_activities(pg_session, org.id, "grid", [1, 2])
+    run = add_run(pg_session, org.id, [a.id for a in acts], chunk_rows=3)
+    assert "chunks" not in run.details and len(run.details["rows"]) == 2
+    store_details(pg_session, run, compact_details(list(iter_run_rows(pg_session, run))), chunk_rows=0)
+    assert len(run.details["rows"]) == 2
@@ -0,0 +1,40 @@
+import pytest
+
+from conftest import add_activities, add_ef
+from app.services.scenarios import _check_scenario, sweep
+
+
+def test_check_scenario_defaults_and_normalizes():
+    sc = _check_scenario(2, {"ef_values": {"grid": 1}, "ef_swaps": {"grid": "solar"}})
+    assert sc == {"name": "scenario_2", "gwp_version": None, "ef_values": {"grid": 1.0}, "ef_swaps": {"grid": "solar"}}
+
+
+@pytest.mark.parametrize("sc", [
+    ["not", "an", "object"],
+    {"name": 3},
+    {"gwp_version": 5},
+    {"gwp_version": "AR99"},
+    {"ef_values": ["grid", 1]},
+    {"ef_swaps": "grid"},
+    {"ef_values": {"grid": "1.2"}},
+    {"ef_values": {"grid": True}},
+    {"ef_values": {"grid": float("nan")}},
+    {"ef_swaps": {"grid": 7}},
+    {"ef_swaps": {"grid": ""}},
+])
+def test_check_scenario_rejects_bad_shapes(sc):
+    with pytest.raises(ValueError):
+        _check_scenario(1, sc)
+
+
+def test_sweep_values_and_swaps(pg_session, org):
+    add_ef(pg_session, org.id, "grid", 0.5)
+    add_ef(pg_session, org.id, "solar", 0.05)
+    acts = add_activities(pg_session, org.id, "grid", [100, 300], scope="Scope2")
+    out = sweep(pg_session, [a.id for a in acts], org.id, [
+        {"name": "cheaper grid", "ef_values": {"grid": 0.25}},
+        {"name": "all solar", "ef_swaps": {"grid": "solar"}},
+    ])
+    totals = {s["name"]: s["total_kgco2e"] for s in out["scenarios"]}
+    assert totals == pytest.approx({"baseline": 200.0, "cheaper grid": 100.0, "all solar": 20.0})
+    assert out["row_deltas"][1]["delta_kgco2e"] == pytest.approx([-75.0, -135.0])
@@ -0,0 +1,52 @@
+import json
+import os
+
+import pytest
+
+from app.seed.base import SeedMeta
+from app.seed.packs import iter_pack_batches, read_manifest, write_pack
+
+META = SeedMeta(source="Test", year=2024, version="1", dataset="unit", reference="tests")
+ROWS = [
+    {"key": "grid.th", "name": "Grid TH", "unit": "kWh", "value": 0.5, "scope": "Scope2", "category": "Electricity",
+     "tags": ["grid"], "activity_id_fields": {"quantity_field": "kwh"}, "valid_from": "2024-01-01"},
+    {"key": "diesel", "name": "Diesel", "unit": "L", "value": None, "scope": "Scope1", "category": "Fuel",
+     "tags": [], "gas_breakdown": {"gases": {"CO2": 2.6, "CH4": 0.0001}}, "gwp_version": "AR6"},
+]
+
+
+def test_round_trip(tmp_path):
+    pack = write_pack(str(tmp_path), "unit-pack", META, ROWS)
+    assert read_manifest(str(tmp_path)) == pack
+    assert pack.files[0]["rows"] == 2 and pack.digest().startswith("unit-pack:")
+    rows = [r for batch in iter_pack_batches(pack, batch_size=1) for r in batch]
+    assert [r["key"] for r in rows] == ["grid.th", "diesel"]
+    assert rows[0]["activity_id_fields"] == {"quantity_field": "kwh"} and rows[0]["gas_breakdown"] == {}
+    assert rows[1]["value"] is None and rows[1]["gas_breakdown"]["gases"]["CO2"] == 2.6
+    assert rows[1]["tags"] == [] and rows[0]["meta"]["dataset"] == "unit"
+
+
+def test_checksum_mismatch(tmp_path):
+    pack = write_pack(str(tmp_path), "unit-pack", META, ROWS)
+    with open(os.path.join(str(tmp_path), "factors.parquet"), "ab") as f:
+        f.write(b"x")
+    with pytest.raises(ValueError, match="checksum"):
+        next(iter_pack_batches(pack))
+
+
+def test_row_without_value_or_gases_is_rejected(tmp_path):
+    pack = write_pack(str(tmp_path), "unit-pack", META, [{**ROWS[1], "gas_breakdown": None}])
+    with pytest.raises(ValueError, match="neither value nor gas_breakdown"):
+        next(iter_pack_batches(pack))
+
+
+def test_manifest_format_is_checked(tmp_path):
+    write_pack(str(tmp_path), "unit-pack", META, ROWS)
+    path = os.path.join(str(tmp_path), "manifest.json")
+    with open(path) as f:
+        m = json.load(f)
+    m["format"] = 99
+    with open(path, "w") as f:
+        json.dump(m, f)
+    with pytest.raises(ValueError, match="format"):
+        read_manifest(str(tmp_path))
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from conftest import add_activities, add_ef, add_run
+from app.services.uncertainty import monte_carlo_for_run, propagate
+
+
+def _ef(u=0.0, kind="normal", category="Electricity"):
+    return SimpleNamespace(uncertainty_value=u, uncertainty_type=kind, category=category)
+
+
+EFS = {"grid": _ef(0.1), "diesel": _ef(0.05, "lognormal", "Fuel"), "paper": _ef(0.2, "triangular", "Materials")}
+KG = np.array([100.0, 50.0, 20.0, 5.0])
+KEYS = ["grid", "diesel", "grid", "paper"]
+SCOPES = ["Scope2", "Scope1", "Scope2", "Scope3"]
+
+
+def test_fixed_seed_is_deterministic_across_workers():
+    a = propagate(KG, KEYS, SCOPES, EFS, iterations=2500, seed=7, workers=1)
+    b = propagate(KG, KEYS, SCOPES, EFS, iterations=2500, seed=7, workers=4)
+    assert a == b
+    assert propagate(KG, KEYS, SCOPES, EFS, iterations=2500, seed=8)["total"] != a["total"]
+
+
+def test_groups_and_deterministic_totals():
+    out = propagate(KG, KEYS, SCOPES, EFS, iterations=2000, seed=1)
+    assert out["rows"] == 4
+    assert out["total"]["deterministic_kgco2e"] == pytest.approx(175.0)
+    assert out["by_scope"]["Scope2"]["deterministic_kgco2e"] == pytest.approx(120.0)
+    assert out["by_category"]["Fuel"]["deterministic_kgco2e"] == pytest.approx(50.0)
+    total = out["total"]
+    assert total["ci_low_kgco2e"] < total["mean_kgco2e"] < total["ci_high_kgco2e"]
+    assert total["mean_kgco2e"] == pytest.approx(175.0, rel=0.02)
+
+
+def test_efs_without_uncertainty_do_not_vary():
+    out = propagate(KG, KEYS, SCOPES, {"grid": _ef(0.1)}, iterations=500, seed=3)
+    assert out["efs_without_uncertainty"] == ["diesel", "paper"]
+    assert out["by_category"]["Unclassified"]["std_kgco2e"] == 0.0
+    assert out["by_scope"]["Scope1"]["mean_kgco2e"] == pytest.approx(50.0)
+
+
+def test_run_mode_uses_the_stored_rows(pg_session, org):
+    add_ef(pg_session, org.id, "grid", 0.5, category="Electricity", uncertainty_value=0.1)
+    acts = add_activities(pg_session, org.id, "grid", [10, 30], scope="Scope2")
+    run = add_run(pg_session, org.id, [a.id for a in acts])
+    # the run keeps its own numbers after an activity changes
+    pg_session.get(type(acts[0]), (org.id, acts[0].id)).inputs = {"qty": 1000}
+    pg_session.flush()
+    out = monte_carlo_for_run(pg_session, run, iterations=200, seed=1)
+    assert out["rows"] == 2
+    assert out["total"]["deterministic_kgco2e"] == pytest.approx(run.total_kgco2e) == pytest.approx(20.0)
+    assert list(out["by_scope"]) == ["Scope2"]